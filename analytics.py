@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - 进度分析
+把每个flag的检查记录看作 (时间, 进度) 的时间序列（创建日期记为进度0的起点），
+用最小二乘拟合出进度速度（每天增加的百分点），推算完成日期并与目标日期比较，给出风险分类。
+
+全部flags的检查记录拼接成一维数组，用偏移数组标出每个flag的区间，
+分段求和（np.add.reduceat）一次算出所有flags的拟合结果，没有逐个flag的循环；
+未安装numpy时退化为普通循环，公式相同。
+拟合结果按flag缓存（可以保存到文件），只有检查记录变化过的flags才重新读取记录和计算。
+"""
+
+import json
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from indexes import DAY, to_timestamp
+from models import EPOCH, Flag
+
+try:
+    import numpy as np
+except ImportError:  # 未安装numpy时使用普通循环
+    np = None
+
+CACHE_VERSION = 2
+# 风险分类: (说明, 图标)
+RISK_LEVELS = {
+    "overdue": ("已逾期", "🚨"),
+    "stalled": ("停滞", "🐢"),
+    "at_risk": ("有风险", "⚠️"),
+    "no_data": ("数据不足", "❔"),
+    "on_track": ("按计划", "✅"),
+    "completed": ("已完成", "🎉"),
+}
+
+
+def cache_key(flag: Flag) -> List:
+    """检查记录或进度变化时改变的键"""
+    return [flag.checks, flag.last_check_stamp, flag.created_date, flag.progress]
+
+
+def enough_data(flag: Flag, times: Sequence[float]) -> bool:
+    """至少两次检查，或最后一次检查距起点至少一天时才拟合速度
+
+    创建日期记为当天零点，创建当天只检查过一次时拟合出的速度大得没有意义
+    """
+    checks = len(times) - (1 if flag.created_timestamp is not None else 0)
+    return checks >= 2 or (checks >= 1 and times[-1] - times[0] >= DAY)
+
+
+def series(flag: Flag) -> Tuple[List[float], List[float]]:
+    """flag的 (时间秒数, 进度) 序列：创建日期为进度0的起点，之后是各次检查"""
+    times = []
+    progress = []
+    created = flag.created_timestamp
+    if created is not None:
+        times.append(float(created))
+        progress.append(0.0)
+    for record in flag.check_history:
+        timestamp = record.timestamp
+        if timestamp is not None:
+            times.append(float(timestamp))
+            progress.append(float(record.progress))
+    return times, progress
+
+
+def fit_segments(times: Sequence[float], progress: Sequence[float],
+                 offsets: Sequence[int]) -> Tuple[List[Optional[float]], List[Optional[float]]]:
+    """对每一段 [offsets[i], offsets[i+1]) 做进度对时间的最小二乘拟合
+
+    返回 (每天的进度速度, 最后一个样本的时间)，样本少于两个或时间都相同时速度为None
+    """
+    count = len(offsets) - 1
+    if np is None:
+        velocities, last_times = [], []
+        for i in range(count):
+            start, end = offsets[i], offsets[i + 1]
+            n = end - start
+            if n == 0:
+                velocities.append(None)
+                last_times.append(None)
+                continue
+            base = times[start]
+            t = [(value - base) / DAY for value in times[start:end]]
+            p = progress[start:end]
+            st, sp = sum(t), sum(p)
+            stt = sum(value * value for value in t)
+            stp = sum(a * b for a, b in zip(t, p))
+            denominator = n * stt - st * st
+            velocities.append((n * stp - st * sp) / denominator if n >= 2 and denominator > 1e-12 else None)
+            last_times.append(times[end - 1])
+        return velocities, last_times
+
+    times = np.asarray(times, dtype=np.float64)
+    progress = np.asarray(progress, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    nonempty = lengths > 0
+    velocities = np.full(count, np.nan)
+    last_times = np.full(count, np.nan)
+    if times.size:
+        starts = offsets[:-1][nonempty]
+        # 每段减去起点时间再换算成天，避免大数相减的精度损失
+        t = (times - np.repeat(times[starts], lengths[nonempty])) / DAY
+        n = lengths[nonempty].astype(np.float64)
+        st = np.add.reduceat(t, starts)
+        sp = np.add.reduceat(progress, starts)
+        stt = np.add.reduceat(t * t, starts)
+        stp = np.add.reduceat(t * progress, starts)
+        denominator = n * stt - st * st
+        valid = (n >= 2) & (denominator > 1e-12)
+        slope = np.full(starts.size, np.nan)
+        slope[valid] = (n[valid] * stp[valid] - st[valid] * sp[valid]) / denominator[valid]
+        velocities[nonempty] = slope
+        last_times[nonempty] = times[offsets[1:][nonempty] - 1]
+    return ([None if math.isnan(value) else value for value in velocities.tolist()],
+            [None if math.isnan(value) else value for value in last_times.tolist()])
+
+
+def format_timestamp(timestamp: Optional[float]) -> Optional[str]:
+    """秒数还原为日期字符串"""
+    if timestamp is None:
+        return None
+    try:
+        return (EPOCH + timedelta(seconds=timestamp)).strftime("%Y-%m-%d")
+    except OverflowError:
+        # 速度极小时推算出的日期超出范围
+        return None
+
+
+class ProgressAnalytics:
+    """进度分析，按flag缓存拟合结果
+
+    cache_file 不为None时缓存保存在文件中，下次运行只重新计算检查记录变化过的flags
+    """
+
+    def __init__(self, manager, cache_file: Optional[str] = None):
+        self.manager = manager
+        self.cache_file = cache_file
+        # flag_id -> [缓存键, 速度, 最后一次检查的秒数]
+        self.cache: Dict[str, List] = {}
+        self.recomputed = 0
+        if cache_file:
+            self._load_cache()
+
+    def _load_cache(self) -> None:
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == CACHE_VERSION:
+            self.cache = data.get("flags", {})
+
+    def _save_cache(self) -> None:
+        tmp = self.cache_file + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"version": CACHE_VERSION, "flags": self.cache}, ensure_ascii=False))
+        os.replace(tmp, self.cache_file)
+
+    def _update(self, flags: List[Flag]) -> None:
+        """重新拟合缓存键变化过的flags，一次性批量计算"""
+        changed = [flag for flag in flags
+                   if self.cache.get(flag.id, [None])[0] != cache_key(flag)]
+        self.recomputed = len(changed)
+        current = {flag.id for flag in flags}
+        stale_ids = [flag_id for flag_id in self.cache if flag_id not in current]
+        for flag_id in stale_ids:
+            del self.cache[flag_id]
+        if not changed and not stale_ids:
+            return
+
+        times: List[float] = []
+        progress: List[float] = []
+        offsets = [0]
+        sufficient = []
+        for flag in changed:
+            flag_times, flag_progress = series(flag)
+            times.extend(flag_times)
+            progress.extend(flag_progress)
+            offsets.append(len(times))
+            sufficient.append(enough_data(flag, flag_times))
+        velocities, last_times = fit_segments(times, progress, offsets)
+        for flag, velocity, last_time, ok in zip(changed, velocities, last_times, sufficient):
+            self.cache[flag.id] = [cache_key(flag), velocity if ok else None, last_time]
+        if self.cache_file:
+            self._save_cache()
+
+    def analyze(self, now: Optional[datetime] = None) -> List[Dict]:
+        """分析全部flags，按风险从高到低、推算完成日期晚于目标日期的天数从多到少排序
+
+        每项包含 velocity（每天的进度百分点，检查记录不足时为None，见 enough_data）、projected_date（推算完成日期）、
+        slack_days（目标日期减去推算完成日期的天数，负数表示会延期）和 risk（见 RISK_LEVELS）
+        """
+        flags = list(self.manager.iter_flags())
+        self._update(flags)
+        now_ts = to_timestamp(now or datetime.now())
+        results = []
+        for flag in flags:
+            _, velocity, last_time = self.cache[flag.id]
+            target = flag.target_timestamp
+            projected = None
+            if flag.progress >= 100:
+                projected = last_time
+            elif velocity is not None and velocity > 0 and last_time is not None:
+                # 按拟合的速度从最后一次检查开始推算，已经过去的日期按今天计
+                projected = max(last_time + (100 - flag.progress) / velocity * DAY, now_ts)
+            # 剩余天数与提醒相同（向下取整）；目标日期当天结束后才算逾期
+            days_left = int((target - now_ts) // DAY) if target is not None else None
+            slack = None
+            if projected is not None and target is not None and flag.progress < 100:
+                slack = int((target + DAY - projected) // DAY)
+
+            if flag.status == "已完成" or flag.progress >= 100:
+                risk = "completed"
+            elif target is not None and target + DAY <= now_ts:
+                risk = "overdue"
+            elif not flag.checks or velocity is None:
+                risk = "no_data"
+            elif projected is None:
+                risk = "stalled"
+            elif slack is not None and slack < 0:
+                risk = "at_risk"
+            else:
+                risk = "on_track"
+            results.append({
+                "id": flag.id,
+                "title": flag.title,
+                "progress": flag.progress,
+                "target_date": flag.target_date,
+                "velocity": round(velocity, 3) if velocity is not None else None,
+                "projected_date": format_timestamp(projected),
+                "days_left": days_left,
+                "slack_days": slack,
+                "risk": risk,
+            })
+        order = list(RISK_LEVELS)
+        results.sort(key=lambda item: (order.index(item["risk"]),
+                                       item["slack_days"] if item["slack_days"] is not None else 0))
+        return results
+
+
+def default_cache_file(data_file: str) -> str:
+    """分析缓存文件，放在数据文件旁边"""
+    return os.path.splitext(data_file)[0] + ".analytics.json"
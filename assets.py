@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - 静态资源
+启动时扫描 www/static，为每个文件计算内容哈希并预先压缩（gzip，安装了brotli时同时生成br）。
+页面中引用的资源地址改写为带哈希的文件名（app.js -> app.<哈希>.js），
+内容变化时地址随之变化，浏览器可以永久缓存这些地址。
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli 是可选依赖，没有安装时只提供gzip
+    brotli = None
+
+# 小于这个大小的文件压缩收益不大，只提供原始内容
+MIN_COMPRESS_SIZE = 256
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+# 同等权重时优先使用压缩率更高的编码
+ENCODING_PREFERENCE = ("br", "gzip", "identity")
+
+# 匹配页面中 static/... 形式的资源引用（去掉原有的 ?v=2 之类的查询参数）
+STATIC_REF = re.compile(r"""(?P<quote>["'(])(?P<prefix>/?static/)(?P<path>[^"'?#)\s]+)(?:\?[^"'#)\s]*)?""")
+
+
+def compress(data: bytes) -> Dict[str, bytes]:
+    """生成各编码的内容，压缩后没有变小的编码不保留"""
+    bodies = {"identity": data}
+    if len(data) < MIN_COMPRESS_SIZE:
+        return bodies
+    candidates = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        candidates["br"] = brotli.compress(data, quality=11)
+    for encoding, body in candidates.items():
+        if len(body) < len(data):
+            bodies[encoding] = body
+    return bodies
+
+
+class Asset:
+    """一个静态资源及其预压缩内容"""
+
+    __slots__ = ("path", "digest", "hashed_path", "mimetype", "bodies", "mtime")
+
+    def __init__(self, path: str, data: bytes, mtime: float = 0):
+        self.path = path
+        self.digest = hashlib.sha256(data).hexdigest()[:12]
+        root, ext = os.path.splitext(path)
+        self.hashed_path = f"{root}.{self.digest}{ext}"
+        self.mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if self.mimetype.startswith(COMPRESSIBLE_TYPES):
+            self.bodies = compress(data)
+        else:
+            self.bodies = {"identity": data}
+        self.mtime = mtime
+
+    def etag(self, encoding: str) -> str:
+        """强ETag，不同编码的内容字节不同，ETag也要不同"""
+        return self.digest if encoding == "identity" else f"{self.digest}-{encoding}"
+
+    def choose_encoding(self, quality: Callable[[str], float]) -> str:
+        """按 Accept-Encoding 的权重选择编码，quality(编码) 返回客户端给出的权重"""
+        best, best_q = "identity", 0.0
+        for encoding in ENCODING_PREFERENCE:
+            if encoding not in self.bodies:
+                continue
+            q = quality(encoding)
+            if encoding == "identity" and q == 0 and best_q == 0:
+                # 客户端没有明确拒绝时原始内容总是可用的
+                q = 0.001
+            if q > best_q:
+                best, best_q = encoding, q
+        return best
+
+
+class AssetStore:
+    """www/static 下全部资源的内存缓存"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.assets: Dict[str, Asset] = {}
+        self.hashed: Dict[str, Asset] = {}
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """文件有增删改时重新扫描，返回是否有变化"""
+        found = {}
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                full_path = os.path.join(directory, name)
+                found[os.path.relpath(full_path, self.root).replace(os.sep, "/")] = os.path.getmtime(full_path)
+        if found.keys() == self.assets.keys() and all(
+                self.assets[path].mtime == mtime for path, mtime in found.items()):
+            return False
+
+        assets = {}
+        for path, mtime in found.items():
+            old = self.assets.get(path)
+            if old is not None and old.mtime == mtime:
+                assets[path] = old
+                continue
+            with open(os.path.join(self.root, path), "rb") as f:
+                assets[path] = Asset(path, f.read(), mtime)
+        self.assets = assets
+        self.hashed = {asset.hashed_path: asset for asset in assets.values()}
+        return True
+
+    def lookup(self, path: str) -> Tuple[Optional[Asset], bool]:
+        """按请求路径查找资源，返回 (资源, 是否为带哈希的地址)"""
+        asset = self.hashed.get(path)
+        if asset is not None:
+            return asset, True
+        return self.assets.get(path), False
+
+    def rewrite(self, html: str) -> str:
+        """把页面中的 static/... 引用替换为带哈希的地址"""
+        def replace(match):
+            asset = self.assets.get(match.group("path"))
+            if asset is None:
+                return match.group(0)
+            return f"{match.group('quote')}{match.group('prefix')}{asset.hashed_path}"
+        return STATIC_REF.sub(replace, html)
+
+    def page(self, path: str) -> Asset:
+        """读取页面文件，改写资源地址后作为一个资源返回（内容随资源哈希变化）"""
+        with open(path, "r", encoding="utf-8") as f:
+            html = self.rewrite(f.read())
+        return Asset(os.path.basename(path), html.encode("utf-8"), os.path.getmtime(path))
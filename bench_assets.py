@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - 静态资源传输量测试
+模拟浏览器（遵守 Cache-Control / ETag）访问首页及其引用的资源，统计首次访问和再次访问传输的字节数。
+用法: python bench_assets.py [--visits 5]
+"""
+
+import argparse
+import gzip
+import re
+
+from web_app import app
+import assets
+
+ASSET_REF = re.compile(r"""["'](/?static/[^"']+)["']""")
+
+
+def response_bytes(response):
+    """响应传输的字节数：状态行 + 响应头 + 响应体"""
+    head = f"HTTP/1.1 {response.status}\r\n" + "".join(f"{k}: {v}\r\n" for k, v in response.headers.items()) + "\r\n"
+    return len(head.encode("utf-8")) + len(response.get_data())
+
+
+class Browser:
+    """带HTTP缓存的简易浏览器
+
+    use_cache=False 相当于原来 no-store 的行为：每次都完整下载；
+    encodings 为 Accept-Encoding 请求头，为空时不接受压缩
+    """
+
+    def __init__(self, client, encodings="", use_cache=True):
+        self.client = client
+        self.encodings = encodings
+        self.use_cache = use_cache
+        self.cache = {}
+
+    def get(self, url):
+        """返回 (页面内容, 传输字节数, 请求次数)"""
+        cached = self.cache.get(url) if self.use_cache else None
+        if cached and "immutable" in cached["cache_control"]:
+            return cached["body"], 0, 0
+        headers = {"Accept-Encoding": self.encodings} if self.encodings else {}
+        if cached:
+            headers["If-None-Match"] = cached["etag"]
+        response = self.client.get(url, headers=headers)
+        transferred = response_bytes(response)
+        if response.status_code == 304:
+            return cached["body"], transferred, 1
+        # 测试客户端不会自动解压，这里只需要页面文本来找出引用的资源
+        body = response.get_data()
+        if response.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        elif response.headers.get("Content-Encoding") == "br":
+            body = assets.brotli.decompress(body)
+        if self.use_cache and response.headers.get("ETag"):
+            self.cache[url] = {"etag": response.headers["ETag"], "body": body,
+                               "cache_control": response.headers.get("Cache-Control", "")}
+        return body, transferred, 1
+
+    def visit(self):
+        """访问首页和页面引用的全部静态资源"""
+        html, total, requests = self.get("/")
+        for ref in ASSET_REF.findall(html.decode("utf-8")):
+            _, transferred, count = self.get("/" + ref.lstrip("/"))
+            total += transferred
+            requests += count
+        return total, requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description="静态资源传输量测试")
+    parser.add_argument("--visits", type=int, default=5, help="每种模式的访问次数 (默认: 5)")
+    args = parser.parse_args()
+
+    client = app.test_client()
+    modes = [("无缓存、无压缩（原有行为）", "", False), ("缓存 + gzip", "gzip", True)]
+    if assets.brotli is not None:
+        modes.append(("缓存 + brotli", "br, gzip", True))
+    else:
+        print("ℹ️  未安装brotli，跳过br测试 (pip install brotli)")
+
+    print(f"\n📊 每次访问传输的字节数（首页 + 引用的资源，含响应头）")
+    print(f"   {'模式':<24}{'首次访问':>10}{'再次访问':>10}{'请求数(再次)':>14}{f'{args.visits}次合计':>12}")
+    for label, encodings, use_cache in modes:
+        browser = Browser(client, encodings, use_cache)
+        results = [browser.visit() for _ in range(args.visits)]
+        first, repeat = results[0], results[-1]
+        total = sum(transferred for transferred, _ in results)
+        print(f"   {label:<24}{first[0]:>10}{repeat[0]:>10}{repeat[1]:>14}{total:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - 并发写入压力测试
+启动N个写进程同时对同一份数据更新进度和添加flag，结束后检查每条检查记录都被保存且只保存一次。
+用法: python bench_concurrency.py [--workers 8] [--ops 200] [--backend journal]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from main import FlagManager
+from storage import BACKENDS, open_storage
+
+BACKEND_FILES = {"json": "flags.json", "journal": "flags.json", "jsonl": "flags.jsonl", "sqlite": "flags.db", "snapshot": "flags.snap"}
+
+
+def writer(data_file, backend, worker, ops, flag_ids, start):
+    """一个写进程：随机更新已有flags的进度，偶尔添加新flag"""
+    rng = random.Random(worker)
+    manager = FlagManager(data_file, storage=open_storage(data_file, backend))
+    start.wait()
+    for i in range(ops):
+        if i % 10 == 9:
+            manager.add_flag(f"并发添加 w{worker}-{i}", "每天写一点并发测试的描述文字", "2030-01-01")
+        else:
+            manager.update_progress(rng.choice(flag_ids), rng.randint(1, 99), f"w{worker}-{i}")
+
+
+def run(workers, ops, backend, flags):
+    workdir = tempfile.mkdtemp(prefix="flag_bench_")
+    try:
+        data_file = os.path.join(workdir, BACKEND_FILES[backend])
+        manager = FlagManager(data_file, storage=open_storage(data_file, backend))
+        with manager.batch():
+            seed = [manager.add_flag(f"初始flag {i}", "每周跑步三次，每次三十分钟", "2030-01-01") for i in range(flags)]
+        flag_ids = [flag.id for flag in seed]
+        del manager
+
+        start = multiprocessing.Barrier(workers + 1)
+        processes = [multiprocessing.Process(target=writer, args=(data_file, backend, w, ops, flag_ids, start))
+                     for w in range(workers)]
+        for process in processes:
+            process.start()
+        start.wait()
+        began = time.perf_counter()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - began
+        if any(process.exitcode for process in processes):
+            print("❌ 有写进程异常退出")
+            return False
+
+        # 用新的进程视角重新读取，核对结果
+        final = FlagManager(data_file, storage=open_storage(data_file, backend))
+        notes = [record.notes for flag in final.flags for record in flag.check_history]
+        titles = {flag.title for flag in final.flags}
+        expected_checks = {f"w{w}-{i}" for w in range(workers) for i in range(ops) if i % 10 != 9}
+        expected_adds = {f"并发添加 w{w}-{i}" for w in range(workers) for i in range(ops) if i % 10 == 9}
+
+        lost = expected_checks - set(notes)
+        duplicated = len(notes) - len(set(notes))
+        lost_adds = expected_adds - titles
+        total = workers * ops
+        print(f"📊 {backend}: {workers} 个进程 × {ops} 次写入, 耗时 {elapsed:.2f}s, {total / elapsed:.0f} 次/秒")
+        print(f"   检查记录: 预期 {len(expected_checks)}, 实际 {len(notes)}, 丢失 {len(lost)}, 重复 {duplicated}")
+        print(f"   新增flags: 预期 {len(expected_adds)}, 丢失 {len(lost_adds)}")
+        ok = not lost and not duplicated and not lost_adds and len(final.flags) == flags + len(expected_adds)
+        print("✅ 没有丢失更新" if ok else "❌ 发现丢失或重复的更新")
+        return ok
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并发写入压力测试")
+    parser.add_argument("--workers", type=int, default=8, help="写进程数量 (默认: 8)")
+    parser.add_argument("--ops", type=int, default=200, help="每个进程的写入次数 (默认: 200)")
+    parser.add_argument("--flags", type=int, default=20, help="初始flags数量 (默认: 20)")
+    parser.add_argument("--backend", choices=list(BACKENDS) + ["all"], default="all", help="存储后端 (默认: 全部)")
+    args = parser.parse_args()
+
+    backends = list(BACKENDS) if args.backend == "all" else [args.backend]
+    results = [run(args.workers, args.ops, backend, args.flags) for backend in backends]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - 可行性批量评估测试
+生成随机flags（包含各个阈值附近的日期和长度、不合法的日期），比较逐个评估和批量评估的耗时，
+并检查结果与规则文件化之前写死在代码里的评估逻辑（legacy_assess）完全相同
+（安装了numpy时同时检查不使用numpy的路径）。
+用法: python bench_feasibility.py [--flags 100000] [--rules 规则文件] [--profile]
+指定 --rules 时只比较逐个评估和批量评估，不再与原有逻辑比较。
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import feasibility
+from feasibility import DATE_FORMAT
+
+WORDS = ["学习", "运动", "读书", "每天", "每周", "每月", "次", "小时", "分钟", "坚持", "英语", "Python"]
+BAD_DATES = ["", "2026/01/01", "2026-13-01", "2026-02-30", "明年", "2026-1-5", "2026-01-01 "]
+
+
+def legacy_assess(flag, now):
+    """规则文件化之前的评估逻辑，作为默认规则文件的参照"""
+    score = 100
+    reasons = []
+    try:
+        days_until_target = (datetime.strptime(flag["target_date"], DATE_FORMAT) - now).days
+        if days_until_target < 30:
+            score -= 30
+            reasons.append("目标时间过短（少于30天）")
+        elif days_until_target < 90:
+            score -= 10
+            reasons.append("目标时间较短（少于3个月）")
+        elif days_until_target > 365:
+            score -= 5
+            reasons.append("目标时间过长（超过1年）")
+    except ValueError:
+        score -= 20
+        reasons.append("日期格式不正确")
+    if len(flag["description"]) < 20:
+        score -= 15
+        reasons.append("描述过于简单，缺乏具体性")
+    elif len(flag["description"]) < 50:
+        score -= 5
+        reasons.append("描述可以更具体一些")
+    if len(flag["title"]) < 5:
+        score -= 10
+        reasons.append("标题过于简短")
+    description_lower = flag["description"].lower()
+    if any(word in description_lower for word in ["每天", "每周", "每月", "次", "小时", "分钟"]):
+        score += 5
+    else:
+        score -= 5
+        reasons.append("缺乏可量化的指标")
+    return {"score": max(0, min(100, score)), "reason": "；".join(reasons) if reasons else "目标设定合理，可行性较高"}
+
+
+def make_flags(count, now, seed=42):
+    """随机flags，目标日期集中在30/90/365天的阈值附近"""
+    rng = random.Random(seed)
+    flags = []
+    for _ in range(count):
+        if rng.random() < 0.03:
+            target = rng.choice(BAD_DATES)
+        else:
+            days = rng.choice([29, 30, 31, 89, 90, 91, 365, 366, 367]) + rng.randint(-2, 2) \
+                if rng.random() < 0.5 else rng.randint(-100, 900)
+            target = (now + timedelta(days=days)).strftime("%Y-%m-%d")
+        description = "".join(rng.choice(WORDS) for _ in range(rng.randint(0, 30)))
+        title = "".join(rng.choice(WORDS) for _ in range(rng.randint(0, 3)))
+        flags.append({"title": title, "description": description, "target_date": target})
+    return flags
+
+
+def main():
+    parser = argparse.ArgumentParser(description="可行性批量评估测试")
+    parser.add_argument("--flags", type=int, default=100000, help="flags数量 (默认: 100000)")
+    parser.add_argument("--rules", help="规则文件 (默认: feasibility_rules.json)")
+    parser.add_argument("--profile", action="store_true", help="显示每条规则的耗时")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    feasibility.load_plan(args.rules, use_cache=False)
+    compiled = time.perf_counter() - started
+    feasibility.load_plan(args.rules)
+    started = time.perf_counter()
+    plan = feasibility.load_plan(args.rules)
+    cached = time.perf_counter() - started
+    print(f"\n📜 规则: {plan.source}")
+    print(f"   编译 {compiled * 1000:.2f} ms，读取缓存 {cached * 1000:.2f} ms")
+
+    now = datetime.now()
+    flags = make_flags(args.flags, now)
+
+    modes = [("逐个评估", lambda: [feasibility.assess(flag, now, plan) for flag in flags], feasibility.np)]
+    modes.append(("批量（numpy）" if feasibility.np is not None else "批量（未安装numpy）",
+                  lambda: feasibility.assess_many(flags, now, plan), feasibility.np))
+    if feasibility.np is not None:
+        modes.append(("批量（不使用numpy）", lambda: feasibility.assess_many(flags, now, plan), None))
+
+    if args.rules:
+        expected, baseline = None, None
+    else:
+        started = time.perf_counter()
+        expected = [legacy_assess(flag, now) for flag in flags]
+        baseline = time.perf_counter() - started
+
+    print(f"\n📊 {args.flags} 个flags")
+    print(f"   {'方式':<20}{'耗时(秒)':>10}{'加速':>8}{'结果一致':>10}")
+    if baseline is not None:
+        print(f"   {'原有逻辑':<20}{baseline:>10.3f}{'1.0x':>8}{'-':>10}")
+    failed = False
+    for label, run, module in modes:
+        saved, feasibility.np = feasibility.np, module
+        try:
+            started = time.perf_counter()
+            results = run()
+            elapsed = time.perf_counter() - started
+        finally:
+            feasibility.np = saved
+        if expected is None:
+            expected, baseline = results, elapsed
+        same = results == expected
+        failed = failed or not same
+        print(f"   {label:<20}{elapsed:>10.3f}{f'{baseline / elapsed:.1f}x':>8}{'✅' if same else '❌':>10}")
+
+    if args.profile:
+        timings = {}
+        feasibility.assess_many(flags, now, plan, timings)
+        spent = sum(timings.values()) or 1
+        print(f"\n⏱️  各规则耗时（批量评估）:")
+        for name, seconds in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+            print(f"   {name:<24} {seconds * 1000:>9.1f} ms  {seconds / spent * 100:>5.1f}%")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
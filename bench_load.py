@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - Web服务压力测试
+启动一个本地生产模式实例（python web_app.py --serve），用多个并发连接请求首页和接口，
+统计每秒请求数和延迟分位数。也可以用 --url 测试已经在运行的实例。
+用法: python bench_load.py [--workers 4] [--concurrency 16] [--duration 5] [--flags 1000]
+"""
+
+import argparse
+import http.client
+import math
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+from main import FlagManager
+
+TARGETS = ["/", "/api/flags?limit=20", "/api/stats", "/api/reminders?fields=id,title"]
+
+
+def percentile(sorted_values, p):
+    """最近秩法计算分位数"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def seed_data(data_file, count):
+    """生成测试数据"""
+    manager = FlagManager(data_file)
+    with manager.batch():
+        for i in range(count):
+            flag = manager.add_flag(f"压力测试flag {i}", "每周运动三次，每次至少三十分钟", "2030-12-31",
+                                    category=["学习成长", "健康生活", "兴趣爱好"][i % 3])
+            if i % 2:
+                manager.update_progress(flag.id, i % 100, "阶段检查")
+
+
+def wait_ready(host, port, timeout=20):
+    """等待实例的就绪检查通过"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=1)
+            conn.request("GET", "/readyz")
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.1)
+    return False
+
+
+def load(host, port, path, concurrency, duration):
+    """并发请求 path，返回 (成功数, 失败数, 延迟列表)"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        conn = None
+        local = []
+        failed = 0
+        while time.monotonic() < deadline:
+            if conn is None:
+                conn = http.client.HTTPConnection(host, port, timeout=10)
+            started = time.perf_counter()
+            try:
+                conn.request("GET", path, headers={"Accept-Encoding": "gzip"})
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 400:
+                    failed += 1
+                else:
+                    local.append(time.perf_counter() - started)
+                if response.getheader("Connection", "").lower() == "close":
+                    conn.close()
+                    conn = None
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = None
+        if conn is not None:
+            conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(latencies), errors[0], sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Web服务压力测试")
+    parser.add_argument("--url", help="测试已在运行的实例（如 http://127.0.0.1:5000），不再启动本地实例")
+    parser.add_argument("--workers", type=int, default=4, help="本地实例的工作进程数量 (默认: 4)")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发连接数 (默认: 16)")
+    parser.add_argument("--duration", type=float, default=5, help="每个地址的测试秒数 (默认: 5)")
+    parser.add_argument("--flags", type=int, default=1000, help="本地实例的测试数据量 (默认: 1000)")
+    args = parser.parse_args()
+
+    workdir = None
+    process = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+    else:
+        workdir = tempfile.mkdtemp(prefix="flag_load_")
+        data_file = os.path.join(workdir, "flags.json")
+        seed_data(data_file, args.flags)
+        host, port = "127.0.0.1", free_port()
+        env = dict(os.environ, FLAG_DATA_FILE=data_file)
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "web_app.py"),
+             "--serve", "--workers", str(args.workers), "--host", host, "--port", str(port)],
+            env=env, stdout=subprocess.DEVNULL
+        )
+
+    try:
+        if not wait_ready(host, port):
+            print("❌ 实例没有就绪")
+            return 1
+        mode = args.url or f"本地实例 {args.workers} 个工作进程, {args.flags} 个flags"
+        print(f"\n📊 {mode}, {args.concurrency} 个并发连接, 每个地址 {args.duration:g} 秒")
+        print(f"   {'地址':<34}{'请求/秒':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'失败':>8}")
+        for path in TARGETS:
+            ok, failed, latencies = load(host, port, path, args.concurrency, args.duration)
+            print(f"   {path:<34}{ok / args.duration:>10.0f}{percentile(latencies, 50) * 1000:>10.1f}"
+                  f"{percentile(latencies, 99) * 1000:>10.1f}{failed:>8}")
+    finally:
+        if process is not None:
+            # 优雅退出：等待处理中的请求完成
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
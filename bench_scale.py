@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - 数据规模测试
+用 create_sample_data.py 的合成数据（默认1千、10万、100万个flags）测量FlagManager各操作在每种存储格式下的
+吞吐量、延迟分位数和进程内存峰值，结果可以保存为JSON，并与之前保存的基准结果比较，标出变慢或内存增加的项。
+生成的数据缓存在 --data-dir 中，每个用例复制一份到临时目录、在单独的进程中运行，互不影响。
+每个操作最多运行 --ops 次，累计超过 --budget 秒后提前停止（至少运行一次），大数据量下整文件存储的写操作很慢。
+用法: python bench_scale.py [--sizes 1000,100000,1000000] [--backends json,journal,jsonl,sqlite,snapshot]
+                           [--ops 50] [--budget 5] [--output result.json] [--baseline base.json] [--threshold 0.2]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from create_sample_data import generate_flags, write_flags
+from main import FlagManager
+from reports import generate_report
+from storage import BACKENDS, open_storage
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块，不统计内存峰值
+    resource = None
+
+BACKEND_FILES = {"json": "flags.json", "journal": "flags.json", "jsonl": "flags.jsonl", "sqlite": "flags.db",
+                 "snapshot": "flags.snap"}
+OPS = ["load_flags", "list_flags", "get_monthly_reminders", "get_statistics", "generate_report",
+       "add_flag", "update_progress", "save_flags"]
+# 更新进度时从中随机挑选的flags数量
+SAMPLE_IDS = 1000
+# 与基准比较时忽略的绝对差异（计时和内存统计的噪声）
+MIN_DELTA_MS = 0.05
+MIN_DELTA_MB = 5.0
+
+
+def peak_rss_mb():
+    """当前进程的内存峰值（MB），不支持时为None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux上单位是KB，macOS上是字节
+    return round(peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(timings):
+    """耗时列表（秒）汇总为次数、吞吐量和延迟分位数（毫秒）"""
+    total = sum(timings)
+    return {
+        "count": len(timings),
+        "total_s": round(total, 4),
+        "ops_per_s": round(len(timings) / total, 2) if total > 0 else None,
+        "p50_ms": round(percentile(timings, 0.5) * 1000, 3),
+        "p95_ms": round(percentile(timings, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(timings, 0.99) * 1000, 3),
+        "max_ms": round(max(timings) * 1000, 3),
+    }
+
+
+def prepare(data_dir, backend, size, seed):
+    """生成（或复用缓存的）数据目录，返回 (目录, 生成耗时秒数，复用时为None)"""
+    source = os.path.join(data_dir, f"{backend}-{size}-s{seed}")
+    marker = os.path.join(source, "meta.json")
+    if os.path.exists(marker):
+        return source, None
+    shutil.rmtree(source, ignore_errors=True)
+    os.makedirs(source)
+    started = time.perf_counter()
+    write_flags(os.path.join(source, BACKEND_FILES[backend]), generate_flags(size, seed), backend)
+    elapsed = time.perf_counter() - started
+    # 写完才留下标记，中途中断的目录下次会重新生成
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump({"backend": backend, "size": size, "seed": seed,
+                   "generated": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}, f)
+    return source, elapsed
+
+
+def run_case(backend, source, size, ops, budget, seed):
+    """在单独的进程中运行一个用例：复制数据，依次测量各操作"""
+    workdir = tempfile.mkdtemp(prefix="flag_scale_")
+    try:
+        shutil.copytree(source, workdir, dirs_exist_ok=True)
+        data_file = os.path.join(workdir, BACKEND_FILES[backend])
+        rng = random.Random(seed)
+        manager = FlagManager(data_file, storage=open_storage(data_file, backend))
+        step = max(1, size // SAMPLE_IDS)
+        flag_ids = [flag.id for i, flag in enumerate(manager.iter_flags()) if i % step == 0]
+        report_file = os.path.join(workdir, "report.txt")
+        actions = {
+            "load_flags": manager.load_flags,
+            "list_flags": manager.list_flags,
+            "get_monthly_reminders": manager.get_monthly_reminders,
+            "get_statistics": manager.get_statistics,
+            "generate_report": lambda: generate_report(manager, output=report_file),
+            "add_flag": lambda: manager.add_flag("规模测试", "每天坚持三十分钟，每周记录一次进展", "2030-12-31", "学习成长"),
+            "update_progress": lambda: manager.update_progress(rng.choice(flag_ids), rng.randint(1, 99), "规模测试"),
+            # 最后执行：未加载全部数据的后端在这里才整体加载
+            "save_flags": lambda: manager.save_flags(force=True),
+        }
+        results = {}
+        for name in OPS:
+            timings = []
+            began = time.perf_counter()
+            while True:
+                started = time.perf_counter()
+                actions[name]()
+                timings.append(time.perf_counter() - started)
+                if len(timings) >= ops or time.perf_counter() - began >= budget:
+                    break
+            results[name] = dict(summarize(timings), peak_rss_mb=peak_rss_mb())
+        manager.close()
+        return {"peak_rss_mb": peak_rss_mb(), "ops": results}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_case(key, case):
+    print(f"\n📏 {key} 个flags，进程内存峰值 {case['peak_rss_mb'] if case['peak_rss_mb'] is not None else '-'} MB")
+    print(f"   {'操作':<22}{'次数':>4}{'每秒':>8}{'p50(ms)':>11}{'p95(ms)':>11}{'p99(ms)':>11}{'最大(ms)':>9}")
+    for name, metrics in case["ops"].items():
+        rate = f"{metrics['ops_per_s']:.1f}" if metrics["ops_per_s"] is not None else "-"
+        print(f"   {name:<24}{metrics['count']:>6}{rate:>10}{metrics['p50_ms']:>11.3f}"
+              f"{metrics['p95_ms']:>11.3f}{metrics['p99_ms']:>11.3f}{metrics['max_ms']:>11.3f}")
+
+
+def compare(results, baseline, threshold):
+    """与基准比较 p50 延迟和内存峰值，返回退步的项数"""
+    regressions = 0
+    print(f"\n📐 与基准比较（超过 {threshold:.0%} 视为退步）")
+    print(f"   {'用例':<18}{'指标':<30}{'基准':>10}{'本次':>10}{'变化':>7}")
+    for key, case in results.items():
+        old_case = baseline.get("results", {}).get(key)
+        if old_case is None:
+            print(f"   {key:<20}基准中没有这个用例，跳过")
+            continue
+        rows = [(f"{name} p50(ms)", old_case["ops"][name]["p50_ms"], metrics["p50_ms"], MIN_DELTA_MS)
+                for name, metrics in case["ops"].items() if name in old_case.get("ops", {})]
+        if case["peak_rss_mb"] is not None and old_case.get("peak_rss_mb") is not None:
+            rows.append(("peak_rss(MB)", old_case["peak_rss_mb"], case["peak_rss_mb"], MIN_DELTA_MB))
+        for label, old, new, noise in rows:
+            change = (new - old) / old if old else 0.0
+            worse = new - old > noise and change > threshold
+            regressions += worse
+            print(f"   {key:<20}{label:<32}{old:>12.3f}{new:>12.3f}{change:>+9.1%} {'❌' if worse else '✅'}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据规模测试")
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="flags数量，逗号分隔 (默认: 1000,100000,1000000)")
+    parser.add_argument("--backends", default=",".join(BACKEND_FILES), help="存储格式，逗号分隔 (默认: 全部)")
+    parser.add_argument("--ops", type=int, default=50, help="每个操作最多运行的次数 (默认: 50)")
+    parser.add_argument("--budget", type=float, default=5.0, help="每个操作的时间预算（秒），至少运行一次 (默认: 5)")
+    parser.add_argument("--seed", type=int, default=1, help="合成数据的随机种子 (默认: 1)")
+    parser.add_argument("--data-dir", default="bench_data", help="合成数据的缓存目录 (默认: bench_data)")
+    parser.add_argument("--output", help="把结果保存为JSON文件（可作为以后比较的基准）")
+    parser.add_argument("--baseline", help="与之前保存的基准JSON比较，有退步时退出码为1")
+    parser.add_argument("--threshold", type=float, default=0.2, help="视为退步的变化比例 (默认: 0.2)")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    backends = [backend for backend in args.backends.split(",") if backend]
+    unknown = [backend for backend in backends if backend not in BACKEND_FILES or backend not in BACKENDS]
+    if unknown:
+        parser.error(f"未知的存储格式: {', '.join(unknown)}（可选: {', '.join(BACKEND_FILES)}）")
+
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for size in sizes:
+        for backend in backends:
+            source, generated = prepare(args.data_dir, backend, size, args.seed)
+            if generated is not None:
+                print(f"\n🧪 生成 {backend} 格式的 {size} 个flags：{generated:.1f} 秒")
+            # 每个用例使用全新的进程，内存峰值只包含这个用例
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                case = pool.submit(run_case, backend, source, size, args.ops, args.budget, args.seed).result()
+            key = f"{backend}/{size}"
+            results[key] = case
+            print_case(key, case)
+
+    if args.output:
+        meta = {
+            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "ops": args.ops,
+            "budget": args.budget,
+            "seed": args.seed,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已保存到 {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        print(f"\n{'❌' if regressions else '✅'} {regressions} 项退步")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - 全文搜索测试
+生成随机的中英文flags和检查备注，测量建立索引、保存/读取索引和查询的耗时，
+并检查：索引命中的flags与逐个扫描文本的结果相同；增删改之后增量维护的索引与重新建立的索引结果相同；
+安装了numpy时同时检查不使用numpy的查询路径。
+用法: python bench_search.py [--flags 100000] [--queries 2000]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import search
+from models import CheckRecord, Flag
+from search import SearchIndex, query_terms, tokenize
+
+WORDS = ["学习", "英语", "运动", "跑步", "读书", "减肥", "健身", "编程", "坚持", "每天", "每周", "早起",
+         "旅行", "摄影", "吉他", "游泳", "考试", "存钱", "Python", "IELTS", "5km", "马拉松", "日本語"]
+# 随机组词用的常用字，使词表规模接近真实数据
+CHARS = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处队南给色光门即保治北造百规热领七海口东导器压志世金增争济阶油思术极交受联什认六共权收证改清己美再采转更单风切打白教速花带安场身车例真务具万每目至达走积示议声报斗完类八离华名确才科张信马节话米整空元况今集温传土许步群广石记需段研界拉林律叫且究观越织装影算低持音众书布复容儿须际商非验连断深难近矿千周委素技备半办青省列习响约支般史感劳便团往酸历市克何除消构府称太准精值号率族维划选标写存候毛亲快效斯院查江型眼王按格养易置派层片始却专状育厂京识适属圆包火住调满县局照参红细引听该铁价严龙飞"
+NOTES = ["", "", "状态不错", "本周偷懒了", "跑步十公里", "读完一本书", "英语听力有进步", "coding 2h"]
+
+
+def make_flags(count, seed=7):
+    """随机flags，约三分之一带检查备注"""
+    rng = random.Random(seed)
+    flags = []
+    for i in range(count):
+        history = []
+        for _ in range(rng.choice([0, 0, 1, 3])):
+            history.append({"date": "2026-03-01 08:00:00", "progress": rng.randint(0, 100),
+                            "notes": rng.choice(NOTES)})
+        flags.append(Flag.from_dict({
+            "id": f"{i:08d}-{rng.getrandbits(64):016x}",
+            "title": "".join(rng.choice(WORDS) for _ in range(rng.randint(1, 2))) + rng.choice(CHARS),
+            "description": "".join(rng.choice(WORDS) if rng.random() < 0.3 else rng.choice(CHARS) + rng.choice(CHARS)
+                                   for _ in range(rng.randint(2, 20))),
+            "category": "其他",
+            "target_date": "2026-12-31",
+            "created_date": "2026-01-01",
+            "progress": 0,
+            "status": "进行中",
+            "check_history": history,
+        }))
+    return flags
+
+
+def flag_tokens(flag):
+    """flag中出现的全部词"""
+    tokens = set(tokenize(flag.title))
+    tokens.update(tokenize(flag.description))
+    for record in flag.check_history:
+        tokens.update(tokenize(record.notes))
+    return tokens
+
+
+def brute_force(tokens, query):
+    """逐个flag检查所有查询词是否出现"""
+    terms = query_terms(query)
+    return {flag_id for flag_id, flag_tokens in tokens.items() if all(term in flag_tokens for term in terms)}
+
+
+def same_results(ours, expected, exact):
+    """命中的flags相同；exact=True 时得分也要相同"""
+    ours, expected = dict(ours), dict(expected)
+    if ours.keys() != expected.keys():
+        return False
+    return not exact or all(abs(score - expected[flag_id]) < 1e-9 for flag_id, score in ours.items())
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="全文搜索测试")
+    parser.add_argument("--flags", type=int, default=100000, help="flags数量 (默认: 100000)")
+    parser.add_argument("--queries", type=int, default=2000, help="查询次数 (默认: 2000)")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    flags = make_flags(args.flags)
+    queries = ["跑步", "英语学习", "python", "每天早起", "马拉松", "读", "坚持编程", "日本語", "ielts 考试",
+               "读完一本书", "不存在的词"]
+    queries += ["".join(rng.sample(WORDS, rng.randint(1, 2))) for _ in range(50)]
+
+    started = time.perf_counter()
+    index = SearchIndex()
+    for flag in flags:
+        index.add(flag)
+    built = time.perf_counter() - started
+    terms = len(index.terms)
+    postings = sum(len(index.posting(term)[0]) for term in index.terms)
+    print(f"\n📚 {args.flags} 个flags：{terms} 个词，{postings} 条倒排记录，建立索引 {built:.2f} 秒")
+
+    path = os.path.join(tempfile.mkdtemp(), "flags.search")
+    started = time.perf_counter()
+    index.save(path)
+    saved = time.perf_counter() - started
+    started = time.perf_counter()
+    loaded = SearchIndex.load(path)
+    read = time.perf_counter() - started
+    print(f"   保存 {saved * 1000:.0f} ms，读取 {read * 1000:.0f} ms，文件 {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+
+    failed = False
+    # 命中的flags与逐个扫描相同
+    tokens = {flag.id: flag_tokens(flag) for flag in flags}
+    same = all({flag_id for flag_id, _ in index.search(query, len(flags))} == brute_force(tokens, query)
+               for query in queries)
+    failed = failed or not same
+    print(f"\n   命中结果与逐个扫描一致: {'✅' if same else '❌'}")
+
+    # 增删改之后与重新建立的索引相同（失效文档仍计入词频统计，重新编号之后得分才完全相同）
+    by_id = {flag.id: flag for flag in flags}
+    # 删除和修改各2000个，flags较少时各取一半以内
+    changed = min(2000, len(flags) // 2)
+    for flag in rng.sample(flags, changed):
+        index.remove(flag.id)
+        del by_id[flag.id]
+    for flag in rng.sample(list(by_id.values()), changed):
+        flag.add_check(CheckRecord.now(50, rng.choice(NOTES[2:])))
+        index.update(flag)
+    for flag in make_flags(1000, seed=99):
+        index.add(flag)
+        by_id[flag.id] = flag
+    index.save(path)
+    incremental = SearchIndex.load(path)
+    rebuilt = SearchIndex()
+    for flag in by_id.values():
+        rebuilt.add(flag)
+    same = all(same_results(incremental.search(query, len(by_id)), rebuilt.search(query, len(by_id)), False)
+               for query in queries)
+    incremental.compact()
+    exact = all(same_results(incremental.search(query, len(by_id)), rebuilt.search(query, len(by_id)), True)
+                for query in queries)
+    failed = failed or not same or not exact
+    print(f"   增删改之后命中结果与重新建立的索引一致: {'✅' if same else '❌'}，重新编号后得分一致: {'✅' if exact else '❌'}")
+
+    modes = [("numpy" if search.np is not None else "未安装numpy", search.np)]
+    if search.np is not None:
+        modes.append(("不使用numpy", None))
+    print(f"\n⏱️  查询耗时（每次取前20条）")
+    print(f"   {'方式':<14}{'次数':>6}{'平均(ms)':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'结果一致':>10}")
+    expected = None
+    for label, module in modes:
+        saved_np, search.np = search.np, module
+        try:
+            timings = []
+            results = []
+            # 纯Python路径较慢，只跑一部分查询
+            for i in range(args.queries if module is not None else min(args.queries, 200)):
+                query = queries[i % len(queries)]
+                started = time.perf_counter()
+                results.append(loaded.search(query, 20))
+                timings.append((time.perf_counter() - started) * 1000)
+        finally:
+            search.np = saved_np
+        if expected is None:
+            expected = results
+        same = all([flag_id for flag_id, _ in a] == [flag_id for flag_id, _ in b] for a, b in zip(results, expected))
+        failed = failed or not same
+        print(f"   {label:<14}{len(timings):>6}{statistics.mean(timings):>10.3f}{percentile(timings, 0.5):>10.3f}"
+              f"{percentile(timings, 0.99):>10.3f}{'✅' if same else '❌':>10}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - 二进制快照测试
+在临时目录中生成同一份数据的JSON文件（json存储，indent=2）和二进制快照（snapshot存储），比较：
+文件大小、写入耗时、整体加载耗时（读出全部字典 / FlagManager加载全部flags），
+以及只读命令（stats、reminders、list --status 已完成）的耗时，
+每次都新建FlagManager（相当于一次命令行调用去掉解释器启动），并检查快照与JSON往返转换后数据不变、两种格式的结果相同。
+用法: python bench_snapshot.py [--flags 100000] [--runs 5]
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from create_sample_data import generate_flags
+from main import FlagManager
+from storage import JSONStorage, SnapshotStorage
+
+COMMANDS = {
+    "stats": lambda manager: manager.get_statistics(),
+    "reminders": lambda manager: [flag.id for flag in manager.get_monthly_reminders()],
+    "list --status 已完成": lambda manager: [flag.id for flag in manager.list_flags(status="已完成")],
+}
+
+
+def timed(action, runs):
+    """运行 runs 次，返回 (耗时毫秒列表, 最后一次的结果)"""
+    timings = []
+    result = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = action()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings, result
+
+
+def run_command(storage_class, data_file, command):
+    """新建FlagManager执行一个只读命令"""
+    manager = FlagManager(data_file, storage=storage_class(data_file))
+    try:
+        return COMMANDS[command](manager)
+    finally:
+        manager.close()
+
+
+def load_all(storage_class, data_file):
+    storage = storage_class(data_file)
+    try:
+        return storage.load()
+    finally:
+        storage.close()
+
+
+def load_manager(storage_class, data_file):
+    """新建FlagManager并加载全部flags（快照只读取头部，检查记录按需读取）"""
+    manager = FlagManager(data_file, storage=storage_class(data_file))
+    try:
+        return len(manager.flags)
+    finally:
+        manager.close()
+
+
+def print_row(label, json_timings, snap_timings):
+    json_ms, snap_ms = statistics.median(json_timings), statistics.median(snap_timings)
+    # 汉字占两列宽
+    width = 28 - sum(1 for ch in label if ord(ch) > 0x2E80)
+    print(f"   {label:<{width}}{json_ms:>12.1f}{snap_ms:>12.1f}{json_ms / snap_ms:>9.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="二进制快照测试")
+    parser.add_argument("--flags", type=int, default=100000, help="flags数量 (默认: 100000)")
+    parser.add_argument("--runs", type=int, default=5, help="每项运行次数 (默认: 5)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="flag_snapshot_")
+    try:
+        flags = list(generate_flags(args.flags))
+        json_file = os.path.join(workdir, "flags.json")
+        snap_file = os.path.join(workdir, "flags.snap")
+        json_store, snap_store = JSONStorage(json_file), SnapshotStorage(snap_file)
+        json_save, _ = timed(lambda: json_store.save(flags), 1)
+        snap_save, _ = timed(lambda: snap_store.save(flags), 1)
+        json_store.close()
+        snap_store.close()
+
+        json_size, snap_size = os.path.getsize(json_file), os.path.getsize(snap_file)
+        print(f"\n📦 {args.flags} 个flags，中位耗时取 {args.runs} 次")
+        print(f"   文件大小: JSON {json_size / 1024 / 1024:.1f} MB，快照 {snap_size / 1024 / 1024:.1f} MB"
+              f"（{snap_size / json_size:.0%}）")
+        print(f"\n   {'项目':<26}{'JSON(ms)':>12}{'快照(ms)':>10}{'加速':>8}")
+        print_row("写入", json_save, snap_save)
+
+        json_timings, json_flags = timed(lambda: load_all(JSONStorage, json_file), args.runs)
+        snap_timings, snap_flags = timed(lambda: load_all(SnapshotStorage, snap_file), args.runs)
+        print_row("整体加载（全部字典）", json_timings, snap_timings)
+        same = json_flags == snap_flags == flags
+        json_timings, json_count = timed(lambda: load_manager(JSONStorage, json_file), args.runs)
+        snap_timings, snap_count = timed(lambda: load_manager(SnapshotStorage, snap_file), args.runs)
+        print_row("FlagManager.flags", json_timings, snap_timings)
+        same = same and json_count == snap_count
+
+        for command in COMMANDS:
+            json_timings, json_result = timed(lambda: run_command(JSONStorage, json_file, command), args.runs)
+            snap_timings, snap_result = timed(lambda: run_command(SnapshotStorage, snap_file, command), args.runs)
+            print_row(command, json_timings, snap_timings)
+            same = same and json_result == snap_result
+
+        print(f"\n   往返转换数据不变、两种格式结果相同: {'✅' if same else '❌'}")
+        return 0 if same else 1
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - 命令行启动测试
+在临时目录中生成数据，分别测量：空解释器启动、cli.py --help、本地执行命令（冷启动：导入模块并加载数据）
+和有常驻服务时执行命令（热启动：只转发参数），并检查两种方式的输出相同。
+用法: python bench_startup.py [--flags 10000] [--runs 10]
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import cli_server
+from create_sample_data import generate_flags, write_flags
+
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cli.py")
+COMMANDS = [["stats"], ["reminders"], ["list", "--status", "已完成"]]
+
+
+def timed_run(command, cwd, env, runs):
+    """运行命令 runs 次，返回 (耗时毫秒列表, 最后一次的输出)"""
+    timings = []
+    output = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run(command, cwd=cwd, env=env, capture_output=True, text=True)
+        timings.append((time.perf_counter() - started) * 1000)
+        if result.returncode:
+            raise RuntimeError(f"{' '.join(command)} 失败: {result.stderr}")
+        output = result.stdout
+    return timings, output
+
+
+def print_row(label, timings):
+    print(f"   {label:<38}{statistics.mean(timings):>10.1f}{statistics.median(timings):>10.1f}{min(timings):>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="命令行启动测试")
+    parser.add_argument("--flags", type=int, default=10000, help="flags数量 (默认: 10000)")
+    parser.add_argument("--runs", type=int, default=10, help="每项运行次数 (默认: 10)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="flag_startup_")
+    socket_file = os.path.join(workdir, "bench.sock")
+    env = dict(os.environ, FLAG_SOCKET=socket_file)
+    env.pop("FLAG_PROFILE", None)
+    server = None
+    try:
+        write_flags(os.path.join(workdir, "flags.json"), generate_flags(args.flags))
+        print(f"\n🚀 {args.flags} 个flags，每项运行 {args.runs} 次")
+        print(f"   {'项目':<36}{'平均(ms)':>10}{'中位(ms)':>10}{'最快(ms)':>10}")
+        print_row("python -c pass", timed_run([sys.executable, "-c", "pass"], workdir, env, args.runs)[0])
+        print_row("cli.py --help", timed_run([sys.executable, CLI, "--help"], workdir, env, args.runs)[0])
+
+        local = {}
+        for command in COMMANDS:
+            timings, local[tuple(command)] = timed_run([sys.executable, CLI] + command, workdir, env, args.runs)
+            print_row(f"本地 {' '.join(command)}", timings)
+
+        server = subprocess.Popen([sys.executable, CLI, "serve"], cwd=workdir, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 30
+        while not os.path.exists(socket_file):
+            if time.monotonic() > deadline or server.poll() is not None:
+                raise RuntimeError("常驻服务没有启动")
+            time.sleep(0.05)
+
+        same = True
+        for command in COMMANDS:
+            # 第一次由服务加载数据，不计入
+            timed_run([sys.executable, CLI] + command, workdir, env, 1)
+            timings, output = timed_run([sys.executable, CLI] + command, workdir, env, args.runs)
+            same = same and output == local[tuple(command)]
+            print_row(f"常驻服务 {' '.join(command)}", timings)
+
+        # 不含解释器启动的转发耗时
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            timings = []
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                reply = cli_server.call(["stats"], socket_file)
+                timings.append((time.perf_counter() - started) * 1000)
+        finally:
+            os.chdir(cwd)
+        print_row("常驻服务 stats（进程内调用）", timings)
+        same = same and reply is not None and reply["stdout"] == local[("stats",)]
+        print(f"\n   常驻服务与本地执行的输出一致: {'✅' if same else '❌'}")
+        return 0 if same else 1
+    finally:
+        if server is not None:
+            cli_server.stop(socket_file)
+            server.wait(timeout=10)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - 多用户测试
+在临时目录中生成多个用户的数据，比较跨用户统计在当前进程中逐个读取和用进程池并行读取的耗时，
+检查两者结果相同、合计等于各用户之和，并检查FlagManager缓存不超过数量和内存上限。
+用法: python bench_tenants.py [--users 32] [--flags 5000] [--workers N]
+"""
+
+import argparse
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from tenants import BASE_FOOTPRINT, FLAG_FOOTPRINT, TenantStore
+
+
+def make_users(store, users, flags, seed=3):
+    """每个用户生成 flags 个flags，部分带检查记录"""
+    rng = random.Random(seed)
+    for i in range(users):
+        manager = store.open(f"user{i:03d}")
+        try:
+            added = manager.add_flags({
+                "title": f"目标{j}",
+                "description": "每天坚持学习一小时" * rng.randint(1, 6),
+                "target_date": f"2027-{rng.randint(1, 12):02d}-15",
+                "category": rng.choice(["学习", "健康", "工作", "其他"]),
+            } for j in range(flags))
+            manager.update_progress_many((flag.id, rng.choice([0, 30, 100])) for flag in added[::3])
+        finally:
+            manager.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多用户测试")
+    parser.add_argument("--users", type=int, default=32, help="用户数 (默认: 32)")
+    parser.add_argument("--flags", type=int, default=5000, help="每个用户的flags数量 (默认: 5000)")
+    parser.add_argument("--workers", type=int, help="进程数 (默认: CPU核数)")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="flag_users_")
+    store = TenantStore(root)
+    started = time.perf_counter()
+    make_users(store, args.users, args.flags)
+    print(f"\n👥 {args.users} 个用户 × {args.flags} 个flags，生成数据 {time.perf_counter() - started:.1f} 秒")
+
+    started = time.perf_counter()
+    serial, serial_users = store.statistics(workers=1)
+    serial_time = time.perf_counter() - started
+    started = time.perf_counter()
+    parallel, parallel_users = store.statistics(workers=args.workers)
+    parallel_time = time.perf_counter() - started
+
+    same = serial == parallel and serial_users == parallel_users
+    summed = sum(stats["total"] for stats in parallel_users.values()) == parallel["total"] == args.users * args.flags
+    print(f"\n📊 跨用户统计")
+    print(f"   逐个读取 {serial_time:.2f} 秒，进程池并行 {parallel_time:.2f} 秒（{serial_time / parallel_time:.1f}x）")
+    print(f"   结果相同: {'✅' if same else '❌'}，合计等于各用户之和: {'✅' if summed else '❌'}")
+
+    # 缓存上限：内存只够放下约4个用户的数据
+    per_user = BASE_FOOTPRINT + args.flags * FLAG_FOOTPRINT
+    limited = TenantStore(root, max_open=8, max_memory=per_user * 4)
+    peak_open = peak_memory = 0
+    for i in range(args.users * 2):
+        with limited.lease(f"user{i % args.users:03d}") as manager:
+            manager.flags
+        peak_open = max(peak_open, len(limited))
+        peak_memory = max(peak_memory, limited.memory_usage())
+    bounded = peak_open <= 8 and peak_memory <= limited.max_memory + per_user
+    limited.close()
+    shutil.rmtree(root, ignore_errors=True)
+    print(f"\n🗂️  缓存: 最多同时打开 {peak_open} 个，估算内存峰值 {peak_memory / 1024 / 1024:.1f} MB"
+          f"（上限 {limited.max_memory / 1024 / 1024:.1f} MB）: {'✅' if bounded else '❌'}")
+    return 0 if same and summed and bounded else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
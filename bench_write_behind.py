@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - 延迟写入测试
+1. 吞吐量：同一批进度更新分别用同步写入和写入延迟模式（FlagManager 的 write_delay）执行，比较耗时和提交次数；
+2. 退出时不丢数据：子进程在写入延迟很长（不会由后台线程写入）的情况下连续更新，
+   然后正常返回、调用 sys.exit、抛出未捕获的异常、调用 close() 或收到 SIGTERM，检查全部更新都已写入；
+3. 多进程：几个写入延迟模式的进程同时更新同一批flags，检查每条检查记录都被保存且只保存一次；
+4. 写入时读取：一个线程写、一个线程读（与Web应用一样共用 mutex），另一个进程同时提交变更，
+   后台线程写入和在最新数据上重新应用变更期间，读到过的更新不会从内存中消失，最终也都被保存。
+子进程通过重新运行本脚本（--child）启动，atexit 只在正常结束的解释器中运行。
+这是修改存储或延迟写入代码后的必跑检查（见 README），有丢失或重复的更新时退出码为1。
+用法: python bench_write_behind.py [--ops 500] [--backend journal]
+"""
+
+import argparse
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from main import FlagManager
+from storage import BACKENDS, open_storage
+
+BACKEND_FILES = {"json": "flags.json", "journal": "flags.json", "jsonl": "flags.jsonl", "sqlite": "flags.db",
+                 "snapshot": "flags.snap"}
+EXIT_MODES = ["return", "sys.exit", "exception", "close", "SIGTERM"]
+# 退出测试中子进程的写入延迟，足够长，退出前不会由后台线程写入
+LONG_DELAY = 3600
+# 边写边读测试的轮数
+READ_ROUNDS = 3
+
+
+def seed(data_file, backend, count):
+    """创建 count 个flags，返回它们的ID"""
+    manager = FlagManager(data_file, storage=open_storage(data_file, backend))
+    try:
+        with manager.batch():
+            return [manager.add_flag(f"初始flag {i}", "每周跑步三次，每次三十分钟", "2030-01-01").id
+                    for i in range(count)]
+    finally:
+        manager.close()
+
+
+def check_notes(data_file, backend, expected):
+    """重新读取数据，返回 (丢失数, 重复数)"""
+    manager = FlagManager(data_file, storage=open_storage(data_file, backend))
+    try:
+        notes = [record.notes for flag in manager.flags for record in flag.check_history]
+    finally:
+        manager.close()
+    return len(set(expected) - set(notes)), len(notes) - len(set(notes))
+
+
+def child(mode, data_file, backend, ops, prefix, write_delay, max_pending):
+    """子进程：写入延迟模式下更新进度，然后按 mode 退出"""
+    manager = FlagManager(data_file, storage=open_storage(data_file, backend),
+                          write_delay=write_delay, max_pending=max_pending)
+    flag_ids = [flag.id for flag in manager.flags]
+    for i in range(ops):
+        manager.update_progress(flag_ids[i % len(flag_ids)], i % 100, f"{prefix}-{i}")
+    # 告诉父进程有多少操作还没写入
+    print(manager.unsaved_count, flush=True)
+    if mode == "sys.exit":
+        sys.exit(0)
+    if mode == "exception":
+        raise RuntimeError("模拟程序出错退出")
+    if mode == "close":
+        manager.close()
+    if mode == "SIGTERM":
+        # 等待父进程发送信号
+        time.sleep(60)
+
+
+def spawn(mode, data_file, backend, ops, prefix, write_delay=LONG_DELAY, max_pending=1000000):
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__), "--child", mode, data_file,
+                             "--backend", backend, "--ops", str(ops), "--prefix", prefix,
+                             "--write-delay", str(write_delay), "--max-pending", str(max_pending)],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+
+
+def throughput(workdir, backend, ops):
+    """同步写入与写入延迟模式的耗时和提交次数"""
+    print(f"\n⏱️  {backend}: {ops} 次进度更新")
+    for label, write_delay in (("同步写入", None), ("写入延迟 0.5s", 0.5)):
+        data_file = os.path.join(workdir, f"throughput-{write_delay}-{backend}-{BACKEND_FILES[backend]}")
+        flag_ids = seed(data_file, backend, 200)
+        manager = FlagManager(data_file, storage=open_storage(data_file, backend), write_delay=write_delay)
+        version = manager.storage.lock.version()
+        started = time.perf_counter()
+        for i in range(ops):
+            manager.update_progress(flag_ids[i % len(flag_ids)], i % 100, f"t-{i}")
+        returned = time.perf_counter() - started
+        manager.close()
+        elapsed = time.perf_counter() - started
+        storage = open_storage(data_file, backend)
+        commits = storage.lock.version() - version
+        storage.close()
+        lost, duplicated = check_notes(data_file, backend, [f"t-{i}" for i in range(ops)])
+        print(f"   {label:<12} 写操作 {returned * 1000:>8.1f} ms，含最后写入 {elapsed * 1000:>8.1f} ms，"
+              f"{ops / elapsed:>8.0f} 次/秒，提交 {commits} 次，丢失 {lost}，重复 {duplicated}")
+
+
+def exits(workdir, backend, ops):
+    """各种正常退出方式都写入了延迟写入的变更"""
+    print(f"\n🚪 {backend}: 子进程写入延迟 {LONG_DELAY}s，{ops} 次更新后退出")
+    ok = True
+    for mode in EXIT_MODES:
+        data_file = os.path.join(workdir, f"exit-{mode}-{backend}-{BACKEND_FILES[backend]}")
+        seed(data_file, backend, 20)
+        process = spawn(mode, data_file, backend, ops, mode)
+        unsaved = process.stdout.readline().strip()
+        if mode == "SIGTERM":
+            process.send_signal(signal.SIGTERM)
+        process.communicate(timeout=60)
+        lost, duplicated = check_notes(data_file, backend, [f"{mode}-{i}" for i in range(ops)])
+        passed = unsaved == str(ops) and not lost and not duplicated
+        ok = ok and passed
+        print(f"   {mode:<10} 退出码 {process.returncode:>4}，退出前未写入 {unsaved:>5}，丢失 {lost}，重复 {duplicated} "
+              f"{'✅' if passed else '❌'}")
+    return ok
+
+
+def concurrent(workdir, backend, ops, workers):
+    """多个写入延迟模式的进程同时更新同一批flags"""
+    data_file = os.path.join(workdir, f"concurrent-{backend}-{BACKEND_FILES[backend]}")
+    seed(data_file, backend, 20)
+    started = time.perf_counter()
+    processes = [spawn("return", data_file, backend, ops, f"w{w}", write_delay=0.01, max_pending=20)
+                 for w in range(workers)]
+    for process in processes:
+        process.communicate(timeout=120)
+    elapsed = time.perf_counter() - started
+    lost, duplicated = check_notes(data_file, backend, [f"w{w}-{i}" for w in range(workers) for i in range(ops)])
+    ok = not lost and not duplicated and not any(process.returncode for process in processes)
+    print(f"\n👥 {backend}: {workers} 个写入延迟模式的进程 × {ops} 次更新，耗时 {elapsed:.2f}s，"
+          f"丢失 {lost}，重复 {duplicated} {'✅' if ok else '❌'}")
+    return ok
+
+
+class SlowReloadManager(FlagManager):
+    """重新加载内存数据后停顿一下，加大读取落在重新加载和重新应用变更之间的机会"""
+
+    def _set_flags(self, flags):
+        super()._set_flags(flags)
+        time.sleep(0.002)
+
+
+def reads(workdir, backend, ops, round_no=0):
+    """写入延迟模式下边写边读，另一个进程同时提交，后台线程写入期间读到的数据不会回退"""
+    data_file = os.path.join(workdir, f"reads-{round_no}-{backend}-{BACKEND_FILES[backend]}")
+    seed(data_file, backend, 20)
+    mutex = threading.RLock()
+    manager = SlowReloadManager(data_file, storage=open_storage(data_file, backend),
+                                write_delay=0.005, max_pending=10, mutex=mutex)
+    flag_ids = [flag.id for flag in manager.flags]
+    version = manager.storage.lock.version()
+    # 另一个进程频繁提交，本进程写入时基本都要先重新加载再重新应用
+    other = spawn("return", data_file, backend, ops, "other", write_delay=0.005, max_pending=1)
+    done = threading.Event()
+    
+    def write():
+        try:
+            # 等另一个进程开始提交，写操作放慢一些，与它和后台线程的写入交错
+            while manager.storage.lock.version() == version and other.poll() is None:
+                time.sleep(0.001)
+            for i in range(ops):
+                with mutex:
+                    manager.update_progress(flag_ids[i % len(flag_ids)], i % 100, f"r-{i}")
+                time.sleep(0.001)
+        finally:
+            done.set()
+    
+    # 频繁切换线程，让读取落在后台线程写入的各个步骤之间
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    writer = threading.Thread(target=write)
+    writer.start()
+    seen = set()
+    vanished = read_count = 0
+    while not done.is_set():
+        # 不持有 mutex 检查版本号（只读线程、命令行都是这样），可能在其中重新加载
+        manager.refresh()
+        with mutex:
+            notes = {record.notes for flag in manager.flags for record in flag.check_history
+                     if record.notes.startswith("r-")}
+        vanished += len(seen - notes)
+        seen |= notes
+        read_count += 1
+        # 读得太勤时基本都由读取线程先发现版本变化并写入，留出时间让后台线程写入
+        time.sleep(0.001)
+    writer.join()
+    sys.setswitchinterval(interval)
+    manager.close()
+    other.communicate(timeout=120)
+    expected = [f"r-{i}" for i in range(ops)] + [f"other-{i}" for i in range(ops)]
+    lost, duplicated = check_notes(data_file, backend, expected)
+    ok = not vanished and not lost and not duplicated and not other.returncode
+    print(f"\n📖 {backend}: 边写边读 {ops} 次更新（另一个进程同时提交），读取 {read_count} 次，"
+          f"读到后又消失的更新 {vanished}，丢失 {lost}，重复 {duplicated} {'✅' if ok else '❌'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="延迟写入测试")
+    parser.add_argument("--ops", type=int, default=500, help="每项的写入次数 (默认: 500)")
+    parser.add_argument("--workers", type=int, default=4, help="多进程测试的进程数量 (默认: 4)")
+    parser.add_argument("--backend", choices=list(BACKENDS) + ["all"], default="all", help="存储后端 (默认: 全部)")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "DATA_FILE"), help=argparse.SUPPRESS)
+    parser.add_argument("--prefix", default="", help=argparse.SUPPRESS)
+    parser.add_argument("--write-delay", type=float, default=LONG_DELAY, help=argparse.SUPPRESS)
+    parser.add_argument("--max-pending", type=int, default=1000000, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mode, data_file = args.child
+        child(mode, data_file, args.backend, args.ops, args.prefix, args.write_delay, args.max_pending)
+        return 0
+
+    backends = list(BACKENDS) if args.backend == "all" else [args.backend]
+    workdir = tempfile.mkdtemp(prefix="flag_write_behind_")
+    try:
+        ok = True
+        for backend in backends:
+            throughput(workdir, backend, args.ops)
+            ok = exits(workdir, backend, args.ops) and ok
+            ok = concurrent(workdir, backend, args.ops // 2, args.workers) and ok
+            # 竞争窗口很小，多跑几轮
+            for round_no in range(READ_ROUNDS):
+                ok = reads(workdir, backend, args.ops, round_no) and ok
+        print("\n✅ 没有丢失更新" if ok else "\n❌ 发现丢失或重复的更新")
+        return 0 if ok else 1
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,43 +4,55 @@ Flag进度检查提醒脚本
 可以设置为定时任务，定期检查需要关注的flags
 """
 
+import argparse
 import sys
 import os
 from datetime import datetime, timedelta
 from main import FlagManager
+import reports
 
-def check_and_remind():
+def collect_reminders(manager):
+    """读取一份数据的提醒和统计"""
+    return {
+        # 月度提醒
+        "monthly": manager.get_monthly_reminders(),
+        # 即将到期的flags（30天内），按剩余天数排序
+        "upcoming": manager.get_upcoming_deadlines(30),
+        # 最近完成的flags（最近7天内）
+        "completed": manager.get_recently_completed(7),
+        "stats": manager.get_statistics(),
+    }
+
+def check_and_remind(manager=None):
     """检查并发送提醒"""
-    manager = FlagManager()
+    manager = manager or FlagManager()
     
     print(f"🔍 检查时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("=" * 50)
     
-    # 获取月度提醒
-    monthly_reminders = manager.get_monthly_reminders()
-    
-    # 获取即将到期的flags（30天内）
-    today = datetime.now()
-    upcoming_deadlines = []
-    
-    for flag in manager.flags:
-        if flag["status"] in ["进行中", "未开始"]:
-            try:
-                target_date = datetime.strptime(flag["target_date"], "%Y-%m-%d")
-                days_until_deadline = (target_date - today).days
-                
-                if 0 <= days_until_deadline <= 30:
-                    upcoming_deadlines.append((flag, days_until_deadline))
-            except ValueError:
-                continue
+    return print_reminders(collect_reminders(manager))
+
+def check_all_users(store, workers=None):
+    """在各用户之间并发检查，按用户依次显示提醒"""
+    print(f"🔍 检查时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    results = store.map(collect_reminders, workers=workers)
+    if not results:
+        print(f"📭 {store.root} 下没有用户数据")
+        return 0
     
-    # 获取最近完成的flags
-    recently_completed = []
-    for flag in manager.flags:
-        if flag["status"] == "已完成" and flag["check_history"]:
-            last_update = datetime.strptime(flag["check_history"][-1]["date"], "%Y-%m-%d %H:%M:%S")
-            if (today - last_update).days <= 7:  # 最近7天内完成的
-                recently_completed.append(flag)
+    count = 0
+    for user, reminders in results:
+        print("\n" + "=" * 50)
+        print(f"👤 用户: {user}")
+        print("=" * 50)
+        count += print_reminders(reminders)
+    return count
+
+def print_reminders(reminders):
+    """显示提醒和统计，返回需要处理的flags数量"""
+    monthly_reminders = reminders["monthly"]
+    upcoming_deadlines = reminders["upcoming"]
+    recently_completed = reminders["completed"]
     
     # 显示结果
     if monthly_reminders:
@@ -49,16 +61,15 @@ def check_and_remind():
             print(f"\n🎯 {flag['title']}")
             print(f"   当前进度: {flag['progress']}%")
             print(f"   目标日期: {flag['target_date']}")
-            if flag['check_history']:
-                last_check = flag['check_history'][-1]['date']
-                print(f"   上次检查: {last_check}")
+            if flag.last_check_date:
+                print(f"   上次检查: {flag.last_check_date}")
             print(f"   💡 建议: 是时候更新这个flag的进度了！")
     else:
         print("✅ 暂无需要检查的flags")
     
     if upcoming_deadlines:
         print(f"\n⏰ 有 {len(upcoming_deadlines)} 个flags即将到期：")
-        for flag, days_left in sorted(upcoming_deadlines, key=lambda x: x[1]):
+        for flag, days_left in upcoming_deadlines:
             print(f"\n🎯 {flag['title']}")
             print(f"   剩余时间: {days_left} 天")
             print(f"   当前进度: {flag['progress']}%")
@@ -74,12 +85,11 @@ def check_and_remind():
         print(f"\n🎉 最近完成 {len(recently_completed)} 个flags：")
         for flag in recently_completed:
             print(f"   ✅ {flag['title']}")
-            if flag['check_history']:
-                completed_date = flag['check_history'][-1]['date']
-                print(f"      完成时间: {completed_date}")
+            if flag.last_check_date:
+                print(f"      完成时间: {flag.last_check_date}")
     
     # 显示总体统计
-    stats = manager.get_statistics()
+    stats = reminders["stats"]
     print(f"\n📊 总体情况：")
     print(f"   总flags数: {stats['total']}")
     print(f"   完成率: {stats['completion_rate']:.1f}%")
@@ -96,52 +106,87 @@ def check_and_remind():
     
     return len(monthly_reminders) + len(upcoming_deadlines)
 
-def generate_report():
-    """生成详细的进度报告"""
-    manager = FlagManager()
-    today = datetime.now()
+def generate_report(fmt="text", output=None, incremental=False, manager=None):
+    """生成详细的进度报告（一次遍历数据，流式写入磁盘，见 reports.py）"""
+    manager = manager or FlagManager()
+    filename, rendered = reports.generate_report(manager, fmt, output, incremental)
+    print(f"📄 详细报告已生成: {filename}")
+    if incremental:
+        print(f"   重新生成的分组: {', '.join(rendered) if rendered else '无（全部沿用上次的结果）'}")
+    return filename
+
+def run_daemon(args, manager=None, store=None):
+    """常驻模式：提醒到期时准时发出；store 不为None时为其中全部用户并发运行，
+    各用户的数据只在重新计算和发出提醒时临时打开（见 reminder_daemon.TenantReminderDaemon）"""
+    import asyncio
+    from reminder_daemon import run_daemons, run_tenant_daemons
+    options = dict(stale_days=args.stale_days, deadline_days=args.deadline_days, urgent_days=args.urgent_days,
+                   watch_interval=args.watch_interval)
+    sinks = args.sink or ["stdout"]
+    if store is not None:
+        asyncio.run(run_tenant_daemons(store, sinks, **options))
+    else:
+        asyncio.run(run_daemons({args.user: manager}, sinks, **options))
+
+def main(argv=None):
+    """命令行入口，argv 为None时读取命令行参数"""
+    parser = argparse.ArgumentParser(prog="check_reminder.py", description="Flag进度检查提醒")
+    parser.add_argument("--report", action="store_true", help="生成详细的进度报告")
+    parser.add_argument("--format", choices=list(reports.RENDERERS), default="text", help="报告格式 (默认: text)")
+    parser.add_argument("--output", help="报告文件名 (默认: flag_report_<时间>.<扩展名>)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="增量生成：只重新生成数据有变化的分组（缓存在数据文件旁的 .report 目录）")
+    parser.add_argument("--daemon", action="store_true", help="常驻运行，提醒到期时立即发出（代替定时任务）")
+    parser.add_argument("--sink", action="append",
+                        help="提醒输出，可重复指定: stdout（默认）、file:路径、webhook:URL")
+    parser.add_argument("--stale-days", type=int, default=30, help="超过多少天未检查时提醒 (默认: 30)")
+    parser.add_argument("--deadline-days", type=int, default=30, help="距目标日期多少天时提醒 (默认: 30)")
+    parser.add_argument("--urgent-days", type=int, default=7, help="距目标日期多少天时紧急提醒 (默认: 7)")
+    parser.add_argument("--watch-interval", type=float, default=1.0, help="检查数据变化的间隔秒数 (默认: 1)")
+    parser.add_argument("--user", help="只检查指定用户的数据（<用户目录>/<用户>/flags.json）")
+    parser.add_argument("--all-users", action="store_true", help="检查全部用户，各用户之间并发执行")
+    parser.add_argument("--users-dir", help="用户数据根目录 (默认: 环境变量 FLAG_USERS_DIR 或 users)")
+    parser.add_argument("--workers", type=int, help="--all-users 时的并发数")
+    parser.add_argument("--profile", action="store_true",
+                        help="统计各操作的调用次数、耗时和读写字节数，退出时输出（也可用环境变量 FLAG_PROFILE）")
+    parser.add_argument("--profile-format",
+                        help="剖析结果格式: summary（默认）、trace（Chrome trace JSON）、prometheus")
+    parser.add_argument("--profile-output", help="剖析结果文件 (默认: 标准错误，trace 为 flag_trace.json)")
+    args = parser.parse_args(argv)
     
-    filename = f"flag_report_{today.strftime('%Y%m%d_%H%M%S')}.txt"
+    if args.profile or args.profile_format or os.environ.get("FLAG_PROFILE"):
+        import profiling
+        try:
+            profiling.start(args.profile_format or ("summary" if args.profile else None), args.profile_output)
+        except ValueError as e:
+            parser.error(str(e))
     
-    with open(filename, 'w', encoding='utf-8') as f:
-        f.write(f"年度Flag进度报告\n")
-        f.write(f"生成时间: {today.strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write("=" * 50 + "\n\n")
-        
-        # 总体统计
-        stats = manager.get_statistics()
-        f.write(f"总体统计:\n")
-        f.write(f"  总flags数: {stats['total']}\n")
-        f.write(f"  已完成: {stats['completed']}\n")
-        f.write(f"  进行中: {stats['in_progress']}\n")
-        f.write(f"  未开始: {stats['not_started']}\n")
-        f.write(f"  完成率: {stats['completion_rate']:.1f}%\n")
-        f.write(f"  平均可行性评分: {stats['avg_feasibility']}/100\n\n")
-        
-        # 按状态分类
-        for status in ["已完成", "进行中", "未开始"]:
-            flags = manager.list_flags(status=status)
-            if flags:
-                f.write(f"{status}的flags ({len(flags)}个):\n")
-                for flag in flags:
-                    f.write(f"  🎯 {flag['title']}\n")
-                    f.write(f"     描述: {flag['description']}\n")
-                    f.write(f"     进度: {flag['progress']}%\n")
-                    f.write(f"     目标日期: {flag['target_date']}\n")
-                    f.write(f"     可行性: {flag['feasibility_score']}/100\n\n")
-        
-        # 需要关注的flags
-        monthly_reminders = manager.get_monthly_reminders()
-        if monthly_reminders:
-            f.write(f"需要检查的flags ({len(monthly_reminders)}个):\n")
-            for flag in monthly_reminders:
-                f.write(f"  🔔 {flag['title']} - 进度: {flag['progress']}%\n")
-        
-        print(f"📄 详细报告已生成: {filename}")
-        return filename
+    store = None
+    manager = None
+    if args.user or args.all_users:
+        from tenants import TenantStore
+        store = TenantStore(args.users_dir)
+        if args.user and args.all_users:
+            parser.error("--user 和 --all-users 不能同时使用")
+        if args.user:
+            try:
+                manager = store.open(args.user)
+            except ValueError as e:
+                parser.error(str(e))
+    
+    if args.report:
+        if args.all_users:
+            parser.error("--report 一次只能生成一个用户的报告，请使用 --user")
+        generate_report(args.format, args.output, args.incremental, manager)
+    elif args.daemon:
+        if args.all_users:
+            run_daemon(args, store=store)
+        else:
+            run_daemon(args, manager or FlagManager())
+    elif args.all_users:
+        check_all_users(store, args.workers)
+    else:
+        check_and_remind(manager)
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1 and sys.argv[1] == "--report":
-        generate_report()
-    else:
-        check_and_remind()
\ No newline at end of file
+    main()
@@ -1,15 +1,21 @@
 #!/usr/bin/env python3
 """
 年度Flag管理工具 - 命令行界面
+启动时只导入 os 和 sys，参数解析、FlagManager、可行性规则、进度分析等在用到时才导入，
+--help、convert 等不需要数据的命令不会加载数据文件。
+有常驻服务（python cli.py serve，见 cli_server.py）时命令交给服务在进程内执行，本进程只转发参数和输出。
 """
 
-import argparse
+import os
 import sys
-from datetime import datetime
-from main import FlagManager
 
-def print_flag(flag):
-    """格式化打印flag信息"""
+# 带参数值的全局选项，判断子命令时跳过它们的值
+GLOBAL_VALUE_OPTIONS = ('--user', '--users-dir', '--workers', '--profile-format', '--profile-output')
+# 始终在本地执行的命令
+LOCAL_COMMANDS = ('serve',)
+
+def print_flag(flag, detail=False):
+    """格式化打印flag信息，detail=True 时列出全部检查记录"""
     print(f"\n🎯 {flag['title']}")
     print(f"   ID: {flag['id'][:8]}...")
     print(f"   描述: {flag['description']}")
@@ -21,8 +27,15 @@ def print_flag(flag):
     print(f"   可行性分析: {flag['feasibility_reason']}")
     print(f"   创建时间: {flag['created_date']}")
     
-    if flag['check_history']:
-        print(f"   最近检查: {flag['check_history'][-1]['date']}")
+    # 最近检查时间缓存在flag头部，只有详情视图才读取完整的检查记录
+    if flag.last_check_date:
+        print(f"   最近检查: {flag.last_check_date}")
+    
+    if detail and flag.checks:
+        print(f"   检查记录 ({flag.checks} 条):")
+        for record in flag.check_history:
+            notes = f" - {record.notes}" if record.notes else ""
+            print(f"     {record.date}  {record.progress}%{notes}")
 
 def add_flag(manager, args):
     """添加新flag"""
@@ -58,18 +71,32 @@ def list_flags(manager, args):
 
 def update_progress(manager, args):
     """更新进度"""
-    success = manager.update_progress(args.flag_id, args.progress, args.notes or "")
+    from indexes import AmbiguousIdError
+    try:
+        success = manager.update_progress(args.flag_id, args.progress, args.notes or "")
+    except AmbiguousIdError as e:
+        print(f"❌ {e}")
+        return
     if success:
         print("✅ 进度更新成功！")
         # 显示更新后的flag
-        flags = manager.list_flags()
-        for flag in flags:
-            if flag['id'].startswith(args.flag_id):
-                print_flag(flag)
-                break
+        print_flag(manager.get_flag(args.flag_id))
     else:
         print("❌ 未找到对应的flag，请检查ID是否正确")
 
+def show_flag(manager, args):
+    """显示flag详情"""
+    from indexes import AmbiguousIdError
+    try:
+        flag = manager.get_flag(args.flag_id)
+    except AmbiguousIdError as e:
+        print(f"❌ {e}")
+        return
+    if flag is None:
+        print("❌ 未找到对应的flag，请检查ID是否正确")
+        return
+    print_flag(flag, detail=True)
+
 def show_reminders(manager, args):
     """显示月度提醒"""
     reminders = manager.get_monthly_reminders()
@@ -94,17 +121,211 @@ def show_stats(manager, args):
     print(f"   未开始: {stats['not_started']}")
     print(f"   完成率: {stats['completion_rate']:.1f}%")
     print(f"   平均可行性评分: {stats['avg_feasibility']}/100")
+    
+    if stats['by_category']:
+        print(f"   分类分布: " + "、".join(f"{name} {count}" for name, count in stats['by_category'].items()))
+    
+    if args.verify:
+        drift = manager.verify_statistics(repair=True)
+        if drift:
+            print(f"\n⚠️  统计计数存在偏差，已重新计算：")
+            for key, (stored, actual) in drift.items():
+                print(f"   {key}: {stored} -> {actual}")
+        else:
+            print(f"\n✅ 统计计数校验通过")
 
 def delete_flag(manager, args):
     """删除flag"""
-    success = manager.delete_flag(args.flag_id)
+    from indexes import AmbiguousIdError
+    try:
+        success = manager.delete_flag(args.flag_id)
+    except AmbiguousIdError as e:
+        print(f"❌ {e}")
+        return
     if success:
         print("✅ Flag删除成功！")
     else:
         print("❌ 未找到对应的flag，请检查ID是否正确")
 
-def main():
-    parser = argparse.ArgumentParser(description="年度Flag管理工具")
+def compact_storage(manager, args):
+    """压缩存储"""
+    manager.compact()
+    print("✅ 存储已压缩！")
+
+def rescore_flags(manager, args):
+    """用当前规则重新评估全部flags的可行性"""
+    import feasibility
+    try:
+        plan = feasibility.load_plan(args.rules)
+    except (OSError, ValueError) as e:
+        print(f"❌ 无法加载规则文件: {e}")
+        return
+    timings = {} if args.profile else None
+    total, changed = manager.rescore(plan=plan, timings=timings)
+    print(f"✅ 已重新评估 {total} 个flags，其中 {changed} 个评分有变化（规则: {plan.source}）")
+    
+    if timings:
+        spent = sum(timings.values()) or 1
+        print(f"\n⏱️  各规则耗时:")
+        for name, seconds in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+            print(f"   {name:<24} {seconds * 1000:>9.1f} ms  {seconds / spent * 100:>5.1f}%")
+
+def show_analytics(manager, args):
+    """显示进度速度、推算完成日期和风险分类"""
+    import analytics
+    unknown = [risk for risk in args.risk or [] if risk not in analytics.RISK_LEVELS]
+    if unknown:
+        print(f"❌ 未知的风险分类: {', '.join(unknown)}（可选: {', '.join(analytics.RISK_LEVELS)}）")
+        return
+    results = analytics.ProgressAnalytics(manager, analytics.default_cache_file(manager.data_file)).analyze()
+    if args.risk:
+        results = [item for item in results if item['risk'] in args.risk]
+    
+    if not results:
+        print("📈 没有符合条件的flags")
+        return
+    
+    counts = {}
+    for item in results:
+        counts[item['risk']] = counts.get(item['risk'], 0) + 1
+    print(f"\n📈 进度分析（{len(results)} 个flags）：" + "、".join(
+        f"{analytics.RISK_LEVELS[risk][0]} {count}" for risk, count in counts.items()))
+    for item in results[:args.limit] if args.limit else results:
+        label, icon = analytics.RISK_LEVELS[item['risk']]
+        print(f"\n{icon} [{label}] {item['title']} (ID: {item['id'][:8]})")
+        print(f"   进度: {item['progress']}%  目标日期: {item['target_date']}")
+        if item['velocity'] is not None:
+            print(f"   速度: {item['velocity']:.2f}%/天")
+        if item['projected_date'] and item['risk'] != 'completed':
+            slack = item['slack_days']
+            detail = "" if slack is None else (f"，提前 {slack} 天" if slack >= 0 else f"，延期 {-slack} 天")
+            print(f"   推算完成: {item['projected_date']}{detail}")
+
+def search_flags(manager, args):
+    """全文搜索flags"""
+    results = manager.search(args.query, limit=args.limit, rebuild=args.rebuild)
+    
+    if not results:
+        print(f"🔍 没有找到与“{args.query}”相关的flags")
+        return
+    
+    print(f"\n🔍 找到 {len(results)} 个相关flags：")
+    for flag, score in results:
+        print_flag(flag)
+        print(f"   🎯 相关度: {score:.2f}")
+
+def convert_storage(args):
+    """在不同存储格式之间转换数据
+
+    复制期间同时持有源和目标的进程间锁（按锁文件路径的顺序加锁，方向相反的两个转换不会互相等待），
+    写入后目标的版本号加一，正在使用目标数据的进程会重新加载
+    """
+    from storage import open_storage
+    if os.path.abspath(args.source) == os.path.abspath(args.target):
+        print("❌ 源文件和目标文件相同")
+        return
+    opened = []
+    try:
+        try:
+            source = open_storage(args.source, args.source_backend)
+            opened.append(source)
+            target = open_storage(args.target, args.target_backend)
+            opened.append(target)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return
+        first, second = sorted((source.lock, target.lock), key=lambda lock: lock.path)
+        with first, second:
+            flags = source.load()
+            target.save(flags)
+            target.lock.bump()
+    finally:
+        for storage in opened:
+            storage.close()
+    print(f"✅ 已转换 {len(flags)} 个flags: {args.source} ({source.name}) -> {args.target} ({target.name})")
+
+def read_import_rows(path, fmt):
+    """逐行读取CSV或JSONL文件，生成flag字段字典"""
+    import csv
+    import json
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if fmt == 'csv':
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                yield line_no, row
+        else:
+            for line_no, line in enumerate(f, start=1):
+                if line.strip():
+                    yield line_no, json.loads(line)
+
+def import_flags(manager, args):
+    """从CSV或JSONL文件批量导入flags"""
+    fmt = args.format or ('csv' if args.file.lower().endswith('.csv') else 'jsonl')
+    current = {'line': 0}
+    
+    def rows():
+        for line_no, row in read_import_rows(args.file, fmt):
+            current['line'] = line_no
+            yield row
+    
+    try:
+        added = manager.add_flags(rows())
+    except (ValueError, KeyError, OSError) as e:
+        # json.JSONDecodeError 也是 ValueError
+        print(f"❌ 导入失败（第{current['line']}行）: {e}")
+        print("   已回滚，数据文件未被修改")
+        return
+    print(f"✅ 成功导入 {len(added)} 个flags！")
+
+def show_all_users_stats(store, args):
+    """跨用户统计（各用户的计数在进程池中并行读取）"""
+    total, per_user = store.statistics(workers=args.workers)
+    if not per_user:
+        print(f"📭 {store.root} 下没有用户数据")
+        return
+    
+    print(f"\n👥 {len(per_user)} 个用户：")
+    for user, stats in per_user.items():
+        print(f"   {user}: {stats['total']} 个flags，完成率 {stats['completion_rate']:.1f}%，平均可行性 {stats['avg_feasibility']}/100")
+    print(f"\n📊 合计：")
+    print(f"   总数量: {total['total']}")
+    print(f"   已完成: {total['completed']}")
+    print(f"   进行中: {total['in_progress']}")
+    print(f"   未开始: {total['not_started']}")
+    print(f"   完成率: {total['completion_rate']:.1f}%")
+    print(f"   平均可行性评分: {total['avg_feasibility']}/100")
+    if total['by_category']:
+        print(f"   分类分布: " + "、".join(f"{name} {count}" for name, count in total['by_category'].items()))
+
+def show_all_users_reminders(store, args):
+    """在各用户之间并发查询月度提醒"""
+    results = store.map(lambda manager: manager.get_monthly_reminders(), workers=args.workers)
+    
+    total = sum(len(reminders) for _, reminders in results)
+    if not total:
+        print("📅 所有用户都暂无需要检查的flags")
+        return
+    
+    print(f"\n🔔 {len(results)} 个用户中共有 {total} 个flags需要检查进度：")
+    for user, reminders in results:
+        if not reminders:
+            continue
+        print(f"\n👤 {user}（{len(reminders)} 个）")
+        for flag in reminders:
+            print_flag(flag)
+
+def build_parser():
+    """命令行参数定义"""
+    import argparse
+    parser = argparse.ArgumentParser(prog='cli.py', description="年度Flag管理工具")
+    parser.add_argument('--user', help='操作指定用户的数据（<用户目录>/<用户>/flags.json）')
+    parser.add_argument('--all-users', action='store_true', help='汇总全部用户（stats、reminders 命令）')
+    parser.add_argument('--users-dir', help='用户数据根目录 (默认: 环境变量 FLAG_USERS_DIR 或 users)')
+    parser.add_argument('--workers', type=int, help='--all-users 时的并发数 (默认: CPU核数)')
+    parser.add_argument('--profile', dest='instrument', action='store_true',
+                        help='统计各操作的调用次数、耗时和读写字节数，退出时输出（也可用环境变量 FLAG_PROFILE）')
+    parser.add_argument('--profile-format',
+                        help='剖析结果格式: summary（默认）、trace（Chrome trace JSON）、prometheus')
+    parser.add_argument('--profile-output', help='剖析结果文件 (默认: 标准错误，trace 为 flag_trace.json)')
     subparsers = parser.add_subparsers(dest='command', help='可用命令')
     
     # 添加flag命令
@@ -125,37 +346,187 @@ def main():
     update_parser.add_argument('progress', type=int, help='进度 (0-100)')
     update_parser.add_argument('--notes', help='备注信息')
     
+    # 查看详情命令
+    show_parser = subparsers.add_parser('show', help='查看flag详情（含全部检查记录）')
+    show_parser.add_argument('flag_id', help='flag ID (前8位即可)')
+    
     # 月度提醒命令
     reminder_parser = subparsers.add_parser('reminders', help='显示月度提醒')
     
     # 统计命令
     stats_parser = subparsers.add_parser('stats', help='显示统计信息')
+    stats_parser.add_argument('--verify', action='store_true', help='重新计算统计数据并校验增量计数')
     
     # 删除命令
     delete_parser = subparsers.add_parser('delete', help='删除flag')
     delete_parser.add_argument('flag_id', help='flag ID (前8位即可)')
     
-    args = parser.parse_args()
+    # 批量导入命令
+    import_parser = subparsers.add_parser('import', help='从CSV或JSONL文件批量导入flags')
+    import_parser.add_argument('file', help='导入文件，字段: title, description, target_date, category')
+    import_parser.add_argument('--format', choices=['csv', 'jsonl'], help='文件格式 (默认按扩展名推断)')
+    
+    # 压缩存储命令
+    compact_parser = subparsers.add_parser('compact', help='把操作日志合并为快照')
+    
+    # 重新评估命令
+    rescore_parser = subparsers.add_parser('rescore', help='用当前规则重新评估全部flags的可行性（一次保存）')
+    rescore_parser.add_argument('--rules', help='规则文件 (默认: 环境变量 FLAG_RULES_FILE 或 feasibility_rules.json)')
+    rescore_parser.add_argument('--profile', action='store_true', help='显示每条规则的耗时')
+    
+    # 搜索命令
+    search_parser = subparsers.add_parser('search', help='在标题、描述和检查备注中搜索')
+    search_parser.add_argument('query', help='搜索内容')
+    search_parser.add_argument('--limit', type=int, default=20, help='最多显示条数 (默认: 20)')
+    search_parser.add_argument('--rebuild', action='store_true', help='重新建立搜索索引')
+    
+    # 进度分析命令
+    analyze_parser = subparsers.add_parser('analyze', help='按检查记录推算完成日期并标出有风险的flags')
+    analyze_parser.add_argument('--risk', action='append',
+                                help='只显示指定风险分类（可重复）: overdue、stalled、at_risk、no_data、on_track、completed')
+    analyze_parser.add_argument('--limit', type=int, help='最多显示条数')
+    
+    # 转换存储格式命令
+    convert_parser = subparsers.add_parser('convert', help='在存储格式之间转换数据（如 flags.json -> flags.db）')
+    convert_parser.add_argument('source', help='源数据文件')
+    convert_parser.add_argument('target', help='目标数据文件')
+    convert_parser.add_argument('--from', dest='source_backend', help='源存储格式: json、journal、jsonl、sqlite、snapshot (默认按扩展名推断)')
+    convert_parser.add_argument('--to', dest='target_backend', help='目标存储格式: json、journal、jsonl、sqlite、snapshot (默认按扩展名推断)')
+    
+    # 常驻服务命令
+    serve_parser = subparsers.add_parser('serve', help='常驻运行，之后的命令交给它在进程内执行（不用每次启动和加载数据）')
+    serve_parser.add_argument('--socket', help='Unix套接字路径 (默认: 环境变量 FLAG_SOCKET 或当前目录下的 .flag.sock)')
+    serve_parser.add_argument('--stop', action='store_true', help='停止正在运行的服务')
+    return parser
+
+def run(argv=None, open_manager=None, open_store=None):
+    """解析参数并执行命令
+
+    open_manager() 返回默认数据的FlagManager，open_store(用户目录) 返回TenantStore；
+    常驻服务传入自己缓存的版本，本地执行时每次新建
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
     
     if not args.command:
         parser.print_help()
         return
     
-    manager = FlagManager()
+    if args.instrument or args.profile_format or os.environ.get('FLAG_PROFILE'):
+        import profiling
+        try:
+            profiling.start(args.profile_format or ('summary' if args.instrument else None), args.profile_output)
+        except ValueError as e:
+            parser.error(str(e))
+    
+    if args.command == 'convert':
+        convert_storage(args)
+        return
+    if args.command == 'serve':
+        serve(args)
+        return
+    
+    if args.user and args.all_users:
+        parser.error("--user 和 --all-users 不能同时使用")
+    if args.user or args.all_users:
+        if open_store is None:
+            from tenants import TenantStore as open_store
+        store = open_store(args.users_dir)
+        if args.all_users:
+            if args.command == 'stats':
+                show_all_users_stats(store, args)
+            elif args.command == 'reminders':
+                show_all_users_reminders(store, args)
+            else:
+                parser.error("--all-users 只支持 stats 和 reminders 命令")
+            return
+        try:
+            store.data_file(args.user)
+        except ValueError as e:
+            parser.error(str(e))
+        # 借用缓存中的FlagManager，命令执行完之前不会被淘汰关闭
+        with store.lease(args.user) as manager:
+            run_command(manager, args)
+        return
     
-    # 执行对应命令
+    if open_manager is None:
+        from main import FlagManager as open_manager
+    run_command(open_manager(), args)
+
+def run_command(manager, args):
+    """对FlagManager执行解析好的子命令"""
     if args.command == 'add':
         add_flag(manager, args)
     elif args.command == 'list':
         list_flags(manager, args)
     elif args.command == 'update':
         update_progress(manager, args)
+    elif args.command == 'show':
+        show_flag(manager, args)
     elif args.command == 'reminders':
         show_reminders(manager, args)
     elif args.command == 'stats':
         show_stats(manager, args)
     elif args.command == 'delete':
         delete_flag(manager, args)
+    elif args.command == 'import':
+        import_flags(manager, args)
+    elif args.command == 'compact':
+        compact_storage(manager, args)
+    elif args.command == 'rescore':
+        rescore_flags(manager, args)
+    elif args.command == 'search':
+        search_flags(manager, args)
+    elif args.command == 'analyze':
+        show_analytics(manager, args)
+
+def serve(args):
+    """在前台运行常驻服务，或停止正在运行的服务"""
+    import cli_server
+    if args.stop:
+        if cli_server.stop(args.socket):
+            print("✅ 常驻服务已停止")
+        else:
+            print("📭 没有正在运行的常驻服务")
+        return
+    server = cli_server.CliServer(args.socket)
+    try:
+        server.bind()
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return
+    print(f"🚀 常驻服务已启动: {server.path}（Ctrl+C 或 python cli.py serve --stop 停止）", flush=True)
+    server.serve_forever()
+
+def _command(argv):
+    """参数中的子命令名（跳过全局选项及其值）"""
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg in GLOBAL_VALUE_OPTIONS:
+            skip = True
+        elif not arg.startswith('-'):
+            return arg
+    return None
+
+def main(argv=None):
+    """命令行入口：有常驻服务时交给服务执行，否则在本进程中执行"""
+    argv = sys.argv[1:] if argv is None else argv
+    # 剖析需要在本进程中统计和输出，不交给服务
+    profile = os.environ.get('FLAG_PROFILE') or any(arg.startswith('--profile') for arg in argv)
+    # 套接字文件存在时才导入 cli_server（路径的取法与 cli_server.socket_path 相同），没有服务时不多导入模块
+    socket_file = os.environ.get('FLAG_SOCKET') or '.flag.sock'
+    if _command(argv) not in LOCAL_COMMANDS and not profile and os.path.exists(socket_file):
+        from cli_server import call
+        reply = call(argv)
+        if reply is not None:
+            sys.stdout.write(reply['stdout'])
+            sys.stderr.write(reply['stderr'])
+            if reply['code']:
+                sys.exit(reply['code'])
+            return
+    run(argv)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
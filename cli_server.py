@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - 命令行常驻服务
+python cli.py serve 在Unix域套接字上常驻运行，已导入的模块和打开的FlagManager留在内存中；
+之后的 cli.py 命令发现套接字时只把参数、工作目录和相关环境变量发给服务，由服务在进程内执行并返回输出，
+省去每次启动时的导入和数据加载。数据仍受进程间锁保护，其他进程的修改照常可见（见 main.py）。
+服务一次执行一个命令，执行时切换到客户端的工作目录，相对路径与本地执行相同；
+客户端与服务的相关环境变量不同、服务不可用或使用 --profile 时，命令在本地执行。
+套接字默认为当前目录下的 .flag.sock（可用环境变量 FLAG_SOCKET 指定），只有当前用户可以访问。
+客户端只在套接字文件存在时才导入本模块，只有服务端用到的模块在 CliServer 中才导入。
+"""
+
+import json
+import os
+import socket
+from typing import Dict, List, Optional
+
+SOCKET_ENV = "FLAG_SOCKET"
+DEFAULT_SOCKET = ".flag.sock"
+# 影响命令结果的环境变量，客户端与服务不同时在本地执行
+ENV_KEYS = ("FLAG_STORAGE", "FLAG_USERS_DIR", "FLAG_RULES_FILE")
+# 等待新连接的超时（秒），用于及时响应退出信号
+ACCEPT_TIMEOUT = 0.5
+
+
+def socket_path(path: Optional[str] = None) -> str:
+    """套接字路径：参数、环境变量 FLAG_SOCKET、当前目录下的 .flag.sock"""
+    return path or os.environ.get(SOCKET_ENV) or DEFAULT_SOCKET
+
+
+def _env() -> Dict[str, Optional[str]]:
+    return {key: os.environ.get(key) for key in ENV_KEYS}
+
+
+def _read_all(conn: socket.socket) -> bytes:
+    chunks = []
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+
+def _request(path: str, request: Dict) -> Optional[Dict]:
+    """发送一个请求并读取回复；连接不上时返回None（未发送，调用方可以改为本地执行）"""
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            conn.connect(path)
+        except OSError:
+            # 套接字文件是已退出的服务留下的，或没有权限
+            return None
+        try:
+            conn.sendall(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+            conn.shutdown(socket.SHUT_WR)
+            return json.loads(_read_all(conn))
+        except (OSError, ValueError) as e:
+            # 请求已经发出，命令可能已经执行，不能再在本地重复执行
+            return {"stdout": "", "stderr": f"❌ 常驻服务没有返回结果: {e}\n", "code": 1}
+    finally:
+        conn.close()
+
+
+def call(argv: List[str], path: Optional[str] = None) -> Optional[Dict]:
+    """把命令交给常驻服务执行，返回 {"stdout", "stderr", "code"}；服务不可用或要求本地执行时返回None"""
+    path = socket_path(path)
+    if not os.path.exists(path):
+        return None
+    reply = _request(path, {"argv": argv, "cwd": os.getcwd(), "env": _env()})
+    if reply is None or reply.get("fallback"):
+        return None
+    return reply
+
+
+def stop(path: Optional[str] = None) -> bool:
+    """请求常驻服务退出，返回是否有服务在运行"""
+    path = socket_path(path)
+    return os.path.exists(path) and _request(path, {"op": "stop"}) is not None
+
+
+class CliServer:
+    """命令行常驻服务，缓存按数据文件绝对路径打开的FlagManager和按根目录打开的TenantStore"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = os.path.abspath(socket_path(path))
+        self.env = _env()
+        self._managers = {}
+        self._stores = {}
+        self._listener: Optional[socket.socket] = None
+        self._running = False
+
+    def open_manager(self, data_file: str = "flags.json"):
+        """默认数据的FlagManager（按绝对路径缓存，服务在不同工作目录之间切换时仍然有效）"""
+        from main import FlagManager
+        data_file = os.path.abspath(data_file)
+        manager = self._managers.get(data_file)
+        if manager is None:
+            manager = self._managers[data_file] = FlagManager(data_file)
+        return manager
+
+    def open_store(self, root: Optional[str] = None):
+        """多用户数据（按根目录的绝对路径缓存）"""
+        from tenants import TenantStore
+        root = os.path.abspath(root or os.environ.get("FLAG_USERS_DIR", "users"))
+        store = self._stores.get(root)
+        if store is None:
+            store = self._stores[root] = TenantStore(root)
+        return store
+
+    def handle(self, request: Dict) -> Dict:
+        """在客户端的工作目录中执行一个命令，收集输出和退出码"""
+        if request.get("op") == "stop":
+            self._running = False
+            return {"stopped": True}
+        if request.get("env") != self.env:
+            return {"fallback": "env"}
+        import contextlib
+        import io
+        import traceback
+        import cli
+        stdout, stderr = io.StringIO(), io.StringIO()
+        code = 0
+        cwd = os.getcwd()
+        try:
+            os.chdir(request["cwd"])
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                try:
+                    cli.run(request["argv"], self.open_manager, self.open_store)
+                except SystemExit as e:
+                    # argparse 的 --help 和参数错误
+                    if isinstance(e.code, str):
+                        print(e.code, file=stderr)
+                    code = e.code if isinstance(e.code, int) else 0 if e.code is None else 1
+                except Exception:
+                    traceback.print_exc()
+                    code = 1
+        except OSError as e:
+            stderr.write(f"❌ 无法切换到工作目录: {e}\n")
+            code = 1
+        finally:
+            os.chdir(cwd)
+        return {"stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "code": code}
+
+    def bind(self) -> None:
+        """绑定套接字；已有服务在运行时抛出 RuntimeError，清理已退出的服务留下的套接字文件"""
+        if os.path.exists(self.path):
+            if _request(self.path, {"op": "ping"}) is not None:
+                raise RuntimeError(f"常驻服务已在运行: {self.path}")
+            os.unlink(self.path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # 套接字文件只允许当前用户访问
+        old_umask = os.umask(0o177)
+        try:
+            listener.bind(self.path)
+        finally:
+            os.umask(old_umask)
+        listener.listen(16)
+        listener.settimeout(ACCEPT_TIMEOUT)
+        self._listener = listener
+
+    def serve_forever(self) -> None:
+        """逐个处理请求（尚未调用 bind 时先绑定），收到 SIGTERM/SIGINT 或 stop 请求后处理完当前命令再退出"""
+        import contextlib
+        import signal
+        if self._listener is None:
+            self.bind()
+        listener = self._listener
+        self._running = True
+
+        def request_stop(signum, frame):
+            self._running = False
+
+        previous = {signum: signal.signal(signum, request_stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+        try:
+            while self._running:
+                try:
+                    conn, _ = listener.accept()
+                except socket.timeout:
+                    continue
+                except InterruptedError:
+                    continue
+                with conn:
+                    conn.settimeout(None)
+                    try:
+                        request = json.loads(_read_all(conn))
+                        reply = self.handle(request) if request.get("op") != "ping" else {"pong": True}
+                        conn.sendall(json.dumps(reply, ensure_ascii=False).encode("utf-8"))
+                    except (OSError, ValueError):
+                        # 客户端中途断开或请求格式不对
+                        continue
+        finally:
+            listener.close()
+            self._listener = None
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self.path)
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+            self.close()
+
+    def close(self) -> None:
+        """关闭缓存的FlagManager"""
+        for manager in self._managers.values():
+            manager.close()
+        for store in self._stores.values():
+            store.close()
+        self._managers.clear()
+        self._stores.clear()
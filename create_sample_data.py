@@ -1,13 +1,50 @@
 #!/usr/bin/env python3
 """
 创建示例数据，用于演示年度Flag管理工具的功能
+不带参数时写入6个手写的示例flags；--count N 时生成N个合成flags（用于测试大数据量下的性能），
+分类、状态、日期和检查记录条数按接近真实使用的分布随机生成，同一个 --seed 生成的数据相同。
+用法: python create_sample_data.py [--count N] [--output flags.json] [--backend json|journal|jsonl|sqlite] [--seed 1]
 """
 
+import argparse
+import itertools
 import json
+import random
 from datetime import datetime, timedelta
 import uuid
 
-def create_sample_data():
+import feasibility
+from storage import atomic_write_lines, open_storage
+
+# 合成数据的分类权重：学习和健康类目标最多
+CATEGORY_WEIGHTS = {
+    "学习成长": 30,
+    "健康生活": 25,
+    "职业发展": 15,
+    "兴趣爱好": 12,
+    "消费计划": 8,
+    "其他": 10,
+}
+TITLES = {
+    "学习成长": ["学习Python编程", "通过英语六级考试", "读完{n}本书", "学会日语五十音", "考取驾照",
+                 "学习机器学习", "完成{n}门在线课程", "练习书法"],
+    "健康生活": ["减重{n}公斤", "每周跑步{n}次", "坚持早睡早起", "戒掉含糖饮料", "完成半程马拉松",
+                 "每天喝水2升", "学会游泳"],
+    "职业发展": ["获得PMP证书", "升职加薪", "完成{n}个项目", "建立个人作品集", "练习公开演讲", "拓展行业人脉"],
+    "兴趣爱好": ["学习弹吉他", "学会摄影后期", "画完{n}幅画", "学做{n}道菜", "去{n}个城市旅行", "练习钢琴"],
+    "消费计划": ["存钱买相机", "存款{n}万元", "还清信用卡", "控制每月开支", "买一台新电脑"],
+    "其他": ["整理房间", "多陪家人", "学会冥想", "做{n}次志愿者", "每月写一篇博客"],
+}
+DESCRIPTION_PARTS = ["每天坚持{n}分钟", "每周记录一次进展", "制定详细的计划表", "完成后奖励自己",
+                     "和朋友一起互相监督", "目标是达到{n}分以上", "分阶段完成，每月检查一次", "记录每天的变化",
+                     "先从简单的部分开始", "每完成{n}%总结一次经验"]
+NOTES = ["按计划推进", "本周有点偷懒", "完成了阶段目标", "进度比预期慢", "状态很好", "遇到困难，调整计划", "坚持打卡"]
+# 合成flag的检查记录条数上限
+MAX_CHECKS = 50
+# 每批评估可行性的flags数量
+CHUNK_SIZE = 10000
+
+def create_sample_data(data_file: str = "flags.json"):
     """创建示例数据"""
     sample_flags = [
         {
@@ -180,9 +217,8 @@ def create_sample_data():
         }
     ]
     
-    # 保存到文件
-    with open('flags.json', 'w', encoding='utf-8') as f:
-        json.dump(sample_flags, f, ensure_ascii=False, indent=2)
+    # 保存到文件（持有锁替换原有数据并清空旧的操作日志，版本号加一，已打开的进程会重新加载）
+    write_flags(data_file, sample_flags)
     
     print("✅ 示例数据已创建！")
     print(f"📊 共创建了 {len(sample_flags)} 个示例flags")
@@ -193,5 +229,127 @@ def create_sample_data():
     print("  python launcher.py               # 启动菜单界面")
     print("  python web_app.py               # 启动Web界面")
 
+def _synthetic_flag(rng: random.Random, now: datetime) -> dict:
+    """随机生成一个flag（不含可行性评分）"""
+    category = rng.choices(list(CATEGORY_WEIGHTS), weights=list(CATEGORY_WEIGHTS.values()))[0]
+    title = rng.choice(TITLES[category]).format(n=rng.randint(2, 30))
+    parts = rng.sample(DESCRIPTION_PARTS, rng.choice([0, 1, 2, 3, 3, 4, 5]))
+    description = "，".join(part.format(n=rng.randint(10, 90)) for part in parts)
+
+    # 约一半在年初立下，其余分布在过去一年中
+    if rng.random() < 0.5:
+        created = min(datetime(now.year, 1, 1) + timedelta(days=rng.randint(0, 13)), now)
+    else:
+        created = now - timedelta(days=rng.randint(0, 365))
+    created = created.replace(hour=0, minute=0, second=0, microsecond=0)
+    roll = rng.random()
+    if roll < 0.6:
+        target = datetime(created.year, 12, 31)
+    elif roll < 0.85:
+        target = created + timedelta(days=rng.randint(30, 180))
+    else:
+        target = created + timedelta(days=rng.randint(181, 730))
+
+    # 约五分之一从未检查；其余按已过去的天数和检查频率决定条数，进度单调增加，到100为止
+    history = []
+    progress = 0
+    status = "进行中"
+    age_days = max(0, (now - created).days)
+    if rng.random() >= 0.2:
+        interval = rng.choice([3, 7, 14, 30, 60])
+        count = min(MAX_CHECKS, max(1, int(age_days / interval * rng.uniform(0.5, 1.0))))
+        pace = rng.choice([3, 6, 10, 20])
+        for offset in sorted(rng.randint(0, age_days * 86400 + 86399) for _ in range(count)):
+            progress = min(100, progress + rng.randint(0, pace))
+            history.append({
+                "date": (created + timedelta(seconds=offset)).strftime("%Y-%m-%d %H:%M:%S"),
+                "progress": progress,
+                "notes": rng.choice(NOTES) if rng.random() < 0.5 else "",
+            })
+            if progress >= 100:
+                break
+        status = "已完成" if progress >= 100 else "进行中" if progress > 0 else "未开始"
+
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        "title": title,
+        "description": description,
+        "category": category,
+        "target_date": target.strftime("%Y-%m-%d"),
+        "created_date": created.strftime("%Y-%m-%d"),
+        "progress": progress,
+        "status": status,
+        "check_history": history,
+        "feasibility_score": None,
+        "feasibility_reason": "",
+    }
+
+def generate_flags(count: int, seed: int = 1, now: datetime = None):
+    """逐个产出 count 个合成flags（生成器），可行性按批评估，同一个 seed 和 now 生成的数据相同"""
+    rng = random.Random(seed)
+    now = now or datetime.now()
+    remaining = count
+    while remaining > 0:
+        chunk = [_synthetic_flag(rng, now) for _ in range(min(CHUNK_SIZE, remaining))]
+        remaining -= len(chunk)
+        for flag, result in zip(chunk, feasibility.assess_many(chunk, now)):
+            flag["feasibility_score"] = result["score"]
+            flag["feasibility_reason"] = result["reason"]
+            yield flag
+
+def _json_lines(flags):
+    """把flags写成JSON数组，每行一个flag"""
+    yield "[\n"
+    for i, flag in enumerate(flags):
+        yield ("," if i else "") + json.dumps(flag, ensure_ascii=False) + "\n"
+    yield "]\n"
+
+def write_flags(data_file: str, flags, backend: str = None) -> int:
+    """把flags（可以是生成器）写入任一存储格式，替换原有数据，返回写入数量
+
+    写入是流式的，不需要把全部flags放进内存；完成后版本号加一，已打开的进程会重新加载
+    """
+    written = itertools.count()
+
+    def counted():
+        for flag in flags:
+            next(written)
+            yield flag
+
+    storage = open_storage(data_file, backend)
+    try:
+        with storage.lock:
+            if storage.name in ("json", "journal"):
+                # 先清空操作日志，再流式写入快照
+                storage.save([])
+                atomic_write_lines(data_file, _json_lines(counted()))
+            else:
+                storage.save(counted())
+            storage.lock.bump()
+    finally:
+        close = getattr(storage, "close", None)
+        if close is not None:
+            close()
+        else:
+            storage.lock.close()
+    return next(written)
+
+def main():
+    parser = argparse.ArgumentParser(description="创建示例数据")
+    parser.add_argument("--count", type=int, help="生成的合成flags数量（不指定时写入手写的示例数据）")
+    parser.add_argument("--output", default="flags.json", help="数据文件 (默认: flags.json)")
+    parser.add_argument("--backend", help="存储格式 (默认按扩展名和环境变量 FLAG_STORAGE 决定)")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子 (默认: 1)")
+    args = parser.parse_args()
+    
+    if args.count is None:
+        create_sample_data(args.output)
+        return
+    
+    started = datetime.now()
+    written = write_flags(args.output, generate_flags(args.count, args.seed), args.backend)
+    elapsed = (datetime.now() - started).total_seconds()
+    print(f"✅ 已生成 {written} 个合成flags → {args.output}（{elapsed:.1f} 秒）")
+
 if __name__ == "__main__":
-    create_sample_data()
\ No newline at end of file
+    main()
\ No newline at end of file
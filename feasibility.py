@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - 可行性评估
+评估规则写在规则文件中（默认为同目录的 feasibility_rules.json，可用环境变量 FLAG_RULES_FILE
+指定，扩展名为 .yaml/.yml 时需要安装PyYAML），加载时编译成评估计划：
+- range 规则（剩余天数、文本长度）编译为按整数取值的分桶表，评估时直接查表；
+- 同一字段上的全部 keywords 规则合并为一个自动机，扫描一遍文本就知道哪些规则命中；
+- 每种结果组合对应的分数和说明只计算一次。
+编译结果按规则文件内容的哈希缓存在规则文件旁的 __pycache__ 目录中，启动时不需要重新编译。
+
+assess 逐个评估，assess_many 批量评估（NumPy向量化，未安装时退化为普通循环），两者结果完全相同。
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Mapping, Optional, Sequence
+
+from models import EPOCH
+
+try:
+    import numpy as np
+except ImportError:  # 未安装numpy时使用普通循环
+    np = None
+
+DATE_FORMAT = "%Y-%m-%d"
+DAY_US = 86400 * 1000000
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "feasibility_rules.json")
+# 编译结果的格式版本，格式变化后旧的缓存自动失效
+PLAN_VERSION = 1
+MEASURES = ("days_until", "length")
+
+
+class RuleError(ValueError):
+    """规则文件格式不正确"""
+
+
+def _outcome(spec: Optional[Dict]) -> List:
+    """规则结果: [分数变化, 说明或None]"""
+    spec = spec or {}
+    return [int(spec.get("score", 0)), spec.get("reason") or None]
+
+
+def _compile_range(rule: Dict) -> Dict:
+    """把分桶条件编译为查找表
+
+    分桶按顺序匹配，below: x 表示取值 < x，above: x 表示取值 > x。所有阈值都是整数，
+    取值小于最小阈值或大于最大阈值时结果不再变化，所以只需要为 [最小阈值-1, 最大阈值+1]
+    之间的每个整数算出结果，超出范围的取值截断到两端。
+    """
+    if rule.get("measure") not in MEASURES:
+        raise RuleError(f"规则 {rule['name']} 的 measure 必须是 {' / '.join(MEASURES)}")
+    buckets = rule.get("buckets") or []
+    thresholds = []
+    for bucket in buckets:
+        if "below" not in bucket and "above" not in bucket:
+            raise RuleError(f"规则 {rule['name']} 的分桶缺少 below/above")
+        thresholds.extend(int(bucket[key]) for key in ("below", "above") if key in bucket)
+    outcomes = [[0, None]] + [_outcome(bucket) for bucket in buckets]
+    low = min(thresholds, default=0) - 1
+    high = max(thresholds, default=0) + 1
+    table = []
+    for value in range(low, high + 1):
+        code = 0
+        for index, bucket in enumerate(buckets, 1):
+            if ("below" not in bucket or value < int(bucket["below"])) and \
+                    ("above" not in bucket or value > int(bucket["above"])):
+                code = index
+                break
+        table.append(code)
+    invalid = None
+    if rule["measure"] == "days_until":
+        outcomes.append(_outcome(rule.get("invalid")))
+        invalid = len(outcomes) - 1
+    return {"name": rule["name"], "kind": "range", "field": rule["field"], "measure": rule["measure"],
+            "format": rule.get("format", DATE_FORMAT), "outcomes": outcomes, "offset": low,
+            "table": table, "invalid": invalid}
+
+
+def _compile_automata(rules: List[Dict]) -> List[Dict]:
+    """把同一字段上的关键词规则合并为一个自动机
+
+    自动机是一个正则：在每个位置用前瞻匹配该位置开始的最长关键词。某个关键词出现时，
+    它要么是所在位置最长的关键词，要么是那个最长关键词的子串，因此每个关键词对应的规则集合
+    取它自己和它包含的全部关键词的规则，扫描一遍就能得到命中的全部规则。
+    """
+    by_field: Dict[str, Dict[str, int]] = {}
+    for index, rule in enumerate(rules):
+        if rule["kind"] != "keywords":
+            continue
+        keywords = by_field.setdefault(rule["field"], {})
+        for word in rule["keywords"]:
+            word = word.lower()
+            if word:
+                keywords[word] = keywords.get(word, 0) | (1 << index)
+    automata = []
+    for field, keywords in by_field.items():
+        masks = {word: 0 for word in keywords}
+        for word in keywords:
+            for other, mask in keywords.items():
+                if other in word:
+                    masks[word] |= mask
+        words = sorted(keywords, key=len, reverse=True)
+        pattern = "(?=(" + "|".join(re.escape(word) for word in words) + "))" if words else r"(?!)"
+        automata.append({"field": field, "pattern": pattern, "masks": masks,
+                         "rules": [index for index, rule in enumerate(rules)
+                                   if rule["kind"] == "keywords" and rule["field"] == field]})
+    return automata
+
+
+def compile_rules(spec: Dict) -> Dict:
+    """把规则文件的内容编译为评估计划（只包含列表和字典，可以直接保存为JSON）"""
+    rules = []
+    for position, rule in enumerate(spec.get("rules") or [], 1):
+        if not isinstance(rule, dict) or "field" not in rule:
+            raise RuleError(f"第 {position} 条规则缺少 field")
+        rule = dict(rule, name=rule.get("name") or f"rule{position}")
+        if rule.get("type") == "range":
+            rules.append(_compile_range(rule))
+        elif rule.get("type") == "keywords":
+            rules.append({"name": rule["name"], "kind": "keywords", "field": rule["field"],
+                          "keywords": list(rule.get("keywords") or []),
+                          # 命中为0，未命中为1
+                          "outcomes": [_outcome(rule.get("match")), _outcome(rule.get("miss"))]})
+        else:
+            raise RuleError(f"规则 {rule['name']} 的 type 必须是 range 或 keywords")
+    return {
+        "version": PLAN_VERSION,
+        "base_score": int(spec.get("base_score", 100)),
+        "min_score": int(spec.get("min_score", 0)),
+        "max_score": int(spec.get("max_score", 100)),
+        "default_reason": spec.get("default_reason", "目标设定合理，可行性较高"),
+        "rules": rules,
+        "automata": _compile_automata(rules),
+    }
+
+
+def read_rules(path: str, data: bytes) -> Dict:
+    """解析规则文件内容，.yaml/.yml 需要PyYAML"""
+    text = data.decode("utf-8-sig")
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise RuleError("读取YAML规则文件需要安装PyYAML (pip install pyyaml)，或改用JSON格式")
+        return yaml.safe_load(text) or {}
+    return json.loads(text)
+
+
+class RulePlan:
+    """编译好的评估计划"""
+
+    def __init__(self, plan: Dict, source: Optional[str] = None):
+        self.source = source
+        self.base_score = plan["base_score"]
+        self.min_score = plan["min_score"]
+        self.max_score = plan["max_score"]
+        self.default_reason = plan["default_reason"]
+        self.rules = plan["rules"]
+        self.automata = [dict(automaton, regex=re.compile(automaton["pattern"]),
+                              full=sum(1 << index for index in automaton["rules"]))
+                         for automaton in plan["automata"]]
+        # 组合编号 = 各规则结果编号的混合进制数
+        self.radixes = []
+        radix = 1
+        for rule in reversed(self.rules):
+            self.radixes.append(radix)
+            radix *= len(rule["outcomes"])
+        self.radixes.reverse()
+        self._results: Dict[int, Dict] = {}
+
+    def result(self, code: int) -> Dict:
+        """组合编号对应的评估结果（每种组合只拼接一次说明）"""
+        result = self._results.get(code)
+        if result is None:
+            score = self.base_score
+            reasons = []
+            for rule, radix in zip(self.rules, self.radixes):
+                delta, reason = rule["outcomes"][code // radix % len(rule["outcomes"])]
+                score += delta
+                if reason:
+                    reasons.append(reason)
+            result = self._results[code] = {
+                "score": max(self.min_score, min(self.max_score, score)),
+                "reason": "；".join(reasons) if reasons else self.default_reason
+            }
+        return result
+
+    @staticmethod
+    def _lookup(rule: Dict, value: int) -> int:
+        table = rule["table"]
+        return table[min(max(value - rule["offset"], 0), len(table) - 1)]
+
+    def _scan(self, automaton: Dict, text: str) -> int:
+        """用自动机扫描一遍文本，返回命中的规则位掩码"""
+        masks = automaton["masks"]
+        full = automaton["full"]
+        mask = 0
+        for match in automaton["regex"].finditer(text.lower()):
+            mask |= masks[match.group(1)]
+            if mask == full:
+                # 全部规则都已命中，不需要继续扫描
+                break
+        return mask
+
+    def evaluate(self, flag: Mapping, now: Optional[datetime] = None) -> Dict:
+        """评估单个flag"""
+        now_us = _micros(now or datetime.now())
+        keyword_mask = 0
+        for automaton in self.automata:
+            keyword_mask |= self._scan(automaton, flag[automaton["field"]])
+        code = 0
+        for index, (rule, radix) in enumerate(zip(self.rules, self.radixes)):
+            code += self._rule_code(rule, index, flag[rule["field"]], now_us, keyword_mask) * radix
+        return dict(self.result(code))
+
+    def _rule_code(self, rule: Dict, index: int, value, now_us: int, keyword_mask: int) -> int:
+        """单个值在规则中的结果编号"""
+        if rule["kind"] == "keywords":
+            return 0 if keyword_mask >> index & 1 else 1
+        if rule["measure"] == "length":
+            return self._lookup(rule, len(value))
+        target = _parse_date(value, rule["format"])
+        if target is None:
+            return rule["invalid"]
+        # timedelta.days 向下取整，整数微秒上的向下取整除法与它完全一致
+        return self._lookup(rule, (target - now_us) // DAY_US)
+
+    def evaluate_many(self, flags: Sequence[Mapping], now: Optional[datetime] = None,
+                      timings: Optional[Dict[str, float]] = None) -> List[Dict]:
+        """批量评估，now 未指定时整批使用同一个当前时间
+
+        timings 不为None时累加每条规则（关键词规则为所在的自动机）消耗的秒数
+        """
+        flags = list(flags)
+        if not flags:
+            return []
+        now_us = _micros(now or datetime.now())
+        count = len(flags)
+
+        def timed(label, started):
+            if timings is not None:
+                timings[label] = timings.get(label, 0.0) + time.perf_counter() - started
+
+        keyword_masks = {}
+        for automaton in self.automata:
+            started = time.perf_counter()
+            masks = [self._scan(automaton, flag[automaton["field"]]) for flag in flags]
+            keyword_masks[automaton["field"]] = np.array(masks, dtype=np.int64) if np is not None else masks
+            label = "关键词: " + "、".join(self.rules[index]["name"] for index in automaton["rules"])
+            timed(label, started)
+
+        if np is None:
+            codes = [0] * count
+            for index, (rule, radix) in enumerate(zip(self.rules, self.radixes)):
+                started = time.perf_counter()
+                if rule["kind"] == "keywords":
+                    masks = keyword_masks[rule["field"]]
+                    for i in range(count):
+                        codes[i] += (0 if masks[i] >> index & 1 else 1) * radix
+                elif rule["measure"] == "length":
+                    for i, flag in enumerate(flags):
+                        codes[i] += self._lookup(rule, len(flag[rule["field"]])) * radix
+                else:
+                    targets = [_parse_date(flag[rule["field"]], rule["format"]) for flag in flags]
+                    for i, target in enumerate(targets):
+                        code = rule["invalid"] if target is None else self._lookup(rule, (target - now_us) // DAY_US)
+                        codes[i] += code * radix
+                timed(rule["name"], started)
+            return [dict(self.result(code)) for code in codes]
+
+        codes = np.zeros(count, dtype=np.int64)
+        for index, (rule, radix) in enumerate(zip(self.rules, self.radixes)):
+            started = time.perf_counter()
+            if rule["kind"] == "keywords":
+                hit = (keyword_masks[rule["field"]] >> index) & 1
+                rule_codes = 1 - hit
+            else:
+                table = np.array(rule["table"], dtype=np.int64)
+                if rule["measure"] == "length":
+                    values = np.fromiter((len(flag[rule["field"]]) for flag in flags), dtype=np.int64, count=count)
+                    rule_codes = table[np.clip(values - rule["offset"], 0, len(table) - 1)]
+                else:
+                    targets = [_parse_date(flag[rule["field"]], rule["format"]) for flag in flags]
+                    valid = np.array([target is not None for target in targets])
+                    target_us = np.array([target or 0 for target in targets], dtype=np.int64)
+                    days = (target_us - now_us) // DAY_US
+                    rule_codes = np.where(valid, table[np.clip(days - rule["offset"], 0, len(table) - 1)],
+                                          rule["invalid"])
+            codes += rule_codes * radix
+            timed(rule["name"], started)
+        return [dict(self.result(code)) for code in codes.tolist()]
+
+
+@lru_cache(maxsize=4096)
+def _parse_date(value: str, date_format: str) -> Optional[int]:
+    """日期距 EPOCH 的微秒数，格式不正确时为None；最近用过的日期字符串不再重复解析"""
+    try:
+        return _micros(datetime.strptime(value, date_format))
+    except ValueError:
+        return None
+
+
+def _micros(value: datetime) -> int:
+    """本地时间距 EPOCH 的微秒数"""
+    delta = value - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def plan_cache_path(path: str, digest: str) -> str:
+    """编译结果的缓存文件: <规则文件目录>/__pycache__/<文件名>.<哈希>.plan.json"""
+    directory = os.path.join(os.path.dirname(os.path.abspath(path)), "__pycache__")
+    return os.path.join(directory, f"{os.path.basename(path)}.{digest[:16]}.plan.json")
+
+
+def load_plan(path: Optional[str] = None, use_cache: bool = True) -> RulePlan:
+    """加载规则文件并编译，优先使用与文件内容哈希对应的缓存"""
+    path = path or os.environ.get("FLAG_RULES_FILE") or DEFAULT_RULES_FILE
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data + f"|plan-v{PLAN_VERSION}".encode()).hexdigest()
+    cache = plan_cache_path(path, digest)
+    if use_cache:
+        try:
+            with open(cache, "r", encoding="utf-8") as f:
+                plan = json.load(f)
+            if plan.get("version") == PLAN_VERSION:
+                return RulePlan(plan, path)
+        except (OSError, ValueError):
+            pass
+
+    plan = compile_rules(read_rules(path, data))
+    if use_cache:
+        try:
+            os.makedirs(os.path.dirname(cache), exist_ok=True)
+            with open(cache + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(plan, f, ensure_ascii=False)
+            os.replace(cache + ".tmp", cache)
+            # 规则文件修改前的编译结果不会再用到
+            prefix = os.path.basename(path) + "."
+            for name in os.listdir(os.path.dirname(cache)):
+                if name.startswith(prefix) and name.endswith(".plan.json") and name != os.path.basename(cache):
+                    os.remove(os.path.join(os.path.dirname(cache), name))
+        except OSError:
+            # 目录不可写时不缓存，下次启动重新编译
+            pass
+    return RulePlan(plan, path)
+
+
+_default_plan: Optional[RulePlan] = None
+
+
+def default_plan() -> RulePlan:
+    """默认规则，进程内只加载一次"""
+    global _default_plan
+    if _default_plan is None:
+        _default_plan = load_plan()
+    return _default_plan
+
+
+def assess(flag: Mapping, now: Optional[datetime] = None, plan: Optional[RulePlan] = None) -> Dict:
+    """评估flag的可行性"""
+    return (plan or default_plan()).evaluate(flag, now)
+
+
+def assess_many(flags: Sequence[Mapping], now: Optional[datetime] = None, plan: Optional[RulePlan] = None,
+                timings: Optional[Dict[str, float]] = None) -> List[Dict]:
+    """批量评估，返回与 [assess(flag, now) for flag in flags] 相同的结果"""
+    return (plan or default_plan()).evaluate_many(flags, now, timings)
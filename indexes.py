@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - 内存索引
+FlagManager在加载数据后维护的索引和统计结构，随增删改同步更新
+"""
+
+import math
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import List, Dict, Iterable, Optional, Tuple
+
+from models import EPOCH, Flag
+
+DAY = 86400
+ACTIVE_STATUSES = ("进行中", "未开始")
+
+
+class AmbiguousIdError(ValueError):
+    """ID前缀匹配到多个flag"""
+
+    def __init__(self, prefix: str, matches: List[str]):
+        self.prefix = prefix
+        self.matches = matches
+        shown = "、".join(m[:8] for m in matches[:5])
+        super().__init__(f"ID前缀 '{prefix}' 匹配到多个flag（{shown}），请输入更长的前缀")
+
+
+class IdIndex:
+    """按ID索引flags
+
+    by_id 提供O(1)的精确查找，sorted_ids 是有序ID列表，
+    前缀查找通过二分定位到第一个不小于前缀的ID，复杂度O(log n)。
+    """
+
+    def __init__(self, flags: Iterable[Flag] = ()):
+        self.by_id: Dict[str, Flag] = {}
+        self.sorted_ids: List[str] = []
+        self.rebuild(flags)
+
+    def rebuild(self, flags: Iterable[Flag]) -> None:
+        """根据flags重建索引"""
+        self.by_id = {flag.id: flag for flag in flags}
+        self.sorted_ids = sorted(self.by_id)
+
+    def add(self, flag: Flag) -> None:
+        """加入一个flag"""
+        if flag.id not in self.by_id:
+            insort(self.sorted_ids, flag.id)
+        self.by_id[flag.id] = flag
+
+    def remove(self, flag_id: str) -> None:
+        """移除一个flag"""
+        if self.by_id.pop(flag_id, None) is not None:
+            i = bisect_left(self.sorted_ids, flag_id)
+            del self.sorted_ids[i]
+
+    def get(self, flag_id: str) -> Optional[Flag]:
+        """按完整ID查找"""
+        return self.by_id.get(flag_id)
+
+    def match(self, prefix: str, limit: int = 2) -> List[str]:
+        """返回以prefix开头的ID（最多limit个），完整ID命中时只返回它本身"""
+        if prefix in self.by_id:
+            return [prefix]
+        matches = []
+        i = bisect_left(self.sorted_ids, prefix)
+        while i < len(self.sorted_ids) and len(matches) < limit:
+            flag_id = self.sorted_ids[i]
+            if not flag_id.startswith(prefix):
+                break
+            matches.append(flag_id)
+            i += 1
+        return matches
+
+
+def resolve_matches(prefix: str, matches: List[str]) -> Optional[str]:
+    """从前缀匹配结果中确定唯一ID，没有匹配时返回None，匹配多个时抛出AmbiguousIdError"""
+    if not matches:
+        return None
+    if len(matches) > 1:
+        raise AmbiguousIdError(prefix, matches)
+    return matches[0]
+
+
+def _bump(counter: Dict[str, int], key: str, delta: int) -> None:
+    """调整计数，归零的键直接删除"""
+    value = counter.get(key, 0) + delta
+    if value:
+        counter[key] = value
+    else:
+        counter.pop(key, None)
+
+
+class FlagStats:
+    """增量维护的统计计数
+
+    添加、删除和状态变化时以O(1)更新，get_statistics 不再需要遍历全部flags
+    """
+
+    def __init__(self, flags: Iterable[Flag] = ()):
+        self.rebuild(flags)
+
+    def rebuild(self, flags: Iterable[Flag]) -> None:
+        """根据flags从头计算"""
+        self.total = 0
+        self.by_status: Dict[str, int] = {}
+        self.by_category: Dict[str, int] = {}
+        self.score_sum = 0
+        self.score_count = 0
+        for flag in flags:
+            self.add(flag)
+
+    def add(self, flag: Flag) -> None:
+        """计入一个flag"""
+        self.total += 1
+        _bump(self.by_status, flag.status, 1)
+        _bump(self.by_category, flag.category, 1)
+        self.change_score(None, flag.feasibility_score)
+
+    def remove(self, flag: Flag) -> None:
+        """移除一个flag"""
+        self.total -= 1
+        _bump(self.by_status, flag.status, -1)
+        _bump(self.by_category, flag.category, -1)
+        self.change_score(flag.feasibility_score, None)
+
+    def change_status(self, old: str, new: str) -> None:
+        """flag状态变化"""
+        if old != new:
+            _bump(self.by_status, old, -1)
+            _bump(self.by_status, new, 1)
+
+    def change_score(self, old: Optional[int], new: Optional[int]) -> None:
+        """flag可行性评分变化"""
+        if old is not None:
+            self.score_sum -= old
+            self.score_count -= 1
+        if new is not None:
+            self.score_sum += new
+            self.score_count += 1
+
+    def snapshot(self) -> Dict:
+        """导出当前计数"""
+        return {
+            "total": self.total,
+            "by_status": dict(self.by_status),
+            "by_category": dict(self.by_category),
+            "score_sum": self.score_sum,
+            "score_count": self.score_count
+        }
+
+
+def summarize_counts(counts: Dict) -> Dict:
+    """由统计计数得到 get_statistics 返回的统计信息"""
+    total = counts["total"]
+    by_status = counts["by_status"]
+    completed = by_status.get("已完成", 0)
+
+    avg_feasibility = 0
+    if total > 0 and counts["score_count"]:
+        avg_feasibility = counts["score_sum"] / counts["score_count"]
+
+    return {
+        "total": total,
+        "completed": completed,
+        "in_progress": by_status.get("进行中", 0),
+        "not_started": by_status.get("未开始", 0),
+        "completion_rate": (completed / total * 100) if total > 0 else 0,
+        "avg_feasibility": round(avg_feasibility, 1),
+        "by_category": counts["by_category"]
+    }
+
+
+def merge_counts(counts: Iterable[Dict]) -> Dict:
+    """合并多份统计计数（如多个用户的数据）"""
+    merged = FlagStats().snapshot()
+    for item in counts:
+        merged["total"] += item["total"]
+        merged["score_sum"] += item["score_sum"]
+        merged["score_count"] += item["score_count"]
+        for key in ("by_status", "by_category"):
+            for name, count in item[key].items():
+                merged[key][name] = merged[key].get(name, 0) + count
+    return merged
+
+
+def to_timestamp(value: datetime) -> float:
+    """把本地时间转换为秒数（不做时区换算，与直接相减的日期运算一致）"""
+    return (value - EPOCH).total_seconds()
+
+
+def last_activity_timestamp(flag: Flag) -> Optional[int]:
+    """flag最近一次检查的时间，从未检查过时取创建日期"""
+    if flag.checks:
+        return flag.last_check_timestamp
+    return flag.created_timestamp
+
+
+def deadline_entries(flag: Flag) -> List[Tuple[str, int]]:
+    """flag在到期/检查时间索引中的 (数组名, 时间戳)"""
+    entries = []
+    status = flag.status
+    if status in ACTIVE_STATUSES:
+        target = flag.target_timestamp
+        if target is not None:
+            entries.append(("deadlines", target))
+        last = last_activity_timestamp(flag)
+        if last is not None:
+            entries.append(("activity", last))
+    elif status == "已完成" and flag.checks:
+        last = flag.last_check_timestamp
+        if last is not None:
+            entries.append(("completed", last))
+    return entries
+
+
+# 以下函数把提醒条件换算为时间戳区间 [lo, hi)，None表示不限
+def due_range(now: datetime, days: int) -> Tuple[Optional[int], Optional[int]]:
+    """0 <= 剩余天数 <= days 对应的目标日期区间"""
+    now_ts = to_timestamp(now)
+    return math.ceil(now_ts), math.ceil(now_ts + (days + 1) * DAY)
+
+
+def stale_range(now: datetime, days: int) -> Tuple[Optional[int], Optional[int]]:
+    """距今至少days天对应的检查时间区间"""
+    return None, math.floor(to_timestamp(now) - days * DAY) + 1
+
+
+def recent_range(now: datetime, days: int) -> Tuple[Optional[int], Optional[int]]:
+    """距今不超过days天对应的检查时间区间"""
+    return math.floor(to_timestamp(now) - (days + 1) * DAY) + 1, None
+
+
+def in_range(timestamp: int, bounds: Tuple[Optional[int], Optional[int]]) -> bool:
+    """时间戳是否落在区间内"""
+    lo, hi = bounds
+    return (lo is None or timestamp >= lo) and (hi is None or timestamp < hi)
+
+
+class DeadlineIndex:
+    """按截止日期和最近检查时间排序的索引
+
+    维护三个按 (时间戳, id) 排序的数组：
+    - deadlines: 未完成flags的目标日期
+    - activity: 未完成flags的最近检查时间（未检查过时为创建日期）
+    - completed: 已完成flags的最后一次检查时间
+    “N天内到期”“超过N天未检查”“最近N天完成”都是二分定位的区间查询，
+    耗时与结果数量成正比；时间戳直接取自加载时解析好的Flag字段。
+    """
+
+    def __init__(self, flags: Iterable[Flag] = ()):
+        self.rebuild(flags)
+
+    def rebuild(self, flags: Iterable[Flag]) -> None:
+        """根据flags从头建立索引"""
+        self.deadlines: List[Tuple[int, str]] = []
+        self.activity: List[Tuple[int, str]] = []
+        self.completed: List[Tuple[int, str]] = []
+        self._keys: Dict[str, List[Tuple[str, Tuple[int, str]]]] = {}
+        for flag in flags:
+            keys = self._entries(flag)
+            self._keys[flag.id] = keys
+            for name, key in keys:
+                getattr(self, name).append(key)
+        self.deadlines.sort()
+        self.activity.sort()
+        self.completed.sort()
+
+    def _entries(self, flag: Flag) -> List[Tuple[str, Tuple[int, str]]]:
+        """计算flag在各个数组中的键"""
+        return [(name, (timestamp, flag.id)) for name, timestamp in deadline_entries(flag)]
+
+    def add(self, flag: Flag) -> None:
+        """加入一个flag"""
+        keys = self._entries(flag)
+        self._keys[flag.id] = keys
+        for name, key in keys:
+            insort(getattr(self, name), key)
+
+    def remove(self, flag_id: str) -> None:
+        """移除一个flag"""
+        for name, key in self._keys.pop(flag_id, []):
+            entries = getattr(self, name)
+            del entries[bisect_left(entries, key)]
+
+    def update(self, flag: Flag) -> None:
+        """flag的状态或检查记录变化后更新索引"""
+        self.remove(flag.id)
+        self.add(flag)
+
+    def query(self, name: str, bounds: Tuple[Optional[int], Optional[int]]) -> List[Tuple[int, str]]:
+        """返回数组name中时间戳落在区间内的 (时间戳, id)，按时间升序"""
+        entries = getattr(self, name)
+        lo, hi = bounds
+        start = 0 if lo is None else bisect_left(entries, (lo,))
+        end = len(entries) if hi is None else bisect_left(entries, (hi,))
+        return entries[start:end]
+
+    def due_within(self, now: datetime, days: int) -> List[Tuple[str, int]]:
+        """未完成且 0 <= 剩余天数 <= days 的flags，按剩余天数升序返回 (id, 剩余天数)"""
+        now_ts = to_timestamp(now)
+        return [(flag_id, int((target - now_ts) // DAY))
+                for target, flag_id in self.query("deadlines", due_range(now, days))]
+
+    def stale(self, now: datetime, days: int) -> List[str]:
+        """未完成且至少days天没有检查的flags，最久未检查的排在前面"""
+        return [flag_id for _, flag_id in self.query("activity", stale_range(now, days))]
+
+    def completed_within(self, now: datetime, days: int) -> List[str]:
+        """最后一次检查在days天以内的已完成flags，按完成时间升序返回"""
+        return [flag_id for _, flag_id in self.query("completed", recent_range(now, days))]
@@ -2,10 +2,10 @@
 """
 年度Flag管理工具 - 启动器
 提供简单的菜单界面来选择使用哪种方式运行工具
+各功能在本进程内直接调用对应模块的入口函数，不再启动新的Python解释器；模块在第一次选择时才导入
 """
 
 import sys
-import os
 
 def show_menu():
     """显示启动菜单"""
@@ -23,7 +23,12 @@ def show_menu():
 def run_cli():
     """运行命令行界面"""
     print("\n🚀 启动命令行界面...")
-    os.system("python cli.py --help")
+    import cli
+    try:
+        cli.run(["--help"])
+    except SystemExit:
+        # argparse 打印帮助后退出
+        pass
     print("\n💡 使用提示:")
     print("  python cli.py add '标题' '描述' '目标日期'")
     print("  python cli.py list")
@@ -36,17 +41,23 @@ def run_web():
     print("💡 使用提示:")
     print("  Web界面将在浏览器中打开")
     print("  使用 Ctrl+C 停止服务器")
-    os.system("python web_app.py")
+    import web_app
+    try:
+        web_app.main([], use_reloader=False)
+    except KeyboardInterrupt:
+        print("\n🛑 Web服务器已停止")
 
 def run_check():
     """运行进度检查"""
     print("\n🔍 运行进度检查...")
-    os.system("python check_reminder.py")
+    import check_reminder
+    check_reminder.main([])
 
 def run_report():
     """生成进度报告"""
     print("\n📄 生成进度报告...")
-    os.system("python check_reminder.py --report")
+    import check_reminder
+    check_reminder.main(["--report"])
 
 def show_help():
     """显示帮助信息"""
@@ -4,34 +4,525 @@
 用于管理个人新年目标，提供可行性评估和进度跟踪
 """
 
-import json
-import os
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
+import atexit
+import signal
+import sys
+import threading
+import time
 import uuid
 
+from storage import open_storage, ConcurrentModificationError
+from models import Flag, CheckRecord
+from indexes import (IdIndex, FlagStats, DeadlineIndex, resolve_matches, deadline_entries, summarize_counts,
+                     due_range, stale_range, recent_range, in_range, to_timestamp, DAY)
+
+# 搜索索引保存到文件的最短间隔（秒），未保存的变更下次打开索引时按检查记录的键同步
+SEARCH_SAVE_INTERVAL = 60
+# 写入延迟模式下积累这么多个未保存的操作时不再等待，立即写入
+DEFAULT_MAX_PENDING = 100
+
+
+def _exit_on_sigterm() -> None:
+    """SIGTERM 的默认处理直接结束进程，不运行 atexit；改为在主线程抛出 SystemExit，
+    正在执行的写操作照常退出（释放锁、回滚批量操作），之后由 atexit 保存延迟写入的变更。
+    只在主线程中、SIGTERM 还是默认处理时设置，不覆盖程序自己的处理函数（如 server.py）
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    if signal.getsignal(signal.SIGTERM) is signal.SIG_DFL:
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+
+
 class FlagManager:
-    def __init__(self, data_file: str = "flags.json"):
-        """初始化Flag管理器"""
+    def __init__(self, data_file: str = "flags.json", storage=None,
+                 write_delay: Optional[float] = None, max_pending: int = DEFAULT_MAX_PENDING,
+                 mutex: Optional[threading.RLock] = None):
+        """初始化Flag管理器
+
+        storage 为存储后端（见 storage.py），未指定时按 data_file 和环境变量 FLAG_STORAGE 创建。
+        lazy=True 的后端（SQLite、JSONL、二进制快照）不在启动时加载全部数据：后端提供对应查询时
+        筛选和统计直接交给后端完成，否则通过 iter_flags 流式遍历，内存占用与数据量无关，
+        直到有代码访问 self.flags 为止。
+        内存中的flags是 models.Flag 对象，仍可用 flag["title"] 的方式访问。
+        后端提供 iter_headers / load_history 时只读取flag头部，检查记录在第一次访问时才加载。
+        多个进程共用同一份数据时，写操作持有后端的进程间锁（storage.lock），
+        锁文件中的版本号与内存数据的版本不一致时先重新加载，再在最新数据上执行修改；
+        读操作同样会先检查版本号（一次pread），保证看到其他进程提交的变更。
+        
+        write_delay 为None时每个写操作返回前都已写入存储（默认，命令行使用）；
+        指定秒数时为写入延迟模式（Web应用使用）：变更先只改内存，最后一次写操作之后 write_delay 秒内
+        没有新的写操作、或积累了 max_pending 个操作时，由后台线程合并成一次提交写入存储（整文件存储只重写一次）。
+        flush() 立即写入，close() 和进程正常退出（atexit，SIGTERM 也会转为正常退出）时写入剩余的变更；
+        在此之前其他进程看不到这些变更，进程被强制结束（SIGKILL、断电）时会丢失。
+        mutex 是调用方在多个线程之间串行访问管理器用的锁（如 Web 应用的请求锁），
+        后台线程写入时也持有它，写入和重新应用变更的过程中不会有请求读到一半的数据。
+        写入时发现其他进程已提交过变更，先重新加载，再把未写入的操作应用到最新数据上（见 _rebase）。
+        写入延迟模式需要全部数据在内存中，lazy 后端也会在启动时加载。
+        """
         self.data_file = data_file
-        self.flags = self.load_flags()
+        self.storage = storage or open_storage(data_file)
+        self._lazy = getattr(self.storage, "lazy", False)
+        self._history_loader = getattr(self.storage, "load_history", None)
+        self._lock = self.storage.lock
+        # 内存数据对应的版本号
+        self._version = self._lock.version()
+        self._flags = None
+        self._id_index = IdIndex()
+        self._stats = FlagStats()
+        self._deadline_index = None
+        # 全文搜索索引在第一次搜索时才打开（search.py 和可行性评估的 feasibility.py 都在用到时才导入，
+        # 只读取数据的命令不需要加载numpy）
+        self._search_index = None
+        self._search_saved: Optional[float] = None
+        self._batch_depth = 0
+        # 未加载全部数据时，批量操作中读取或新建过的flags（已删除的记为None）
+        self._pending_flags: Dict[str, Optional[Flag]] = {}
+        # 写入延迟模式下尚未写入存储的操作，由 _dirty 保护，后台线程在上面等待
+        self._write_delay = write_delay
+        self._max_pending = max_pending
+        self._unsaved: List[Dict] = []
+        self._last_write = 0.0
+        self._dirty = threading.Condition()
+        self._mutex = mutex or threading.RLock()
+        self._closed = False
+        self._flusher: Optional[threading.Thread] = None
+        if not self._lazy or write_delay is not None:
+            self._reload()
+        if write_delay is not None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="flag-flush", daemon=True)
+            self._flusher.start()
+            atexit.register(self.close)
+            _exit_on_sigterm()
+    
+    @property
+    def search_file(self) -> str:
+        """搜索索引文件，放在数据文件旁边"""
+        from search import default_index_file
+        return default_index_file(self.data_file)
+    
+    @property
+    def flags(self) -> List[Flag]:
+        """全部flags（按需加载，其他进程提交过变更时重新加载）"""
+        if self._flags is None:
+            self._reload()
+        else:
+            self.refresh()
+        return self._flags
+    
+    @flags.setter
+    def flags(self, value: List[Flag]) -> None:
+        self._set_flags(value)
+    
+    def _set_flags(self, flags: List[Flag]) -> None:
+        """替换内存中的flags并重建索引和统计计数"""
+        self._flags = flags
+        self._id_index.rebuild(flags)
+        self._stats.rebuild(flags)
+        # 到期/检查时间索引在第一次查询提醒时才建立
+        self._deadline_index = None
+        # 搜索索引下次使用时按检查记录的键同步
+        if self._search_index is not None:
+            self._search_index.version = None
+    
+    def _reload(self) -> None:
+        """持有锁从存储重新加载全部flags"""
+        with self._lock:
+            self._version = self._lock.version()
+            self._set_flags(self.load_flags())
+    
+    def refresh(self, force: bool = False) -> bool:
+        """其他进程提交过变更时重新加载数据，返回是否重新加载
+
+        批量操作期间持有锁，内存数据就是最新的，不需要检查；
+        force=True 时无论版本号是否变化都重新加载（如数据文件被手工编辑过）
+        """
+        if self._batch_depth:
+            return False
+        if self._lock.version() == self._version and not force:
+            return False
+        # 持有锁重新加载：不会读到正在提交的数据，也不会与 flush() 交错
+        with self._lock:
+            version = self._lock.version()
+            if version == self._version and not force:
+                # 等待锁期间已经由其他线程重新加载或写入
+                return False
+            if self._unsaved:
+                # 重新加载会丢掉还没写入的变更，先写入（其中会在最新数据上重新应用这些变更）
+                self.flush()
+                if not force:
+                    return True
+                version = self._lock.version()
+            self._version = version
+            if self._flags is not None:
+                self._set_flags(self.load_flags())
+            # 未加载全部数据时直接读后端，只需要记下版本号
+            return True
+    
+    @contextmanager
+    def _writing(self):
+        """单个写操作：持有进程间锁，并在最新的数据上执行"""
+        with self._lock:
+            self.refresh()
+            yield
+    
+    def _deadlines(self) -> DeadlineIndex:
+        """按需建立到期和检查时间索引"""
+        if self._deadline_index is None:
+            self._deadline_index = DeadlineIndex(self.flags)
+        return self._deadline_index
+    
+    def _to_flag(self, data: Dict) -> Flag:
+        """把后端返回的字典转换为Flag，头部字典的检查记录延迟到访问时读取"""
+        return Flag.from_dict(data, self._history_loader)
+    
+    def _iter_storage(self) -> Iterator[Dict]:
+        """流式读取后端数据，能只读头部时不读检查记录"""
+        if hasattr(self.storage, "iter_headers"):
+            return self.storage.iter_headers()
+        return self.storage.iter_flags()
+    
+    def load_flags(self) -> List[Flag]:
+        """从存储后端加载flags数据，日期等字段在这里解析一次"""
+        if hasattr(self.storage, "iter_headers"):
+            return [self._to_flag(data) for data in self.storage.iter_headers()]
+        return [Flag.from_dict(data) for data in self.storage.load()]
+    
+    def iter_flags(self, category: Optional[str] = None, status: Optional[str] = None) -> Iterator[Flag]:
+        """逐个产出flags，支持按分类和状态筛选（不排序）
+
+        数据未加载时直接从后端流式读取，不会把全部数据放进内存
+        """
+        self.refresh()
+        if self._flags is None:
+            source = (self._to_flag(data) for data in self._iter_storage())
+        else:
+            source = iter(self._flags)
+        for flag in source:
+            if category and flag.category != category:
+                continue
+            if status and flag.status != status:
+                continue
+            yield flag
+    
+    def save_flags(self, force: bool = False) -> None:
+        """保存完整的flags数据
+
+        比较并交换：加载之后其他进程提交过变更时抛出 ConcurrentModificationError，
+        不会覆盖别人的修改（调用 refresh() 重新加载后再修改保存）；force=True 时强制覆盖
+        """
+        with self._lock:
+            version = self._lock.version()
+            if version != self._version and not force:
+                raise ConcurrentModificationError(self._version, version)
+            self.storage.save(self.flags)
+            self._advance(self._lock.bump())
+            # 延迟写入的变更已经包含在整体保存的数据中
+            with self._dirty:
+                self._unsaved.clear()
     
-    def load_flags(self) -> List[Dict]:
-        """从文件加载flags数据"""
-        if os.path.exists(self.data_file):
+    def _record(self, op: Dict) -> None:
+        """把一次变更交给存储后端持久化，批量操作之外每次提交后版本号加一
+
+        写入延迟模式下批量操作之外的变更先放进队列，由后台线程或 flush() 写入
+        """
+        if self._write_delay is not None and not self._batch_depth:
+            with self._dirty:
+                self._unsaved.append(op)
+                self._last_write = time.monotonic()
+                self._dirty.notify()
+            return
+        self.storage.append(op, self._flags)
+        if not self._batch_depth:
+            self._advance(self._lock.bump())
+    
+    @property
+    def unsaved_count(self) -> int:
+        """写入延迟模式下尚未写入存储的操作数"""
+        return len(self._unsaved)
+    
+    def flush(self) -> int:
+        """把延迟写入的变更立即写入存储（整批一次提交，版本号加一），返回写入的操作数
+
+        操作提交成功后才移出队列，写入过程中 unsaved_count 不为0，其他线程不会在提交前重新加载；
+        写入失败时这些操作留在队列中，下次再写
+        """
+        with self._lock:
+            with self._dirty:
+                ops = list(self._unsaved)
+            if not ops:
+                return 0
             try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, FileNotFoundError):
-                return []
-        return []
-    
-    def save_flags(self) -> None:
-        """保存flags数据到文件"""
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(self.flags, f, ensure_ascii=False, indent=2)
-    
-    def add_flag(self, title: str, description: str, target_date: str, category: str = "其他") -> Dict:
+                pending = ops
+                if self._lock.version() != self._version:
+                    pending = self._rebase(ops)
+                self.storage.begin()
+                try:
+                    for op in pending:
+                        self.storage.append(op, self._flags)
+                    self.storage.commit(self._flags)
+                except BaseException:
+                    self.storage.rollback()
+                    raise
+                self._advance(self._lock.bump())
+            except BaseException:
+                # 内存数据可能已经按最新数据重新应用过这些操作，也可能只重新加载了一半，
+                # 记为版本未知，下次写入时重新加载并重新应用
+                self._version = None
+                raise
+            with self._dirty:
+                del self._unsaved[:len(ops)]
+            return len(pending)
+    
+    def _rebase(self, ops: List[Dict]) -> List[Dict]:
+        """其他进程在写入之前提交过变更：重新加载，再把未写入的操作应用到最新数据上，返回要写入的操作
+
+        检查记录的序号按最新数据重新计算（两个进程给同一个flag各加一条检查记录时两条都保留），
+        已被其他进程删除的flag上的操作被丢弃；调用时必须持有锁
+        """
+        self._reload()
+        rebased = []
+        for op in ops:
+            kind = op.get("op")
+            if kind == "add":
+                if self._id_index.get(op["flag"]["id"]) is None:
+                    self._insert(Flag.from_dict(op["flag"]))
+                    rebased.append(op)
+                continue
+            flag = self._id_index.get(op["id"])
+            if flag is None:
+                continue
+            if kind == "check":
+                seq = self._apply_check(flag, CheckRecord.from_dict(op["record"]), op["progress"], op["status"])
+                op = dict(op, seq=seq)
+            elif kind == "score":
+                self._apply_score(flag, op["feasibility_score"], op["feasibility_reason"])
+            elif kind == "delete":
+                self._discard(flag)
+            rebased.append(op)
+        return rebased
+    
+    def _flush_loop(self) -> None:
+        """后台线程：最后一次写操作之后 write_delay 秒内没有新的写操作，或积累了 max_pending 个操作时写入"""
+        while True:
+            with self._dirty:
+                while not self._unsaved and not self._closed:
+                    self._dirty.wait()
+                if self._closed:
+                    # 剩余的变更由 close() 写入
+                    return
+                remaining = self._last_write + self._write_delay - time.monotonic()
+                if remaining > 0 and len(self._unsaved) < self._max_pending:
+                    self._dirty.wait(remaining)
+                    continue
+            # 与调用方共用 mutex；调用方可能正持有它调用 close()（等待本线程结束），不能一直等下去
+            while not self._mutex.acquire(timeout=0.1):
+                if self._closed:
+                    return
+            try:
+                if self._closed:
+                    return
+                self.flush()
+                continue
+            except Exception as e:
+                print(f"⚠️  延迟写入失败，{self._write_delay} 秒后重试: {e}", file=sys.stderr)
+            finally:
+                self._mutex.release()
+            with self._dirty:
+                self._dirty.wait(self._write_delay)
+    
+    def _advance(self, version: int) -> None:
+        """记下提交后的版本号，提交前与数据一致的搜索索引随之前进"""
+        if self._search_index is not None and self._search_index.version == self._version:
+            self._search_index.version = version
+        self._version = version
+    
+    @property
+    def loaded_count(self) -> int:
+        """内存中的flags数量，用于估算内存占用（未加载全部数据时只计批量操作中的flags）"""
+        return len(self._flags) if self._flags is not None else len(self._pending_flags)
+    
+    def close(self) -> None:
+        """写入延迟写入的变更，释放存储后端的文件和连接，之后不能再使用（重复调用没有影响）"""
+        if self._closed:
+            return
+        if self._flusher is not None:
+            with self._dirty:
+                self._closed = True
+                self._dirty.notify()
+            self._flusher.join()
+            atexit.unregister(self.close)
+            self.flush()
+        self._closed = True
+        close = getattr(self.storage, "close", None)
+        if close is not None:
+            close()
+        else:
+            self._lock.close()
+    
+    def compact(self) -> None:
+        """压缩存储（追加式日志合并为快照）"""
+        with self._writing():
+            self.flush()
+            self.storage.compact(self._flags)
+    
+    @contextmanager
+    def batch(self):
+        """批量操作
+
+        with 块中的变更在退出时一次性持久化（整文件存储只写一次，日志存储只追加一行，
+        SQLite在同一个事务中提交）；块内抛出异常时所有变更都会回滚，文件保持原样。
+        整个批次持有进程间锁，开始时数据已过期会先重新加载。
+        嵌套使用时并入最外层的批次。
+        """
+        if self._batch_depth:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+            return
+        
+        self._lock.acquire()
+        try:
+            self.refresh()
+            # 批量操作总是同步提交；先写入之前延迟的变更，回滚时重新加载的才是批次开始前的数据
+            self.flush()
+            self._batch_depth = 1
+            self.storage.begin()
+            try:
+                yield self
+                self.storage.commit(self._flags)
+                self._advance(self._lock.bump())
+            except BaseException:
+                self.storage.rollback()
+                if self._search_index is not None:
+                    self._search_index.version = None
+                # 内存中的修改同样作废，从存储重新加载
+                if self._flags is not None:
+                    self._reload()
+                raise
+        finally:
+            self._batch_depth = 0
+            self._pending_flags.clear()
+            self._lock.release()
+    
+    def add_flags(self, items: Iterable[Dict]) -> List[Flag]:
+        """批量添加flags
+
+        items 中每项包含 title、description、target_date，可选 category；
+        缺少必填字段时抛出 ValueError，整批回滚
+        """
+        added = []
+        with self.batch():
+            for item in items:
+                missing = [key for key in ("title", "description", "target_date") if not item.get(key)]
+                if missing:
+                    raise ValueError(f"缺少必填字段: {', '.join(missing)}")
+                added.append(self.add_flag(
+                    title=item["title"],
+                    description=item["description"],
+                    target_date=item["target_date"],
+                    category=item.get("category") or "其他"
+                ))
+        return added
+    
+    def update_progress_many(self, updates: Iterable[Tuple]) -> int:
+        """批量更新进度，updates 中每项为 (flag_id, progress) 或 (flag_id, progress, notes)
+
+        找不到的ID会被跳过，返回成功更新的数量
+        """
+        updated = 0
+        with self.batch():
+            for update in updates:
+                if self.update_progress(*update):
+                    updated += 1
+        return updated
+    
+    def delete_many(self, flag_ids: Iterable[str]) -> int:
+        """批量删除flags，找不到的ID会被跳过，返回成功删除的数量"""
+        deleted = 0
+        with self.batch():
+            for flag_id in flag_ids:
+                if self.delete_flag(flag_id):
+                    deleted += 1
+        return deleted
+    
+    def resolve_id(self, flag_id: str) -> Optional[str]:
+        """把完整ID或唯一的ID前缀解析为完整ID
+
+        找不到时返回None，前缀匹配到多个flag时抛出 AmbiguousIdError
+        """
+        self.refresh()
+        if self._flags is not None:
+            matches = self._id_index.match(flag_id)
+        elif flag_id in self._pending_flags:
+            matches = [flag_id] if self._pending_flags[flag_id] is not None else []
+        elif hasattr(self.storage, "match_ids"):
+            matches = self.storage.match_ids(flag_id)
+        else:
+            matches = []
+            for data in self._iter_storage():
+                if data["id"] == flag_id:
+                    matches = [flag_id]
+                    break
+                if data["id"].startswith(flag_id):
+                    matches.append(data["id"])
+                    if len(matches) > 1:
+                        break
+        return resolve_matches(flag_id, matches)
+    
+    def get_flag(self, flag_id: str) -> Optional[Flag]:
+        """按完整ID或唯一的ID前缀获取flag"""
+        full_id = self.resolve_id(flag_id)
+        if full_id is None:
+            return None
+        if self._flags is not None:
+            return self._id_index.get(full_id)
+        if full_id in self._pending_flags:
+            return self._pending_flags[full_id]
+        
+        if hasattr(self.storage, "get_flag"):
+            data = self.storage.get_flag(full_id)
+        else:
+            data = next((d for d in self._iter_storage() if d["id"] == full_id), None)
+        flag = self._to_flag(data) if data is not None else None
+        if flag is not None and self._batch_depth:
+            # 批量操作尚未写入存储，同一个flag后续的修改要基于这个对象继续
+            self._pending_flags[full_id] = flag
+        return flag
+    
+    def get_flags(self, flag_ids: Iterable[str]) -> Dict[str, Flag]:
+        """按完整ID批量获取flags，返回 {ID: flag}，不存在的ID不在其中
+
+        后端支持按ID读取时逐个读取，否则流式扫描一遍后端数据，只转换需要的flags
+        """
+        self.refresh()
+        wanted = set(flag_ids)
+        result = {}
+        if self._flags is not None:
+            for flag_id in wanted:
+                flag = self._id_index.get(flag_id)
+                if flag is not None:
+                    result[flag_id] = flag
+            return result
+        
+        for flag_id in wanted & self._pending_flags.keys():
+            if self._pending_flags[flag_id] is not None:
+                result[flag_id] = self._pending_flags[flag_id]
+        wanted -= self._pending_flags.keys()
+        if hasattr(self.storage, "get_flag"):
+            found = (self.storage.get_flag(flag_id) for flag_id in wanted)
+        else:
+            found = (data for data in self._iter_storage() if data["id"] in wanted)
+        for data in found:
+            if data is not None:
+                result[data["id"]] = self._to_flag(data)
+        return result
+    
+    def add_flag(self, title: str, description: str, target_date: str, category: str = "其他") -> Flag:
         """添加新的flag"""
         flag = {
             "id": str(uuid.uuid4()),
@@ -51,150 +542,292 @@ class FlagManager:
         feasibility = self.assess_feasibility(flag)
         flag["feasibility_score"] = feasibility["score"]
         flag["feasibility_reason"] = feasibility["reason"]
+        flag = Flag.from_dict(flag)
         
-        self.flags.append(flag)
-        self.save_flags()
+        with self._writing():
+            self._insert(flag)
+            self._record({"op": "add", "flag": flag.to_dict()})
         return flag
     
-    def assess_feasibility(self, flag: Dict) -> Dict:
-        """评估flag的可行性"""
-        score = 100
-        reasons = []
-        
-        # 评估时间合理性
-        try:
-            target_date = datetime.strptime(flag["target_date"], "%Y-%m-%d")
-            today = datetime.now()
-            days_until_target = (target_date - today).days
-            
-            if days_until_target < 30:
-                score -= 30
-                reasons.append("目标时间过短（少于30天）")
-            elif days_until_target < 90:
-                score -= 10
-                reasons.append("目标时间较短（少于3个月）")
-            elif days_until_target > 365:
-                score -= 5
-                reasons.append("目标时间过长（超过1年）")
-        except ValueError:
-            score -= 20
-            reasons.append("日期格式不正确")
-        
-        # 评估描述的具体性
-        if len(flag["description"]) < 20:
-            score -= 15
-            reasons.append("描述过于简单，缺乏具体性")
-        elif len(flag["description"]) < 50:
-            score -= 5
-            reasons.append("描述可以更具体一些")
-        
-        # 评估标题的明确性
-        if len(flag["title"]) < 5:
-            score -= 10
-            reasons.append("标题过于简短")
-        
-        # 评估是否包含可量化指标
-        description_lower = flag["description"].lower()
-        if any(word in description_lower for word in ["每天", "每周", "每月", "次", "小时", "分钟"]):
-            score += 5
-        else:
-            score -= 5
-            reasons.append("缺乏可量化的指标")
+    def _insert(self, flag: Flag) -> None:
+        """把新flag加入内存数据、索引和统计计数"""
+        if self._flags is not None:
+            self._flags.append(flag)
+            self._id_index.add(flag)
+            self._stats.add(flag)
+            if self._deadline_index is not None:
+                self._deadline_index.add(flag)
+        elif self._batch_depth:
+            self._pending_flags[flag.id] = flag
+        if self._search_index is not None:
+            self._search_index.add(flag)
+    
+    def _discard(self, flag: Flag) -> None:
+        """从内存数据、索引和统计计数中移除flag"""
+        if self._flags is not None:
+            self._flags.remove(flag)
+            self._id_index.remove(flag.id)
+            self._stats.remove(flag)
+            if self._deadline_index is not None:
+                self._deadline_index.remove(flag.id)
+        elif self._batch_depth:
+            self._pending_flags[flag.id] = None
+        if self._search_index is not None:
+            self._search_index.remove(flag.id)
+    
+    def _apply_check(self, flag: Flag, record: CheckRecord, progress: int, status: str) -> int:
+        """给flag追加一条检查记录并更新进度和状态，返回记录的序号"""
+        old_status = flag.status
+        flag.progress = progress
+        seq = flag.add_check(record)
+        flag.status = status
         
-        return {
-            "score": max(0, min(100, score)),
-            "reason": "；".join(reasons) if reasons else "目标设定合理，可行性较高"
-        }
+        if self._flags is not None:
+            self._stats.change_status(old_status, flag.status)
+            if self._deadline_index is not None:
+                self._deadline_index.update(flag)
+        if self._search_index is not None:
+            # 只有带备注的检查会改变可搜索的文本
+            if record.notes:
+                self._search_index.update(flag)
+            else:
+                self._search_index.touch(flag)
+        return seq
+    
+    def _apply_score(self, flag: Flag, score: Optional[int], reason: str) -> None:
+        """修改flag的可行性评分"""
+        if self._flags is not None:
+            self._stats.change_score(flag.feasibility_score, score)
+        elif self._batch_depth:
+            self._pending_flags[flag.id] = flag
+        flag.feasibility_score = score
+        flag.feasibility_reason = reason
+    
+    def assess_feasibility(self, flag: Dict, now: Optional[datetime] = None) -> Dict:
+        """评估flag的可行性（规则见 feasibility.py）"""
+        import feasibility
+        return feasibility.assess(flag, now)
+    
+    def assess_feasibility_many(self, flags: Iterable, now: Optional[datetime] = None,
+                                plan=None, timings: Optional[Dict[str, float]] = None) -> List[Dict]:
+        """批量评估可行性，结果与逐个调用 assess_feasibility 相同，整批使用同一个当前时间
+
+        plan 为 feasibility.load_plan() 加载的规则（默认规则文件），timings 见 RulePlan.evaluate_many
+        """
+        import feasibility
+        return feasibility.assess_many(list(flags), now, plan, timings)
+    
+    def rescore(self, now: Optional[datetime] = None, plan=None,
+                timings: Optional[Dict[str, float]] = None) -> Tuple[int, int]:
+        """用当前规则重新评估全部flags，只保存评分或说明有变化的flags
+
+        整个过程是一个批量操作，只持久化一次。返回 (评估数量, 变化数量)
+        """
+        with self.batch():
+            flags = list(self.iter_flags())
+            results = self.assess_feasibility_many(flags, now, plan, timings)
+            changed = 0
+            for flag, result in zip(flags, results):
+                if flag.feasibility_score == result["score"] and flag.feasibility_reason == result["reason"]:
+                    continue
+                self._apply_score(flag, result["score"], result["reason"])
+                self._record({
+                    "op": "score",
+                    "id": flag.id,
+                    "feasibility_score": flag.feasibility_score,
+                    "feasibility_reason": flag.feasibility_reason
+                })
+                changed += 1
+        return len(flags), changed
     
     def update_progress(self, flag_id: str, progress: int, notes: str = "") -> bool:
-        """更新flag进度"""
-        for flag in self.flags:
-            if flag["id"] == flag_id:
-                flag["progress"] = max(0, min(100, progress))
-                
-                # 添加检查记录
-                check_record = {
-                    "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "progress": progress,
-                    "notes": notes
-                }
-                flag["check_history"].append(check_record)
-                
-                # 更新状态
-                if progress >= 100:
-                    flag["status"] = "已完成"
-                elif progress > 0:
-                    flag["status"] = "进行中"
-                else:
-                    flag["status"] = "未开始"
-                
-                self.save_flags()
-                return True
-        return False
-    
-    def get_monthly_reminders(self) -> List[Dict]:
-        """获取月度提醒的flags"""
-        reminders = []
-        today = datetime.now()
-        
-        for flag in self.flags:
-            if flag["status"] in ["进行中", "未开始"]:
-                # 检查是否需要月度提醒
-                if flag["check_history"]:
-                    last_check = datetime.strptime(flag["check_history"][-1]["date"], "%Y-%m-%d %H:%M:%S")
-                    days_since_last_check = (today - last_check).days
-                    
-                    if days_since_last_check >= 30:
-                        reminders.append(flag)
-                else:
-                    # 如果从未检查过，创建时间超过30天也需要提醒
-                    created_date = datetime.strptime(flag["created_date"], "%Y-%m-%d")
-                    days_since_created = (today - created_date).days
-                    
-                    if days_since_created >= 30:
-                        reminders.append(flag)
+        """更新flag进度，flag_id 可以是完整ID或唯一的ID前缀"""
+        with self._writing():
+            flag = self.get_flag(flag_id)
+            if flag is None:
+                return False
+            
+            # 更新状态
+            if progress >= 100:
+                status = "已完成"
+            elif progress > 0:
+                status = "进行中"
+            else:
+                status = "未开始"
+            
+            # 添加检查记录
+            check_record = CheckRecord.now(progress, notes)
+            seq = self._apply_check(flag, check_record, max(0, min(100, progress)), status)
+            
+            self._record({
+                "op": "check",
+                "id": flag.id,
+                "seq": seq,
+                "record": check_record.to_dict(),
+                "progress": flag.progress,
+                "status": flag.status
+            })
+            return True
+    
+    def _deadline_query(self, name: str, bounds) -> List[Tuple[int, Flag]]:
+        """查询到期/检查时间索引中时间戳落在区间内的flags，按时间升序返回 (时间戳, flag)
+
+        数据已加载时使用索引做区间查找，未加载时交给提供 deadline_query 的后端（按时间戳列查找），否则流式扫描一遍
+        """
+        self.refresh()
+        if self._flags is not None:
+            return [(timestamp, self._id_index.get(flag_id))
+                    for timestamp, flag_id in self._deadlines().query(name, bounds)]
+        if hasattr(self.storage, "deadline_query"):
+            return [(timestamp, self._to_flag(data)) for timestamp, data in self.storage.deadline_query(name, bounds)]
         
-        return reminders
+        matches = []
+        for flag in self.iter_flags():
+            for entry_name, timestamp in deadline_entries(flag):
+                if entry_name == name and in_range(timestamp, bounds):
+                    matches.append((timestamp, flag))
+        matches.sort(key=lambda item: (item[0], item[1].id))
+        return matches
+    
+    def get_monthly_reminders(self, days: int = 30) -> List[Flag]:
+        """获取月度提醒的flags
+
+        未完成且超过days天没有检查（从未检查过则按创建日期计算）的flags，最久未检查的排在前面
+        """
+        return [flag for _, flag in self._deadline_query("activity", stale_range(datetime.now(), days))]
     
-    def list_flags(self, category: Optional[str] = None, status: Optional[str] = None) -> List[Dict]:
+    def get_upcoming_deadlines(self, days: int = 30) -> List[Tuple[Flag, int]]:
+        """获取days天内到期的未完成flags，返回按剩余天数升序排列的 (flag, 剩余天数)"""
+        now = datetime.now()
+        now_ts = to_timestamp(now)
+        return [(flag, int((target - now_ts) // DAY))
+                for target, flag in self._deadline_query("deadlines", due_range(now, days))]
+    
+    def get_recently_completed(self, days: int = 7) -> List[Flag]:
+        """获取最近days天内完成的flags"""
+        return [flag for _, flag in self._deadline_query("completed", recent_range(datetime.now(), days))]
+    
+    def list_flags(self, category: Optional[str] = None, status: Optional[str] = None) -> List[Flag]:
         """列出flags，支持按分类和状态筛选"""
-        result = self.flags
-        
-        if category:
-            result = [f for f in result if f["category"] == category]
+        self.refresh()
+        if self._flags is None and hasattr(self.storage, "query_flags"):
+            return [self._to_flag(data) for data in self.storage.query_flags(category=category, status=status)]
         
-        if status:
-            result = [f for f in result if f["status"] == status]
+        # 先按条件流式筛选，只有结果需要放进内存排序
+        result = self.iter_flags(category=category, status=status)
+        return sorted(result, key=lambda x: x.created_date, reverse=True)
+    
+    def page_flags(self, category: Optional[str] = None, status: Optional[str] = None,
+                   after: Optional[Tuple[str, str]] = None, limit: int = 50) -> List[Flag]:
+        """分页列出flags，按 (创建日期倒序, ID) 排序
+
+        after 为上一页最后一个flag的 (创建日期, ID)，翻页时不受其他flags增删的影响
+        """
+        self.refresh()
+        if self._flags is None and hasattr(self.storage, "query_flags"):
+            rows = self.storage.query_flags(category=category, status=status, after=after, limit=limit)
+            return [self._to_flag(data) for data in rows]
         
-        return sorted(result, key=lambda x: x["created_date"], reverse=True)
+        result = self.iter_flags(category=category, status=status)
+        if after:
+            created, last_id = after
+            result = (flag for flag in result
+                      if flag.created_date < created or (flag.created_date == created and flag.id > last_id))
+        result = sorted(result, key=lambda x: x.id)
+        result.sort(key=lambda x: x.created_date, reverse=True)
+        return result[:limit]
     
     def delete_flag(self, flag_id: str) -> bool:
-        """删除flag"""
-        for i, flag in enumerate(self.flags):
-            if flag["id"] == flag_id:
-                del self.flags[i]
-                self.save_flags()
-                return True
-        return False
+        """删除flag，flag_id 可以是完整ID或唯一的ID前缀"""
+        with self._writing():
+            flag = self.get_flag(flag_id)
+            if flag is None:
+                return False
+            
+            self._discard(flag)
+            self._record({"op": "delete", "id": flag.id})
+            return True
+    
+    def _search(self, rebuild: bool = False) -> "SearchIndex":
+        """按需打开搜索索引，索引对应的版本与数据不一致时增量同步
+
+        rebuild=True 时丢弃已保存的索引重新建立
+        """
+        from search import SearchIndex
+        self.refresh()
+        if self._search_index is None or rebuild:
+            self._search_index = SearchIndex() if rebuild else SearchIndex.load(self.search_file)
+        index = self._search_index
+        version = self._version
+        # 版本号为0表示锁文件不可用，无法判断索引是否过期
+        if index.version != version or not version:
+            if self._flags is None and not len(index):
+                # 新建索引时整体读取检查记录，不逐个flag加载
+                flags = (Flag.from_dict(data) for data in self.storage.iter_flags())
+            else:
+                flags = self.iter_flags()
+            index.sync(flags)
+            index.version = version
+        return index
+    
+    def search(self, query: str, limit: int = 20, rebuild: bool = False) -> List[Tuple[Flag, float]]:
+        """全文搜索标题、描述和检查记录备注，返回按相关度从高到低排列的 (flag, 得分)
+
+        所有查询词都出现才算命中（汉字按相邻两字匹配，见 search.py）；
+        索引有变化时保存到 search_file，长期运行的进程中最多每 SEARCH_SAVE_INTERVAL 秒保存一次
+        """
+        index = self._search(rebuild)
+        results = []
+        for flag_id, score in index.search(query, limit):
+            flag = self.get_flag(flag_id)
+            if flag is not None:
+                results.append((flag, score))
+        if index.dirty and (self._search_saved is None
+                            or time.monotonic() - self._search_saved >= SEARCH_SAVE_INTERVAL):
+            try:
+                index.save(self.search_file)
+            except OSError:
+                # 目录不可写时只使用内存中的索引
+                pass
+            self._search_saved = time.monotonic()
+        return results
+    
+    def get_counts(self) -> Dict:
+        """统计计数（总数、各状态和分类的数量、评分之和），可以用 indexes.merge_counts 合并多份"""
+        self.refresh()
+        if self._flags is not None:
+            return self._stats.snapshot()
+        if hasattr(self.storage, "statistics"):
+            return self.storage.statistics()
+        # 后端没有维护计数时流式统计一遍
+        return FlagStats(self.iter_flags()).snapshot()
     
     def get_statistics(self) -> Dict:
-        """获取统计信息"""
-        total = len(self.flags)
-        completed = len([f for f in self.flags if f["status"] == "已完成"])
-        in_progress = len([f for f in self.flags if f["status"] == "进行中"])
-        not_started = len([f for f in self.flags if f["status"] == "未开始"])
+        """获取统计信息（读取增量维护的计数，不遍历flags）"""
+        return summarize_counts(self.get_counts())
+    
+    def verify_statistics(self, repair: bool = False) -> Dict:
+        """从头重新计算统计数据，与增量维护的计数比较
+
+        返回有偏差的字段 {字段: (维护值, 实际值)}，没有偏差时返回空字典；
+        repair=True 时用重新计算的结果修正计数
+        """
+        self.refresh()
+        if self._flags is not None:
+            stored = self._stats.snapshot()
+            actual = FlagStats(self._flags).snapshot()
+        elif hasattr(self.storage, "recount_statistics"):
+            stored = self.storage.statistics()
+            actual = self.storage.recount_statistics()
+        else:
+            # 后端没有维护计数，统计总是现算的
+            return {}
         
-        avg_feasibility = 0
-        if total > 0:
-            scores = [f["feasibility_score"] for f in self.flags if f["feasibility_score"] is not None]
-            if scores:
-                avg_feasibility = sum(scores) / len(scores)
+        drift = {key: (stored[key], actual[key]) for key in actual if stored[key] != actual[key]}
         
-        return {
-            "total": total,
-            "completed": completed,
-            "in_progress": in_progress,
-            "not_started": not_started,
-            "completion_rate": (completed / total * 100) if total > 0 else 0,
-            "avg_feasibility": round(avg_feasibility, 1)
-        }
\ No newline at end of file
+        if drift and repair:
+            if self._flags is not None:
+                self._stats.rebuild(self._flags)
+            else:
+                self.storage.rebuild_counters()
+        return drift
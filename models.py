@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - 内存数据模型
+Flag和检查记录使用__slots__对象保存，日期在加载时解析一次为整数，
+状态和分类保存为小整数编码。对象同时支持 flag["title"] 形式的访问，
+序列化结果与原有的JSON格式完全一致。
+检查记录可以按需加载：只读取了flag头部（含最近检查时间和记录条数）时，
+第一次访问 check_history 才通过 history_loader 读取完整记录。
+"""
+
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import List, Dict, Callable, Optional, Union
+
+DATE_FORMAT = "%Y-%m-%d"
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+EPOCH = datetime(1970, 1, 1)
+EPOCH_DATE = EPOCH.date()
+EPOCH_ORDINAL = EPOCH_DATE.toordinal()
+
+FLAG_FIELDS = ("id", "title", "description", "category", "target_date", "created_date",
+               "progress", "status", "check_history", "feasibility_score", "feasibility_reason")
+RECORD_FIELDS = ("date", "progress", "notes")
+# 分开存储检查记录时，flag头部额外缓存的字段
+HEADER_FIELDS = ("last_check", "history_count")
+
+
+class Interner:
+    """把重复出现的字符串映射为小整数编码"""
+
+    def __init__(self, values: List[str] = ()):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+        for value in values:
+            self.code(value)
+
+    def code(self, value: str) -> int:
+        """取得字符串的编码，第一次出现时分配新编码"""
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+    def value(self, code: int) -> str:
+        """由编码还原字符串"""
+        return self.values[code]
+
+
+STATUSES = Interner(["未开始", "进行中", "已完成"])
+CATEGORIES = Interner(["其他"])
+
+
+def _is_canonical_date(value: str) -> bool:
+    """是否为补零的 YYYY-MM-DD（这种写法解析后可以原样还原）"""
+    return len(value) == 10 and value[4] == "-" and value[7] == "-"
+
+
+def encode_date(value: str) -> Union[int, str]:
+    """YYYY-MM-DD 转换为距1970-01-01的天数，不能无损还原的值保留原字符串"""
+    if not isinstance(value, str) or not _is_canonical_date(value):
+        return value
+    try:
+        return date.fromisoformat(value).toordinal() - EPOCH_ORDINAL
+    except ValueError:
+        return value
+
+
+@lru_cache(maxsize=None)
+def _format_day(days: int) -> str:
+    return (EPOCH_DATE + timedelta(days=days)).isoformat()
+
+
+def decode_date(value: Union[int, str]) -> str:
+    """还原 encode_date 的结果"""
+    return _format_day(value) if isinstance(value, int) else value
+
+
+def encode_datetime(value: str) -> Union[int, str]:
+    """YYYY-MM-DD HH:MM:SS 转换为秒数（本地时间，不做时区换算），不能无损还原的值保留原字符串"""
+    if (not isinstance(value, str) or len(value) != 19 or value[10] != " "
+            or value[13] != ":" or value[16] != ":" or not _is_canonical_date(value[:10])):
+        return value
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return value
+    return ((parsed.toordinal() - EPOCH_ORDINAL) * 86400
+            + parsed.hour * 3600 + parsed.minute * 60 + parsed.second)
+
+
+def decode_datetime(value: Union[int, str]) -> str:
+    """还原 encode_datetime 的结果"""
+    if isinstance(value, int):
+        days, seconds = divmod(value, 86400)
+        minutes, second = divmod(seconds, 60)
+        hour, minute = divmod(minutes, 60)
+        return f"{_format_day(days)} {hour:02d}:{minute:02d}:{second:02d}"
+    return value
+
+
+def _timestamp(value: Union[int, str], fmt: str, scale: int) -> Optional[int]:
+    """取得编码值对应的秒数；保留为字符串的值按原格式再尝试解析一次"""
+    if isinstance(value, int):
+        return value * scale
+    try:
+        return int((datetime.strptime(value, fmt) - EPOCH).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class _Mapping:
+    """提供只读/可写的字典式访问，兼容直接使用flag字典的代码"""
+
+    __slots__ = ()
+    FIELDS = ()
+
+    def __getitem__(self, key: str):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value) -> None:
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.FIELDS
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in self.FIELDS else default
+
+    def keys(self):
+        return iter(self.FIELDS)
+
+
+class CheckRecord(_Mapping):
+    """一次进度检查记录"""
+
+    __slots__ = ("stamp", "progress", "notes")
+    FIELDS = RECORD_FIELDS
+
+    def __init__(self, stamp: Union[int, str], progress: int, notes: str = ""):
+        self.stamp = stamp
+        self.progress = progress
+        self.notes = notes
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "CheckRecord":
+        return cls(encode_datetime(data["date"]), data["progress"], data.get("notes", ""))
+
+    @classmethod
+    def now(cls, progress: int, notes: str = "") -> "CheckRecord":
+        """以当前时间创建检查记录"""
+        return cls(int((datetime.now().replace(microsecond=0) - EPOCH).total_seconds()), progress, notes)
+
+    def to_dict(self) -> Dict:
+        return {"date": self.date, "progress": self.progress, "notes": self.notes}
+
+    @property
+    def date(self) -> str:
+        return decode_datetime(self.stamp)
+
+    @date.setter
+    def date(self, value: str) -> None:
+        self.stamp = encode_datetime(value)
+
+    @property
+    def timestamp(self) -> Optional[int]:
+        """检查时间的秒数，日期格式不正确时为None"""
+        return _timestamp(self.stamp, DATETIME_FORMAT, 1)
+
+
+class Flag(_Mapping):
+    """一个flag"""
+
+    __slots__ = ("id", "title", "description", "category_code", "target", "created",
+                 "progress", "status_code", "history", "last_check", "history_count",
+                 "history_loader", "feasibility_score", "feasibility_reason", "extra")
+    FIELDS = FLAG_FIELDS
+
+    @classmethod
+    def from_dict(cls, data: Dict, history_loader: Optional[Callable[[str], List[Dict]]] = None) -> "Flag":
+        """由字典创建flag
+
+        data 不含 check_history 时视为flag头部，检查记录在第一次访问时由 history_loader(id) 读取
+        """
+        flag = cls.__new__(cls)
+        flag.id = data["id"]
+        flag.title = data["title"]
+        flag.description = data["description"]
+        flag.category_code = CATEGORIES.code(data["category"])
+        flag.target = encode_date(data["target_date"])
+        flag.created = encode_date(data["created_date"])
+        flag.progress = data["progress"]
+        flag.status_code = STATUSES.code(data["status"])
+        if "check_history" in data:
+            flag.check_history = [
+                CheckRecord(encode_datetime(record["date"]), record["progress"], record.get("notes", ""))
+                for record in data["check_history"]
+            ]
+            flag.history_loader = None
+        else:
+            last_check = data.get("last_check")
+            flag.history = None
+            flag.last_check = encode_datetime(last_check) if last_check else None
+            flag.history_count = data.get("history_count") or 0
+            flag.history_loader = history_loader
+        flag.feasibility_score = data.get("feasibility_score")
+        flag.feasibility_reason = data.get("feasibility_reason", "")
+        # 保留未知字段，保证写回文件时不丢数据
+        extra = {key: value for key, value in data.items()
+                 if key not in FLAG_FIELDS and key not in HEADER_FIELDS}
+        flag.extra = extra or None
+        return flag
+
+    def to_dict(self) -> Dict:
+        data = {
+            "id": self.id,
+            "title": self.title,
+            "description": self.description,
+            "category": self.category,
+            "target_date": self.target_date,
+            "created_date": self.created_date,
+            "progress": self.progress,
+            "status": self.status,
+            "check_history": [record.to_dict() for record in self.check_history],
+            "feasibility_score": self.feasibility_score,
+            "feasibility_reason": self.feasibility_reason
+        }
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def header_dict(self) -> Dict:
+        """不含检查记录的头部字典，附带最近检查时间和记录条数，不会触发加载检查记录"""
+        data = {
+            "id": self.id,
+            "title": self.title,
+            "description": self.description,
+            "category": self.category,
+            "target_date": self.target_date,
+            "created_date": self.created_date,
+            "progress": self.progress,
+            "status": self.status,
+            "feasibility_score": self.feasibility_score,
+            "feasibility_reason": self.feasibility_reason,
+            "last_check": self.last_check_date,
+            "history_count": self.checks
+        }
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    @property
+    def check_history(self) -> List[CheckRecord]:
+        """全部检查记录，未加载时在这里读取"""
+        if self.history is None:
+            records = self.history_loader(self.id) if self.history_loader else []
+            self.history = [CheckRecord.from_dict(record) for record in records[:self.history_count]]
+        return self.history
+
+    @check_history.setter
+    def check_history(self, value: List[CheckRecord]) -> None:
+        self.history = value
+        self.last_check = value[-1].stamp if value else None
+        self.history_count = len(value)
+
+    @property
+    def history_loaded(self) -> bool:
+        """检查记录是否已经在内存中"""
+        return self.history is not None
+
+    @property
+    def checks(self) -> int:
+        """检查记录条数，不会触发加载"""
+        return self.history_count if self.history is None else len(self.history)
+
+    def add_check(self, record: CheckRecord) -> int:
+        """追加一条检查记录并返回它的序号，未加载的检查记录不会因此被读取"""
+        seq = self.checks
+        if self.history is not None:
+            self.history.append(record)
+        else:
+            # 记录可能还没写入存储，读取检查记录时补在已保存的记录后面
+            loader = self.history_loader or (lambda flag_id: [])
+            saved = record.to_dict()
+            self.history_loader = lambda flag_id: loader(flag_id)[:seq] + [saved]
+        self.history_count = seq + 1
+        self.last_check = record.stamp
+        return seq
+
+    @property
+    def status(self) -> str:
+        return STATUSES.value(self.status_code)
+
+    @status.setter
+    def status(self, value: str) -> None:
+        self.status_code = STATUSES.code(value)
+
+    @property
+    def category(self) -> str:
+        return CATEGORIES.value(self.category_code)
+
+    @category.setter
+    def category(self, value: str) -> None:
+        self.category_code = CATEGORIES.code(value)
+
+    @property
+    def target_date(self) -> str:
+        return decode_date(self.target)
+
+    @target_date.setter
+    def target_date(self, value: str) -> None:
+        self.target = encode_date(value)
+
+    @property
+    def created_date(self) -> str:
+        return decode_date(self.created)
+
+    @created_date.setter
+    def created_date(self, value: str) -> None:
+        self.created = encode_date(value)
+
+    @property
+    def target_timestamp(self) -> Optional[int]:
+        """目标日期零点的秒数，日期格式不正确时为None"""
+        return _timestamp(self.target, DATE_FORMAT, 86400)
+
+    @property
+    def created_timestamp(self) -> Optional[int]:
+        """创建日期零点的秒数，日期格式不正确时为None"""
+        return _timestamp(self.created, DATE_FORMAT, 86400)
+
+    @property
+    def last_check_stamp(self) -> Optional[Union[int, str]]:
+        """最近一次检查时间的编码值，从未检查过时为None"""
+        if self.history is not None:
+            return self.history[-1].stamp if self.history else None
+        return self.last_check
+
+    @property
+    def last_check_date(self) -> Optional[str]:
+        """最近一次检查的时间字符串，从未检查过时为None"""
+        stamp = self.last_check_stamp
+        return decode_datetime(stamp) if stamp is not None else None
+
+    @property
+    def last_check_timestamp(self) -> Optional[int]:
+        """最近一次检查的秒数，从未检查过时为None"""
+        stamp = self.last_check_stamp
+        return _timestamp(stamp, DATETIME_FORMAT, 1) if stamp is not None else None
+
+
+def to_json(obj):
+    """json.dump 的 default 钩子，把模型对象转换为字典"""
+    if hasattr(obj, "to_dict"):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - 性能剖析
+按需开启（环境变量 FLAG_PROFILE 或命令行 --profile）：开启时给 FlagManager 的公开方法、各存储后端的公开方法
+和进程间锁套上计时包装，统计调用次数和耗时，同时统计存储模块读写文件的字节数和JSON编解码的次数和耗时。
+未开启时不替换任何函数，没有额外开销。
+结果可以输出为汇总表、Chrome trace JSON（用 chrome://tracing 或 Perfetto 打开）或 Prometheus 文本格式，
+Web进程开启后在 /metrics 提供 Prometheus 格式的指标。
+
+FLAG_PROFILE 取值: summary（或1）、trace、prometheus；FLAG_PROFILE_OUTPUT 为输出文件（默认输出到标准错误，
+trace 默认写入 flag_trace.json）。返回生成器的方法按遍历过程中实际花费的时间计时；耗时是包含子调用的累计时间。
+"""
+
+import atexit
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+PROFILE_ENV = "FLAG_PROFILE"
+OUTPUT_ENV = "FLAG_PROFILE_OUTPUT"
+FORMATS = ("summary", "trace", "prometheus")
+DEFAULT_TRACE_FILE = "flag_trace.json"
+# trace 最多保留的事件数，超过后只计数不记录
+MAX_TRACE_EVENTS = 500000
+# 进程间锁上计时的方法（acquire 的耗时即等锁时间）
+LOCK_METHODS = ("acquire", "version", "bump")
+
+_MISSING = object()
+
+
+class Metrics:
+    """调用计时和计数，多个线程共用"""
+
+    def __init__(self, trace: bool = False):
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self.counters: Dict[str, int] = defaultdict(int)
+        # (名称, 开始, 结束, 线程ID)，不记录 trace 时为None
+        self.events: Optional[List[Tuple[str, float, float, int]]] = [] if trace else None
+        self.dropped = 0
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, name: str, started: float, ended: float, trace: bool = True) -> None:
+        """记录一次调用；trace=False 的调用（如逐行的JSON解码）只计数，不写入 trace"""
+        with self._lock:
+            self.calls[name] += 1
+            self.seconds[name] += ended - started
+            if trace and self.events is not None:
+                if len(self.events) < MAX_TRACE_EVENTS:
+                    self.events.append((name, started, ended, threading.get_ident()))
+                else:
+                    self.dropped += 1
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+
+_metrics: Optional[Metrics] = None
+# 已替换的属性: (对象, 属性名, 原值)，关闭时按相反顺序还原
+_patches: List[Tuple[Any, str, Any]] = []
+
+
+def current() -> Optional[Metrics]:
+    """开启时返回当前的统计，未开启时为None"""
+    return _metrics
+
+
+def _timed_iter(metrics: Metrics, name: str, iterator: Iterator, started: float) -> Iterator:
+    """逐个转发生成器的结果，只累计生成器自身花费的时间，遍历结束或被关闭时记录"""
+    spent = 0.0
+    try:
+        while True:
+            began = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                spent += time.perf_counter() - began
+            yield item
+    finally:
+        iterator.close()
+        metrics.record(name, started, started + spent)
+
+
+def _timed(metrics: Metrics, name: str, func: Callable, trace: bool = True) -> Callable:
+    """给函数套上计时包装；返回生成器时改为在遍历过程中计时"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        result = None
+        try:
+            result = func(*args, **kwargs)
+            if inspect.isgenerator(result):
+                return _timed_iter(metrics, name, result, started)
+            return result
+        finally:
+            if not inspect.isgenerator(result):
+                metrics.record(name, started, time.perf_counter(), trace)
+    return wrapper
+
+
+def _size(data) -> int:
+    """读写内容的字节数（文本按UTF-8计）"""
+    if isinstance(data, str) and not data.isascii():
+        return len(data.encode("utf-8"))
+    return len(data)
+
+
+class _CountingFile:
+    """文件对象的代理，统计读写的字节数"""
+
+    def __init__(self, file, metrics: Metrics):
+        self._file = file
+        self._metrics = metrics
+
+    def read(self, *args):
+        data = self._file.read(*args)
+        self._metrics.count("io.read_bytes", _size(data))
+        return data
+
+    def readline(self, *args):
+        data = self._file.readline(*args)
+        self._metrics.count("io.read_bytes", _size(data))
+        return data
+
+    def readlines(self, *args):
+        return list(map(self._counted, self._file.readlines(*args)))
+
+    def _counted(self, line):
+        self._metrics.count("io.read_bytes", _size(line))
+        return line
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self._counted(next(self._file))
+
+    def write(self, data):
+        self._metrics.count("io.write_bytes", _size(data))
+        return self._file.write(data)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def __enter__(self):
+        self._file.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._file.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class _TimedJSON:
+    """代替存储模块中的 json 模块，给编码和解码计时，其余属性（如 JSONDecodeError）直接转发"""
+
+    def __init__(self, module, metrics: Metrics):
+        self._module = module
+        self.load = _timed(metrics, "json.decode", module.load, trace=False)
+        self.loads = _timed(metrics, "json.decode", module.loads, trace=False)
+        self.dump = _timed(metrics, "json.encode", module.dump, trace=False)
+        self.dumps = _timed(metrics, "json.encode", module.dumps, trace=False)
+
+    def __getattr__(self, name):
+        return getattr(self._module, name)
+
+
+def _patch(owner, name: str, value) -> None:
+    _patches.append((owner, name, vars(owner).get(name, _MISSING)))
+    setattr(owner, name, value)
+
+
+def _public_functions(cls) -> List[Tuple[str, Callable]]:
+    """类（含继承）的公开普通方法，跳过 contextmanager 包装的方法（计时只能测到创建上下文对象）"""
+    functions = []
+    for name in dir(cls):
+        if name.startswith("_"):
+            continue
+        func = inspect.getattr_static(cls, name)
+        if not inspect.isfunction(func):
+            continue
+        if inspect.isgeneratorfunction(getattr(func, "__wrapped__", None)):
+            continue
+        functions.append((name, func))
+    return functions
+
+
+def enable(trace: bool = False) -> Metrics:
+    """开启剖析（已开启时直接返回当前的统计）；trace=True 时记录每次调用的时间段"""
+    global _metrics
+    if _metrics is not None:
+        return _metrics
+    import storage
+    from main import FlagManager
+
+    metrics = Metrics(trace)
+    # 先取出全部原始方法再替换，子类继承的方法不会被包装两次
+    targets = [(FlagManager, f"FlagManager.{name}", name, func) for name, func in _public_functions(FlagManager)]
+    for cls in storage.BACKENDS.values():
+        targets += [(cls, f"storage.{cls.name}.{name}", name, func) for name, func in _public_functions(cls)]
+    targets += [(storage.FileLock, f"storage.lock.{name}", name, inspect.getattr_static(storage.FileLock, name))
+                for name in LOCK_METHODS]
+    for owner, label, name, func in targets:
+        _patch(owner, name, _timed(metrics, label, func, trace=owner is not storage.FileLock or name == "acquire"))
+
+    def counting_open(*args, **kwargs):
+        metrics.count("io.opens")
+        return _CountingFile(open(*args, **kwargs), metrics)
+
+    _patch(storage, "open", counting_open)
+    _patch(storage, "json", _TimedJSON(json, metrics))
+    _metrics = metrics
+    return metrics
+
+
+def disable() -> None:
+    """关闭剖析，还原全部被替换的函数"""
+    global _metrics
+    while _patches:
+        owner, name, original = _patches.pop()
+        if original is _MISSING:
+            delattr(owner, name)
+        else:
+            setattr(owner, name, original)
+    _metrics = None
+
+
+def summary_table(metrics: Metrics) -> str:
+    """按累计耗时从多到少排列的汇总表"""
+    elapsed = time.perf_counter() - metrics.started
+    lines = [f"\n⏱️  性能剖析（运行 {elapsed:.3f} 秒，耗时包含子调用）",
+             f"   {'名称':<44}{'次数':>8}{'累计(ms)':>10}{'平均(ms)':>10}{'占比':>6}"]
+    for name, seconds in sorted(metrics.seconds.items(), key=lambda item: item[1], reverse=True):
+        calls = metrics.calls[name]
+        lines.append(f"   {name:<46}{calls:>10}{seconds * 1000:>12.2f}{seconds * 1000 / calls:>12.3f}"
+                     f"{seconds / elapsed * 100 if elapsed else 0:>7.1f}%")
+    counters = metrics.counters
+    lines.append(f"\n📦 文件: 打开 {counters['io.opens']} 次，读取 {counters['io.read_bytes'] / 1024 / 1024:.2f} MB，"
+                 f"写入 {counters['io.write_bytes'] / 1024 / 1024:.2f} MB")
+    return "\n".join(lines)
+
+
+def chrome_trace(metrics: Metrics) -> Dict:
+    """Chrome trace 格式（完整事件，时间单位为微秒）"""
+    pid = os.getpid()
+    events = [{
+        "name": name,
+        "cat": name.split(".", 1)[0],
+        "ph": "X",
+        "ts": round((started - metrics.started) * 1e6, 1),
+        "dur": round((ended - started) * 1e6, 1),
+        "pid": pid,
+        "tid": tid,
+    } for name, started, ended, tid in metrics.events or []]
+    return {"traceEvents": events, "displayTimeUnit": "ms",
+            "otherData": {"dropped_events": metrics.dropped, **metrics.counters}}
+
+
+def prometheus_text(metrics: Metrics) -> str:
+    """Prometheus 文本格式的指标"""
+    lines = ["# HELP flag_calls_total Number of instrumented calls.", "# TYPE flag_calls_total counter"]
+    lines += [f'flag_calls_total{{op="{name}"}} {calls}' for name, calls in sorted(metrics.calls.items())]
+    lines += ["# HELP flag_call_seconds_total Cumulative time spent in instrumented calls.",
+              "# TYPE flag_call_seconds_total counter"]
+    lines += [f'flag_call_seconds_total{{op="{name}"}} {seconds:.6f}'
+              for name, seconds in sorted(metrics.seconds.items())]
+    lines += ["# HELP flag_io_bytes_total Bytes read and written by the storage module.",
+              "# TYPE flag_io_bytes_total counter",
+              f'flag_io_bytes_total{{direction="read"}} {metrics.counters["io.read_bytes"]}',
+              f'flag_io_bytes_total{{direction="write"}} {metrics.counters["io.write_bytes"]}',
+              "# HELP flag_io_opens_total Files opened by the storage module.",
+              "# TYPE flag_io_opens_total counter",
+              f'flag_io_opens_total {metrics.counters["io.opens"]}']
+    return "\n".join(lines) + "\n"
+
+
+def report(fmt: str = "summary", output: Optional[str] = None) -> None:
+    """输出当前的统计，output 为None时 trace 写入默认文件、其他格式输出到标准错误"""
+    if _metrics is None:
+        return
+    if fmt == "trace":
+        text = json.dumps(chrome_trace(_metrics), ensure_ascii=False)
+        output = output or DEFAULT_TRACE_FILE
+    elif fmt == "prometheus":
+        text = prometheus_text(_metrics)
+    else:
+        text = summary_table(_metrics)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"\n📈 性能剖析结果已保存到 {output}", file=sys.stderr)
+    else:
+        print(text, file=sys.stderr)
+
+
+def start(fmt: Optional[str] = None, output: Optional[str] = None) -> Optional[Metrics]:
+    """按参数（未指定时按环境变量 FLAG_PROFILE）开启剖析，进程退出时输出结果
+
+    未开启时返回None；格式不合法时抛出 ValueError
+    """
+    fmt = fmt or os.environ.get(PROFILE_ENV, "")
+    if fmt in ("", "0"):
+        return None
+    if fmt == "1":
+        fmt = "summary"
+    if fmt not in FORMATS:
+        raise ValueError(f"未知的剖析输出格式: {fmt}（可选: {', '.join(FORMATS)}）")
+    first = _metrics is None
+    metrics = enable(trace=fmt == "trace")
+    if first:
+        atexit.register(report, fmt, output or os.environ.get(OUTPUT_ENV))
+    return metrics
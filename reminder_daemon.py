@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - 提醒守护进程
+常驻内存，按flag的目标日期和最近检查时间算出每个提醒的到期时刻，放进最小堆，
+睡眠到堆顶的提醒到期时准时发出，不需要定时全量扫描。
+数据变化（其他进程提交变更，或数据文件被直接修改）时重新计算提醒时刻。
+提醒通过可插拔的输出（stdout、文件、webhook）发出。
+"""
+
+import asyncio
+import heapq
+import json
+import os
+import signal
+import urllib.request
+from datetime import datetime, timedelta
+from typing import List, Dict, Iterable, Optional, Tuple
+
+from main import FlagManager
+from indexes import ACTIVE_STATUSES, DAY, last_activity_timestamp, to_timestamp
+from models import EPOCH
+
+# 提醒种类: (说明, 图标)
+REMINDER_KINDS = {
+    "stale": ("需要检查进度", "🔔"),
+    "deadline": ("即将到期", "⏰"),
+    "urgent": ("紧急: 时间所剩无几", "⚠️"),
+}
+
+
+def format_timestamp(timestamp: float) -> str:
+    """时间戳还原为本地时间字符串（与 to_timestamp 对应）"""
+    return (EPOCH + timedelta(seconds=timestamp)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class StdoutSink:
+    """打印到标准输出"""
+
+    async def emit(self, reminder: Dict) -> None:
+        label, icon = REMINDER_KINDS[reminder["kind"]]
+        user = f"@{reminder['user']} " if reminder.get("user") else ""
+        line = f"{icon} [{reminder['due']}] {user}{label}: {reminder['title']} (进度 {reminder['progress']}%"
+        if reminder.get("days_left") is not None:
+            line += f"，剩余 {reminder['days_left']} 天"
+        if reminder.get("last_check"):
+            line += f"，上次检查 {reminder['last_check']}"
+        print(line + ")", flush=True)
+
+    async def close(self) -> None:
+        pass
+
+
+class FileSink:
+    """每条提醒追加一行JSON到文件"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    async def emit(self, reminder: Dict) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(reminder, ensure_ascii=False) + "\n")
+
+    async def close(self) -> None:
+        pass
+
+
+class WebhookSink:
+    """把提醒以JSON POST到本地webhook，在线程池中发送，不阻塞事件循环"""
+
+    def __init__(self, url: str, timeout: float = 5):
+        self.url = url
+        self.timeout = timeout
+
+    def _post(self, reminder: Dict) -> None:
+        request = urllib.request.Request(
+            self.url, data=json.dumps(reminder, ensure_ascii=False).encode("utf-8"),
+            headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    async def emit(self, reminder: Dict) -> None:
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._post, reminder)
+        except OSError as e:
+            print(f"❌ webhook发送失败 ({self.url}): {e}", flush=True)
+
+    async def close(self) -> None:
+        pass
+
+
+def make_sink(spec: str):
+    """由 stdout / file:路径 / webhook:URL 创建输出"""
+    kind, _, target = spec.partition(":")
+    if kind == "stdout":
+        return StdoutSink()
+    if kind == "file" and target:
+        return FileSink(target)
+    if kind == "webhook":
+        return WebhookSink(target or "http://127.0.0.1:8765/reminders")
+    raise ValueError(f"未知的提醒输出: {spec}（可选: stdout、file:路径、webhook:URL）")
+
+
+class ReminderScheduler:
+    """按到期时刻排序的提醒堆
+
+    每个未完成的flag最多对应三个提醒：
+    - stale: 最近一次检查（从未检查过时为创建日期）之后 stale_days 天，之后每隔 stale_days 天重复
+    - deadline: 距目标日期 deadline_days 天
+    - urgent: 距目标日期 urgent_days 天
+    已经发出的提醒记录在 fired 中，数据变化后重新计算时不会重复发出。
+    """
+
+    def __init__(self, stale_days: int = 30, deadline_days: int = 30, urgent_days: int = 7):
+        # stale 提醒按周期重复，周期至少一天
+        self.stale_days = max(1, stale_days)
+        self.deadline_days = deadline_days
+        self.urgent_days = urgent_days
+        self.heap: List[Tuple[int, str, str]] = []
+        # (flag_id, 种类) -> 最近一次发出的提醒时刻
+        self.fired: Dict[Tuple[str, str], int] = {}
+
+    def events(self, flag) -> Iterable[Tuple[int, str]]:
+        """flag的 (到期时刻, 种类)"""
+        if flag.status not in ACTIVE_STATUSES:
+            return
+        last = last_activity_timestamp(flag)
+        if last is not None:
+            yield last + self.stale_days * DAY, "stale"
+        target = flag.target_timestamp
+        if target is not None:
+            # 与 get_upcoming_deadlines 一致：剩余天数 <= N 从目标日期前 N+1 天开始
+            yield target - (self.deadline_days + 1) * DAY + 1, "deadline"
+            yield target - (self.urgent_days + 1) * DAY + 1, "urgent"
+
+    def rebuild(self, flags: Iterable) -> None:
+        """根据当前数据重新计算全部提醒"""
+        heap = []
+        for flag in flags:
+            for due, kind in self.events(flag):
+                fired = self.fired.get((flag.id, kind))
+                if fired is not None and fired >= due:
+                    if kind != "stale":
+                        continue
+                    # 检查之后还没有更新过，下一次提醒在上次提醒的 stale_days 天后
+                    due = fired + self.stale_days * DAY
+                heap.append((due, flag.id, kind))
+        heapq.heapify(heap)
+        self.heap = heap
+
+    def next_due(self) -> Optional[int]:
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now: float) -> List[Tuple[int, str, str]]:
+        """取出所有已经到期的提醒；stale 提醒重新排入下一个周期"""
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            entry = heapq.heappop(self.heap)
+            due.append(entry)
+            timestamp, flag_id, kind = entry
+            self.fired[(flag_id, kind)] = timestamp
+            if kind == "stale":
+                heapq.heappush(self.heap, (timestamp + self.stale_days * DAY, flag_id, kind))
+        return due
+
+
+class ReminderDaemon:
+    """提醒守护进程，user 不为None时（多用户）提醒中附带用户名"""
+
+    def __init__(self, manager: FlagManager, sinks: List, scheduler: Optional[ReminderScheduler] = None,
+                 watch_interval: float = 1.0, user: Optional[str] = None):
+        self.manager = manager
+        self.user = user
+        self.sinks = sinks
+        self.scheduler = scheduler or ReminderScheduler()
+        self.watch_interval = watch_interval
+        self.changed = asyncio.Event()
+        self.stopped = asyncio.Event()
+        self._mtimes = self._file_mtimes()
+
+    def _watched_files(self) -> List[Optional[str]]:
+        """数据文件（快照、日志、检查记录）"""
+        return [getattr(self.manager.storage, attr, None) for attr in ("data_file", "journal_file", "history_file")]
+
+    def _file_mtimes(self) -> Tuple:
+        """数据文件的修改时间，用于发现绕过FlagManager的直接修改"""
+        mtimes = []
+        for path in self._watched_files():
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns if path else None)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def poll(self) -> bool:
+        """检查数据是否变化：比较锁文件中的版本号（一次pread）和数据文件的修改时间，变化时重新加载"""
+        mtimes = self._file_mtimes()
+        force = mtimes != self._mtimes
+        self._mtimes = mtimes
+        return self.manager.refresh(force=force)
+
+    def rebuild(self) -> None:
+        """根据当前数据重新计算全部提醒"""
+        self.scheduler.rebuild(self.manager.flags)
+
+    def lookup(self, flag_ids: Iterable[str]) -> Dict:
+        """取出到期提醒对应的flags {ID: flag}，已删除的不在其中"""
+        flags = {}
+        for flag_id in flag_ids:
+            flag = self.manager.get_flag(flag_id)
+            if flag is not None:
+                flags[flag_id] = flag
+        return flags
+
+    async def watch(self) -> None:
+        """定期检查数据变化"""
+        while not self.stopped.is_set():
+            if self.poll():
+                self.changed.set()
+            try:
+                await asyncio.wait_for(self.stopped.wait(), self.watch_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def reminder(self, due: int, flag, kind: str) -> Dict:
+        """组装一条提醒"""
+        target = flag.target_timestamp
+        now = to_timestamp(datetime.now())
+        reminder = {
+            "kind": kind,
+            "due": format_timestamp(due),
+            "fired_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "flag_id": flag.id,
+            "title": flag.title,
+            "progress": flag.progress,
+            "status": flag.status,
+            "target_date": flag.target_date,
+            "days_left": int((target - now) // DAY) if target is not None else None,
+            "last_check": flag.last_check_date,
+        }
+        if self.user is not None:
+            reminder["user"] = self.user
+        return reminder
+
+    async def fire(self, now: float) -> None:
+        entries = self.scheduler.pop_due(now)
+        if not entries:
+            return
+        flags = self.lookup({flag_id for _, flag_id, _ in entries})
+        for due, flag_id, kind in entries:
+            flag = flags.get(flag_id)
+            if flag is None:
+                continue
+            reminder = self.reminder(due, flag, kind)
+            if kind != "stale" and (reminder["days_left"] is None or reminder["days_left"] < 0):
+                # 已经过了目标日期，与 get_upcoming_deadlines 一样不再提醒
+                continue
+            for sink in self.sinks:
+                await sink.emit(reminder)
+
+    async def run(self) -> None:
+        """主循环：睡眠到下一个提醒到期或数据变化"""
+        self.rebuild()
+        watcher = asyncio.create_task(self.watch())
+        try:
+            while not self.stopped.is_set():
+                if self.changed.is_set():
+                    self.changed.clear()
+                    self.rebuild()
+                await self.fire(to_timestamp(datetime.now()))
+
+                next_due = self.scheduler.next_due()
+                timeout = None if next_due is None else max(0.0, next_due - to_timestamp(datetime.now()))
+                waiters = [asyncio.create_task(self.changed.wait()), asyncio.create_task(self.stopped.wait())]
+                await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for waiter in waiters:
+                    waiter.cancel()
+        finally:
+            self.stopped.set()
+            await watcher
+            for sink in self.sinks:
+                await sink.close()
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+
+class TenantReminderDaemon(ReminderDaemon):
+    """多用户时一个用户的守护进程，不长期打开FlagManager
+
+    重新计算提醒和发出提醒时才用 store.open() 临时打开用户的数据，用完即关闭，
+    不占用锁文件描述符和内存，用户很多时也不超出 TenantStore 的上限；
+    平时只比较锁文件（每次提交都改写其中的版本号）和数据文件的修改时间，有变化时才重新加载。
+    """
+
+    def __init__(self, store, user: str, sinks: List, scheduler: Optional[ReminderScheduler] = None,
+                 watch_interval: float = 1.0):
+        self.store = store
+        self._files: List[Optional[str]] = []
+        super().__init__(None, sinks, scheduler, watch_interval, user)
+
+    def _watched_files(self) -> List[Optional[str]]:
+        return self._files
+
+    def poll(self) -> bool:
+        mtimes = self._file_mtimes()
+        if mtimes == self._mtimes:
+            return False
+        self._mtimes = mtimes
+        return True
+
+    def rebuild(self) -> None:
+        manager = self.store.open(self.user)
+        try:
+            storage = manager.storage
+            self._files = [storage.lock.path] + [getattr(storage, attr, None)
+                                                 for attr in ("data_file", "journal_file", "history_file")]
+            self._mtimes = self._file_mtimes()
+            # 加载之后、记下修改时间之前提交的变更
+            manager.refresh()
+            self.scheduler.rebuild(manager.flags)
+        finally:
+            manager.close()
+
+    def lookup(self, flag_ids: Iterable[str]) -> Dict:
+        manager = self.store.open(self.user)
+        try:
+            flags = {}
+            for flag_id in flag_ids:
+                flag = manager.get_flag(flag_id)
+                if flag is not None:
+                    flags[flag_id] = flag
+            return flags
+        finally:
+            manager.close()
+
+
+async def run_daemon(manager: FlagManager, sink_specs: List[str], stale_days: int = 30,
+                     deadline_days: int = 30, urgent_days: int = 7, watch_interval: float = 1.0) -> None:
+    """启动守护进程，直到收到 SIGTERM/SIGINT"""
+    await run_daemons({None: manager}, sink_specs, stale_days, deadline_days, urgent_days, watch_interval)
+
+
+async def run_daemons(managers: Dict[Optional[str], FlagManager], sink_specs: List[str], stale_days: int = 30,
+                      deadline_days: int = 30, urgent_days: int = 7, watch_interval: float = 1.0) -> None:
+    """为每个用户的数据 {用户: FlagManager} 各启动一个守护进程，在同一个事件循环中并发运行，
+    直到收到 SIGTERM/SIGINT；用户为None时提醒中不附带用户名"""
+    daemons = [ReminderDaemon(manager, [make_sink(spec) for spec in sink_specs],
+                              ReminderScheduler(stale_days, deadline_days, urgent_days), watch_interval, user)
+               for user, manager in managers.items()]
+    if len(daemons) == 1:
+        started = f"🕒 提醒守护进程已启动，数据文件: {daemons[0].manager.data_file}"
+    else:
+        started = f"🕒 提醒守护进程已启动，共 {len(daemons)} 个用户"
+    await _run_all(daemons, started)
+
+
+async def run_tenant_daemons(store, sink_specs: List[str], stale_days: int = 30, deadline_days: int = 30,
+                             urgent_days: int = 7, watch_interval: float = 1.0) -> None:
+    """为 TenantStore 中的全部用户各启动一个守护进程（见 TenantReminderDaemon），直到收到 SIGTERM/SIGINT"""
+    daemons = [TenantReminderDaemon(store, user, [make_sink(spec) for spec in sink_specs],
+                                    ReminderScheduler(stale_days, deadline_days, urgent_days), watch_interval)
+               for user in store.users()]
+    await _run_all(daemons, f"🕒 提醒守护进程已启动，共 {len(daemons)} 个用户")
+
+
+async def _run_all(daemons: List[ReminderDaemon], started: str) -> None:
+    """在同一个事件循环中并发运行，直到收到 SIGTERM/SIGINT"""
+
+    def stop() -> None:
+        for daemon in daemons:
+            daemon.stop()
+
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, stop)
+        except (NotImplementedError, RuntimeError):
+            # Windows 的事件循环不支持信号处理，Ctrl+C 直接结束
+            pass
+    print(started, flush=True)
+    await asyncio.gather(*(daemon.run() for daemon in daemons))
+    print("👋 提醒守护进程已停止", flush=True)
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - 进度报告
+一次遍历全部flags：同时完成统计、按状态分组和找出需要检查的flags，遍历时每个flag只记下排序键（日期、ID、版本），
+排好序后逐条写入磁盘上的片段文件，需要生成内容时才按批取出flags，最后按顺序拼接成报告；
+内存中只有排序键和一批flags，不保存全部flags的内容和检查记录。
+支持 text / csv / json / html 四种格式。
+
+增量模式把每个分组的片段和清单（每个flag的ID、版本和片段中的结束位置）保存在缓存目录中，
+下次生成时与清单比较：版本相同的前缀直接从旧片段复制，只重新生成变化之后的部分，
+没有变化的分组完全不需要重新生成（也不会读取其中flags的检查记录）。
+"""
+
+import csv
+import hashlib
+import html
+import io
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from indexes import FlagStats, deadline_entries, in_range, stale_range, summarize_counts
+from models import Flag
+
+# 报告中的分组: (名称, 标题, 对应的状态)，需要检查的flags单独一组
+SECTIONS = [
+    ("completed", "已完成的flags", "已完成"),
+    ("in_progress", "进行中的flags", "进行中"),
+    ("not_started", "未开始的flags", "未开始"),
+    ("stale", "需要检查的flags", None),
+]
+STATUS_SECTIONS = {status: name for name, _, status in SECTIONS if status}
+MANIFEST_VERSION = 1
+# 生成分组内容时一次取出的flags数量
+FETCH_BATCH = 5000
+
+CSV_COLUMNS = ["section", "id", "title", "description", "category", "progress", "status",
+               "target_date", "feasibility_score", "checks", "last_check", "last_notes"]
+
+
+def flag_version(flag: Flag) -> str:
+    """flag的版本：头部内容的哈希，任何字段修改或新增检查记录都会改变"""
+    data = repr((flag.title, flag.description, flag.category, flag.target_date, flag.created_date,
+                 flag.progress, flag.status, flag.feasibility_score, flag.feasibility_reason,
+                 flag.last_check_stamp, flag.checks))
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def flag_row(flag: Flag, section: str, detail: bool = True) -> Dict:
+    """报告中一个flag的字段；detail=True 时附带最近一次检查的备注（需要读取检查记录）"""
+    row = {
+        "section": section,
+        "id": flag.id,
+        "title": flag.title,
+        "description": flag.description,
+        "category": flag.category,
+        "progress": flag.progress,
+        "status": flag.status,
+        "target_date": flag.target_date,
+        "feasibility_score": flag.feasibility_score,
+        "checks": flag.checks,
+        "last_check": flag.last_check_date,
+        "last_notes": None,
+    }
+    if detail and flag.checks:
+        row["last_notes"] = flag.check_history[-1].notes
+    return row
+
+
+class TextRenderer:
+    """纯文本报告（与原来的报告格式相同）"""
+
+    extension = "txt"
+    skip_empty = True
+
+    def begin(self, out, generated: datetime, stats: Dict) -> None:
+        out.write("年度Flag进度报告\n")
+        out.write(f"生成时间: {generated.strftime('%Y-%m-%d %H:%M:%S')}\n")
+        out.write("=" * 50 + "\n\n")
+        out.write("总体统计:\n")
+        out.write(f"  总flags数: {stats['total']}\n")
+        out.write(f"  已完成: {stats['completed']}\n")
+        out.write(f"  进行中: {stats['in_progress']}\n")
+        out.write(f"  未开始: {stats['not_started']}\n")
+        out.write(f"  完成率: {stats['completion_rate']:.1f}%\n")
+        out.write(f"  平均可行性评分: {stats['avg_feasibility']}/100\n\n")
+
+    def section_head(self, out, section: str, title: str, count: int, index: int) -> None:
+        out.write(f"{title} ({count}个):\n")
+
+    def entry(self, flag: Flag, section: str, index: int) -> str:
+        if section == "stale":
+            return f"  🔔 {flag.title} - 进度: {flag.progress}%\n"
+        row = flag_row(flag, section)
+        text = (f"  🎯 {row['title']}\n"
+                f"     描述: {row['description']}\n"
+                f"     进度: {row['progress']}%\n"
+                f"     目标日期: {row['target_date']}\n"
+                f"     可行性: {row['feasibility_score']}/100\n")
+        if row["checks"]:
+            text += f"     检查记录: {row['checks']}次，最近 {row['last_check']}"
+            text += f"（{row['last_notes']}）\n" if row["last_notes"] else "\n"
+        return text + "\n"
+
+    def section_tail(self, out, section: str, count: int) -> None:
+        pass
+
+    def end(self, out) -> None:
+        pass
+
+
+class CsvRenderer:
+    """CSV表格，每个flag一行，section 列为所在分组"""
+
+    extension = "csv"
+    skip_empty = True
+
+    def begin(self, out, generated: datetime, stats: Dict) -> None:
+        out.write(self._line(CSV_COLUMNS))
+
+    def section_head(self, out, section: str, title: str, count: int, index: int) -> None:
+        pass
+
+    def entry(self, flag: Flag, section: str, index: int) -> str:
+        row = flag_row(flag, section, detail=section != "stale")
+        return self._line(["" if row[column] is None else row[column] for column in CSV_COLUMNS])
+
+    def section_tail(self, out, section: str, count: int) -> None:
+        pass
+
+    def end(self, out) -> None:
+        pass
+
+    @staticmethod
+    def _line(values: List) -> str:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(values)
+        return buffer.getvalue()
+
+
+class JsonRenderer:
+    """JSON对象: {generated_at, statistics, sections: {分组: [flag, ...]}}"""
+
+    extension = "json"
+    skip_empty = False
+
+    def begin(self, out, generated: datetime, stats: Dict) -> None:
+        out.write("{\n")
+        out.write(f'"generated_at": {json.dumps(generated.strftime("%Y-%m-%d %H:%M:%S"))},\n')
+        out.write(f'"statistics": {json.dumps(stats, ensure_ascii=False)},\n')
+        out.write('"sections": {\n')
+
+    def section_head(self, out, section: str, title: str, count: int, index: int) -> None:
+        out.write(("" if index == 0 else ",\n") + f'"{section}": [\n')
+
+    def entry(self, flag: Flag, section: str, index: int) -> str:
+        row = flag_row(flag, section, detail=section != "stale")
+        del row["section"]
+        return ("" if index == 0 else ",\n") + json.dumps(row, ensure_ascii=False)
+
+    def section_tail(self, out, section: str, count: int) -> None:
+        out.write("\n]")
+
+    def end(self, out) -> None:
+        out.write("\n}\n}\n")
+
+
+class HtmlRenderer:
+    """独立的HTML页面，每个分组一个表格"""
+
+    extension = "html"
+    skip_empty = True
+    columns = [("title", "目标"), ("category", "分类"), ("progress", "进度"), ("target_date", "目标日期"),
+               ("feasibility_score", "可行性"), ("checks", "检查次数"), ("last_check", "最近检查"),
+               ("last_notes", "备注")]
+
+    def begin(self, out, generated: datetime, stats: Dict) -> None:
+        out.write('<!DOCTYPE html>\n<html lang="zh-CN">\n<head>\n<meta charset="utf-8">\n'
+                  '<title>年度Flag进度报告</title>\n<style>\n'
+                  'body{font-family:sans-serif;margin:2em}table{border-collapse:collapse;margin-bottom:2em}'
+                  'th,td{border:1px solid #ccc;padding:4px 8px;text-align:left}th{background:#f4f4f4}\n'
+                  '</style>\n</head>\n<body>\n<h1>年度Flag进度报告</h1>\n')
+        out.write(f"<p>生成时间: {generated.strftime('%Y-%m-%d %H:%M:%S')}</p>\n")
+        out.write("<h2>总体统计</h2>\n<ul>\n")
+        for label, value in [("总flags数", stats["total"]), ("已完成", stats["completed"]),
+                             ("进行中", stats["in_progress"]), ("未开始", stats["not_started"]),
+                             ("完成率", f"{stats['completion_rate']:.1f}%"),
+                             ("平均可行性评分", f"{stats['avg_feasibility']}/100")]:
+            out.write(f"<li>{label}: {value}</li>\n")
+        out.write("</ul>\n")
+
+    def section_head(self, out, section: str, title: str, count: int, index: int) -> None:
+        out.write(f'<h2>{html.escape(title)} ({count}个)</h2>\n<table id="{section}">\n<tr>')
+        out.write("".join(f"<th>{label}</th>" for _, label in self.columns) + "</tr>\n")
+
+    def entry(self, flag: Flag, section: str, index: int) -> str:
+        row = flag_row(flag, section, detail=section != "stale")
+        cells = "".join(f"<td>{html.escape('' if row[key] is None else str(row[key]))}</td>"
+                        for key, _ in self.columns)
+        return f"<tr>{cells}</tr>\n"
+
+    def section_tail(self, out, section: str, count: int) -> None:
+        out.write("</table>\n")
+
+    def end(self, out) -> None:
+        out.write("</body>\n</html>\n")
+
+
+RENDERERS = {"text": TextRenderer, "csv": CsvRenderer, "json": JsonRenderer, "html": HtmlRenderer}
+
+
+class SectionWriter:
+    """把一个分组的内容写入片段文件
+
+    old 为上次清单中该分组的 {"file": 片段文件名, "entries": [[ID, 版本, 结束位置], ...]}。
+    开头与上次相同的flags不重新生成，出现第一个不同的flag时新建片段文件，
+    先从旧片段复制相同的前缀，之后的flags逐条生成追加。旧片段在新清单保存之后才删除，
+    中途失败时旧清单和旧片段仍然是一致的。
+    """
+
+    def __init__(self, directory: str, prefix: str, old: Dict, render: Callable[[Flag, int], str]):
+        self.directory = directory
+        self.prefix = prefix
+        self.file = old.get("file")
+        self.old = old.get("entries", []) if self.file and os.path.exists(self.path) else []
+        self.render = render
+        self.entries: List = []
+        self.replaced: Optional[str] = None
+        self._out = None
+        self._offset = 0
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, self.file)
+
+    def add(self, flag_id: str, version: str, load: Callable[[str], Optional[Flag]]) -> None:
+        """追加一个flag；与上次相同时沿用旧内容，否则用 load 取出flag生成（期间被删除的跳过）"""
+        index = len(self.entries)
+        if self._out is None and index < len(self.old) and self.old[index][:2] == [flag_id, version]:
+            self.entries.append(self.old[index])
+            return
+        flag = load(flag_id)
+        if flag is None:
+            return
+        # 遍历之后被修改过时按取出的内容记录版本
+        version = flag_version(flag)
+        if self._out is None and index < len(self.old) and self.old[index][:2] == [flag_id, version]:
+            self.entries.append(self.old[index])
+            return
+        if self._out is None:
+            self._diverge(index)
+        data = self.render(flag, index).encode("utf-8")
+        self._out.write(data)
+        self._offset += len(data)
+        self.entries.append([flag.id, version, self._offset])
+
+    def _diverge(self, index: int) -> None:
+        """从第index个flag开始与上次不同：新建片段并复制之前相同的部分"""
+        old_path = self.path if self.file else None
+        self.replaced = self.file
+        self.file = f"{self.prefix}.{uuid.uuid4().hex[:12]}.part"
+        self._out = open(self.path, "wb")
+        self._offset = self.old[index - 1][2] if index else 0
+        if self._offset:
+            with open(old_path, "rb") as old:
+                _copy_prefix(old, self._out, self._offset)
+
+    def finish(self) -> bool:
+        """完成片段，返回是否重新生成过"""
+        if self._out is None:
+            if self.file and len(self.entries) == len(self.old):
+                return False
+            self._diverge(len(self.entries))
+        self._out.close()
+        return True
+
+    def manifest(self) -> Dict:
+        return {"file": self.file, "entries": self.entries}
+
+
+class FlagFetcher:
+    """按报告中的顺序取出flags，每次用 FlagManager.get_flags 取一批（FETCH_BATCH 个）
+
+    ids 为报告中的顺序，load 按这个顺序调用（可以跳过沿用旧内容的flags）
+    """
+
+    def __init__(self, manager, ids: List[str]):
+        self.manager = manager
+        self.ids = ids
+        self.position = 0
+        self.cache: Dict[str, Flag] = {}
+
+    def load(self, flag_id: str) -> Optional[Flag]:
+        if flag_id in self.cache:
+            return self.cache.pop(flag_id)
+        try:
+            start = self.ids.index(flag_id, self.position)
+        except ValueError:
+            # 所在的批次已经取过，说明遍历之后被删除了
+            return None
+        batch = self.ids[start:start + FETCH_BATCH]
+        self.position = start + len(batch)
+        self.cache = self.manager.get_flags(batch)
+        return self.cache.pop(flag_id, None)
+
+
+def _copy_prefix(source, target, length: int) -> None:
+    """复制文件开头的length个字节"""
+    remaining = length
+    while remaining:
+        chunk = source.read(min(remaining, 1 << 20))
+        if not chunk:
+            break
+        target.write(chunk)
+        remaining -= len(chunk)
+
+
+def default_cache_dir(data_file: str) -> str:
+    """增量报告的缓存目录，放在数据文件旁边"""
+    return os.path.splitext(data_file)[0] + ".report"
+
+
+def load_manifest(cache_dir: str) -> Dict:
+    try:
+        with open(os.path.join(cache_dir, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if manifest.get("version") == MANIFEST_VERSION else {}
+
+
+def save_manifest(cache_dir: str, manifest: Dict) -> None:
+    path = os.path.join(cache_dir, "manifest.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        # 一次编码再写入，比 json.dump 逐段写入快得多
+        f.write(json.dumps(manifest, ensure_ascii=False))
+    os.replace(path + ".tmp", path)
+
+
+def generate_report(manager, fmt: str = "text", output: Optional[str] = None, incremental: bool = False,
+                    cache_dir: Optional[str] = None, stale_days: int = 30) -> Tuple[str, List[str]]:
+    """生成报告，返回 (报告文件名, 重新生成过的分组)
+
+    incremental=True 时使用 cache_dir（默认为数据文件旁的 <名称>.report 目录）中的片段和清单
+    """
+    if fmt not in RENDERERS:
+        raise ValueError(f"未知的报告格式: {fmt}（可选: {', '.join(RENDERERS)}）")
+    renderer = RENDERERS[fmt]()
+    generated = datetime.now()
+    output = output or f"flag_report_{generated.strftime('%Y%m%d_%H%M%S')}.{renderer.extension}"
+
+    temp_dir = None
+    if incremental:
+        cache_dir = cache_dir or default_cache_dir(manager.data_file)
+        os.makedirs(cache_dir, exist_ok=True)
+        manifest = load_manifest(cache_dir)
+    else:
+        cache_dir = temp_dir = tempfile.mkdtemp(prefix="flag_report_")
+        manifest = {}
+    old_sections = manifest.get("formats", {}).get(fmt, {})
+
+    try:
+        writers = {name: SectionWriter(cache_dir, f"{fmt}.{name}", old_sections.get(name, {}),
+                                       lambda flag, index, name=name: renderer.entry(flag, name, index))
+                   for name, _, _ in SECTIONS}
+
+        # 一次遍历：统计，按状态和需要检查收集排序键（不保存flags本身）
+        stats = FlagStats()
+        bounds = stale_range(generated, stale_days)
+        keys: Dict[str, List[Tuple]] = {name: [] for name, _, _ in SECTIONS}
+        for flag in manager.iter_flags():
+            stats.add(flag)
+            version = flag_version(flag)
+            section = STATUS_SECTIONS.get(flag.status)
+            if section:
+                keys[section].append((flag.created_date, flag.id, version))
+            for entry_name, timestamp in deadline_entries(flag):
+                if entry_name == "activity" and in_range(timestamp, bounds):
+                    keys["stale"].append((timestamp, flag.id, version))
+        for name, _, status in SECTIONS:
+            items = keys.pop(name)
+            if status:
+                # 与 list_flags 相同：按创建日期倒序（稳定排序，同一天的保持遍历顺序）
+                items.sort(key=lambda item: item[0], reverse=True)
+            else:
+                # 与 get_monthly_reminders 相同：最久未检查的排在前面
+                items.sort(key=lambda item: item[:2])
+            fetcher = FlagFetcher(manager, [flag_id for _, flag_id, _ in items])
+            for _, flag_id, version in items:
+                writers[name].add(flag_id, version, fetcher.load)
+
+        rendered = [name for name, writer in writers.items() if writer.finish()]
+
+        with open(output, "w", encoding="utf-8", newline="") as out:
+            renderer.begin(out, generated, summarize_counts(stats.snapshot()))
+            index = 0
+            for name, title, _ in SECTIONS:
+                writer = writers[name]
+                count = len(writer.entries)
+                if not count and renderer.skip_empty:
+                    continue
+                renderer.section_head(out, name, title, count, index)
+                out.flush()
+                with open(writer.path, "rb") as part:
+                    shutil.copyfileobj(part, out.buffer)
+                renderer.section_tail(out, name, count)
+                index += 1
+            renderer.end(out)
+
+        if incremental:
+            formats = manifest.get("formats", {})
+            formats[fmt] = {name: writer.manifest() for name, writer in writers.items()}
+            save_manifest(cache_dir, {"version": MANIFEST_VERSION, "data_file": manager.data_file,
+                                      "formats": formats})
+            for writer in writers.values():
+                if writer.replaced:
+                    os.remove(os.path.join(cache_dir, writer.replaced))
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    return output, rendered
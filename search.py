@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - 全文搜索
+对标题、描述和检查记录备注建立倒排索引。中日韩文字没有空格分词，按单字和相邻两字（bigram）切分，
+英文和数字按单词切分；查询中连续两个以上的汉字用bigram匹配，单个汉字用单字匹配，所有词都出现才算命中，
+按BM25排序（标题中的词权重更高）。
+
+每个词的倒排列表是按文档号递增的 array（文档号4字节、词频1字节），新增文档追加在末尾；
+删除只把文档号标记为失效，失效的文档过多时保存前重新编号。
+查询从最短的倒排列表开始，在其余列表中二分查找求交集，安装了numpy时向量化完成。
+索引保存在数据文件旁（*.search），记录对应的数据版本号；版本不一致时按每个flag的检查记录条数
+和最近检查时间增量同步，只重新切分有变化的flags。
+"""
+
+import heapq
+import json
+import math
+import os
+import re
+import sys
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import accumulate
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from models import Flag
+
+try:
+    import numpy as np
+except ImportError:  # 未安装numpy时使用二分查找
+    np = None
+
+MAGIC = b"FLAGSEARCH1\n"
+# 字段权重：标题中的词相当于出现3次
+TITLE_WEIGHT = 3
+# BM25参数
+K1 = 1.2
+B = 0.75
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+")
+
+
+def _runs(text: str) -> List[str]:
+    """统一全角/半角和大小写后，切出连续的字母数字串和连续的中日韩文字串"""
+    return _TOKEN_RE.findall(unicodedata.normalize("NFKC", text).lower())
+
+
+def tokenize(text: str) -> List[str]:
+    """建索引用的切分：单词、单字和相邻两字"""
+    tokens = []
+    for run in _runs(text):
+        if run.isascii():
+            tokens.append(run)
+        else:
+            tokens.extend(run)
+            tokens.extend(map(str.__add__, run, run[1:]))
+    return tokens
+
+
+def query_terms(query: str) -> List[str]:
+    """查询用的切分：单词；两个字以上的汉字串只用相邻两字，单个汉字用单字（去重，保持顺序）"""
+    terms = []
+    for run in _runs(query):
+        if run.isascii() or len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(map(str.__add__, run, run[1:]))
+    return list(dict.fromkeys(terms))
+
+
+def index_key(flag: Flag) -> List:
+    """检查记录变化时改变的键（标题和描述创建后不会修改）"""
+    return [flag.checks, flag.last_check_stamp]
+
+
+def _term_counts(flag: Flag) -> Counter:
+    """flag中各个词的加权词频"""
+    texts = [flag.description]
+    if flag.checks:
+        texts.extend(record.notes for record in flag.check_history if record.notes)
+    # 换行不属于任何词，各段文本之间不会拼出跨段的相邻两字
+    counts = Counter(tokenize("\n".join(texts)))
+    for token, count in Counter(tokenize(flag.title)).items():
+        counts[token] += count * TITLE_WEIGHT
+    return counts
+
+
+class SearchIndex:
+    """倒排索引
+
+    ids 为文档号到flag ID的列表（已删除的为None），lengths 为各文档的加权词数（已删除的为0）。
+    terms 把词映射到槽位；从文件读取的倒排列表留在一整块数组中，查询时按偏移切出只读视图，
+    某个词第一次追加文档时才复制成独立的 array。
+    """
+
+    def __init__(self):
+        self.ids: List[Optional[str]] = []
+        self.docs: Dict[str, int] = {}
+        self.keys: Dict[str, List] = {}
+        self.lengths = array("I")
+        self.terms: Dict[str, int] = {}
+        # 各槽位的倒排列表，None表示仍在读取的整块数组中
+        self.postings: List[Optional[array]] = []
+        self.freqs: List[Optional[array]] = []
+        self._offsets = array("Q", [0])
+        self._base_docs = memoryview(array("I"))
+        self._base_freqs = memoryview(array("B"))
+        self.live = 0
+        self.total_length = 0
+        # 索引对应的数据版本号，None表示未知
+        self.version: Optional[int] = None
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return self.live
+
+    def posting(self, term: str) -> Optional[Tuple[Sequence[int], Sequence[int]]]:
+        """词的 (文档号, 词频) 列表，词不存在时返回None"""
+        slot = self.terms.get(term)
+        return None if slot is None else self._slot(slot)
+
+    def _slot(self, slot: int) -> Tuple[Sequence[int], Sequence[int]]:
+        docs = self.postings[slot]
+        if docs is None:
+            start, end = self._offsets[slot], self._offsets[slot + 1]
+            return self._base_docs[start:end], self._base_freqs[start:end]
+        return docs, self.freqs[slot]
+
+    def add(self, flag: Flag) -> None:
+        """索引一个flag（文档号追加在末尾，倒排列表保持有序）"""
+        counts = _term_counts(flag)
+        doc = len(self.ids)
+        self.ids.append(flag.id)
+        self.docs[flag.id] = doc
+        self.keys[flag.id] = index_key(flag)
+        length = sum(counts.values())
+        self.lengths.append(length)
+        self.total_length += length
+        self.live += 1
+        terms, postings, freqs = self.terms, self.postings, self.freqs
+        for token, count in counts.items():
+            freq = count if count < 256 else 255
+            slot = terms.get(token)
+            if slot is None:
+                terms[token] = len(postings)
+                postings.append(array("I", [doc]))
+                freqs.append(array("B", [freq]))
+                continue
+            docs = postings[slot]
+            if docs is None:
+                base_docs, base_freqs = self._slot(slot)
+                docs = postings[slot] = array("I", base_docs.tobytes())
+                freqs[slot] = array("B", base_freqs.tobytes())
+            docs.append(doc)
+            freqs[slot].append(freq)
+        self.dirty = True
+
+    def remove(self, flag_id: str) -> None:
+        """把flag的文档标记为失效，倒排列表中的文档号在重新编号时才清除"""
+        doc = self.docs.pop(flag_id, None)
+        if doc is None:
+            return
+        del self.keys[flag_id]
+        self.ids[doc] = None
+        self.total_length -= self.lengths[doc]
+        self.lengths[doc] = 0
+        self.live -= 1
+        self.dirty = True
+
+    def update(self, flag: Flag) -> None:
+        """重新索引一个flag"""
+        self.remove(flag.id)
+        self.add(flag)
+
+    def touch(self, flag: Flag) -> None:
+        """flag的文本没有变化（如不带备注的检查），只更新同步用的键"""
+        if flag.id in self.keys:
+            self.keys[flag.id] = index_key(flag)
+            self.dirty = True
+
+    def sync(self, flags: Iterable[Flag]) -> int:
+        """与当前数据同步：只重新索引键变化过的flags并删除已不存在的flags，返回变化的数量"""
+        seen = set()
+        changed = 0
+        for flag in flags:
+            seen.add(flag.id)
+            if self.keys.get(flag.id) != index_key(flag):
+                self.update(flag)
+                changed += 1
+        removed = [flag_id for flag_id in self.docs if flag_id not in seen]
+        for flag_id in removed:
+            self.remove(flag_id)
+        return changed + len(removed)
+
+    def compact(self) -> None:
+        """去掉失效文档并重新编号，所有倒排列表都变成独立的 array"""
+        remap = array("i")
+        ids = []
+        for flag_id in self.ids:
+            if flag_id is None:
+                remap.append(-1)
+            else:
+                remap.append(len(ids))
+                ids.append(flag_id)
+        terms, postings, freqs = {}, [], []
+        for term, slot in self.terms.items():
+            docs, term_freqs = self._slot(slot)
+            kept = [(remap[doc], freq) for doc, freq in zip(docs, term_freqs) if remap[doc] >= 0]
+            if kept:
+                terms[term] = len(postings)
+                postings.append(array("I", [doc for doc, _ in kept]))
+                freqs.append(array("B", [freq for _, freq in kept]))
+        self.terms, self.postings, self.freqs = terms, postings, freqs
+        self._offsets = array("Q", [0])
+        self._base_docs = memoryview(array("I"))
+        self._base_freqs = memoryview(array("B"))
+        self.lengths = array("I", [length for length, doc in zip(self.lengths, remap) if doc >= 0])
+        self.ids = ids
+        self.docs = {flag_id: doc for doc, flag_id in enumerate(ids)}
+        self.dirty = True
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[str, float]]:
+        """查询，返回按得分从高到低排列的 (flag ID, 得分)，得分相同时先索引的在前"""
+        terms = query_terms(query)
+        if not terms or not self.live or limit <= 0:
+            return []
+        lists = []
+        for term in terms:
+            posting = self.posting(term)
+            if posting is None:
+                return []
+            lists.append(posting)
+        # 从最短的倒排列表开始求交集
+        lists.sort(key=lambda item: len(item[0]))
+        total = len(self.ids)
+        idfs = [math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5)) for docs, _ in lists]
+        norm = K1 * B / (self.total_length / self.live)
+        base = K1 * (1 - B)
+        if np is not None:
+            matches = self._search_numpy(lists, idfs, norm, base, limit)
+        else:
+            matches = self._search_python(lists, idfs, norm, base, limit)
+        return [(self.ids[doc], score) for doc, score in matches]
+
+    def _search_numpy(self, lists, idfs, norm, base, limit) -> List[Tuple[int, float]]:
+        docs, freqs = lists[0]
+        candidates = np.frombuffer(docs, dtype=np.uint32)
+        lengths = np.frombuffer(self.lengths, dtype=np.uint32)
+        # 失效文档的长度为0
+        keep = lengths[candidates] > 0
+        candidates = candidates[keep]
+        tf = np.frombuffer(freqs, dtype=np.uint8)[keep].astype(np.float64)
+        denominators = base + norm * lengths[candidates]
+        scores = idfs[0] * tf * (K1 + 1) / (tf + denominators)
+        for (docs, freqs), idf in zip(lists[1:], idfs[1:]):
+            if not candidates.size:
+                break
+            postings = np.frombuffer(docs, dtype=np.uint32)
+            positions = np.minimum(np.searchsorted(postings, candidates), postings.size - 1)
+            hit = postings[positions] == candidates
+            candidates, positions = candidates[hit], positions[hit]
+            denominators, scores = denominators[hit], scores[hit]
+            tf = np.frombuffer(freqs, dtype=np.uint8)[positions].astype(np.float64)
+            scores += idf * tf * (K1 + 1) / (tf + denominators)
+        if candidates.size > limit:
+            # 保留与第limit名同分的全部文档，排序后再截断，同分时先索引的在前
+            threshold = np.partition(scores, candidates.size - limit)[candidates.size - limit]
+            keep = scores >= threshold
+            candidates, scores = candidates[keep], scores[keep]
+        order = np.lexsort((candidates, -scores))[:limit]
+        return list(zip(candidates[order].tolist(), scores[order].tolist()))
+
+    def _search_python(self, lists, idfs, norm, base, limit) -> List[Tuple[int, float]]:
+        docs, _ = lists[0]
+        lengths = self.lengths
+        # 先求交集，记下候选文档在每个倒排列表中的位置，最后只为命中的文档计算得分
+        first = [position for position, doc in enumerate(docs) if lengths[doc]]
+        candidates = [docs[position] for position in first]
+        positions = [first]
+        for docs, _ in lists[1:]:
+            kept, found = [], []
+            position = 0
+            # 候选文档号递增，二分查找的起点随之前移
+            for k, doc in enumerate(candidates):
+                position = bisect_left(docs, doc, position)
+                if position == len(docs):
+                    break
+                if docs[position] == doc:
+                    kept.append(k)
+                    found.append(position)
+            candidates = [candidates[k] for k in kept]
+            positions = [[column[k] for k in kept] for column in positions] + [found]
+            if not candidates:
+                return []
+        scores = []
+        for k, doc in enumerate(candidates):
+            denominator = base + norm * lengths[doc]
+            score = 0.0
+            for (_, freqs), idf, column in zip(lists, idfs, positions):
+                tf = freqs[column[k]]
+                score += idf * tf * (K1 + 1) / (tf + denominator)
+            scores.append((doc, score))
+        return heapq.nsmallest(limit, scores, key=lambda item: (-item[1], item[0]))
+
+    def save(self, path: str) -> None:
+        """保存索引（失效文档超过四分之一时先重新编号），先写临时文件再替换"""
+        if (len(self.ids) - self.live) * 4 > len(self.ids):
+            self.compact()
+        terms = list(self.terms)
+        lists = [self._slot(self.terms[term]) for term in terms]
+        header = {
+            "version": self.version,
+            "byteorder": sys.byteorder,
+            "ids": self.ids,
+            "keys": [self.keys.get(flag_id) if flag_id is not None else None for flag_id in self.ids],
+            "terms": terms,
+            "counts": [len(docs) for docs, _ in lists],
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+            f.write(json.dumps(header, ensure_ascii=False).encode("utf-8") + b"\n")
+            f.write(self.lengths.tobytes())
+            f.write(b"".join(docs for docs, _ in lists))
+            f.write(b"".join(freqs for _, freqs in lists))
+        os.replace(tmp, path)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path: str) -> "SearchIndex":
+        """读取保存的索引，文件不存在或损坏时返回空索引（版本号未知，下次使用时全部同步）"""
+        index = cls()
+        try:
+            with open(path, "rb") as f:
+                if f.readline() != MAGIC:
+                    return index
+                header = json.loads(f.readline())
+                lengths = array("I")
+                lengths.fromfile(f, len(header["ids"]))
+                postings = array("I")
+                postings.fromfile(f, sum(header["counts"]))
+                freqs = array("B")
+                freqs.fromfile(f, len(postings))
+        except (OSError, ValueError, EOFError, KeyError):
+            return index
+        if header["byteorder"] != sys.byteorder:
+            lengths.byteswap()
+            postings.byteswap()
+
+        index.ids = header["ids"]
+        index.keys = {flag_id: key for flag_id, key in zip(index.ids, header["keys"]) if flag_id is not None}
+        index.docs = {flag_id: doc for doc, flag_id in enumerate(index.ids) if flag_id is not None}
+        index.lengths = lengths
+        terms = header["terms"]
+        index.terms = dict(zip(terms, range(len(terms))))
+        index.postings = [None] * len(terms)
+        index.freqs = [None] * len(terms)
+        index._offsets = array("Q", [0])
+        index._offsets.extend(accumulate(header["counts"]))
+        index._base_docs = memoryview(postings)
+        index._base_freqs = memoryview(freqs)
+        index.live = len(index.docs)
+        index.total_length = sum(lengths)
+        index.version = header["version"]
+        return index
+
+
+def default_index_file(data_file: str) -> str:
+    """索引文件，放在数据文件旁边"""
+    return os.path.splitext(data_file)[0] + ".search"
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - 生产环境服务
+预先fork多个工作进程共用同一个监听socket，每个进程内多线程处理请求。
+主进程只负责监督：工作进程意外退出时重新启动，收到 SIGTERM/SIGINT 时通知所有工作进程
+停止接受新连接、处理完正在进行的请求后退出，超过 graceful_timeout 仍未退出的强制结束。
+各工作进程的FlagManager通过存储后端的进程间锁和版本号共享同一份数据（见 storage.FileLock）。
+没有 os.fork 的平台（Windows）退化为单进程多线程。
+"""
+
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+
+class RequestHandler(WSGIRequestHandler):
+    """空闲的keep-alive连接超过这个秒数后关闭，避免优雅退出时一直等待"""
+
+    timeout = 5
+
+    def log_request(self, code="-", size="-"):
+        # 生产模式不逐条打印访问日志
+        pass
+
+
+def run_worker(app, sock: socket.socket, on_shutdown: Optional[Callable[[], None]] = None,
+               on_exit: Optional[Callable[[], None]] = None) -> None:
+    """在当前进程中处理请求，直到收到 SIGTERM/SIGINT
+
+    on_exit 在所有请求处理完之后调用（如写入延迟写入的数据）；
+    工作进程用 os._exit 退出，不会运行 atexit 注册的函数
+    """
+    host, port = sock.getsockname()[:2]
+    server = make_server(host, port, app, threaded=True, request_handler=RequestHandler, fd=sock.fileno())
+    # 退出时等待正在处理请求的线程结束
+    server.daemon_threads = False
+    server.block_on_close = True
+
+    def stop(signum, frame):
+        if on_shutdown is not None:
+            on_shutdown()
+        # shutdown() 会等待 serve_forever 返回，不能在同一个线程里调用
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if on_exit is not None:
+            on_exit()
+
+
+def serve(app, host: str = "0.0.0.0", port: int = 5000, workers: int = 2,
+          on_shutdown: Optional[Callable[[], None]] = None, graceful_timeout: float = 30,
+          on_exit: Optional[Callable[[], None]] = None) -> None:
+    """启动多进程服务，阻塞到收到退出信号并且所有工作进程都已退出"""
+    sock = socket.create_server((host, port), backlog=1024)
+    sock.set_inheritable(True)
+
+    if workers <= 1 or not hasattr(os, "fork"):
+        print(f"🚀 单进程模式: http://{host}:{port}")
+        run_worker(app, sock, on_shutdown, on_exit)
+        return
+
+    children: Dict[int, int] = {}
+    stopping = threading.Event()
+
+    def spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(app, sock, on_shutdown, on_exit)
+            except BaseException:
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = slot
+
+    def stop(signum, frame):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for slot in range(workers):
+        spawn(slot)
+    print(f"🚀 已启动 {workers} 个工作进程: http://{host}:{port} (主进程 {os.getpid()})")
+    sys.stdout.flush()
+
+    while not stopping.is_set():
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid = 0
+        if pid and pid in children:
+            slot = children.pop(pid)
+            if not stopping.is_set():
+                print(f"⚠️  工作进程 {pid} 意外退出（状态 {status}），重新启动")
+                spawn(slot)
+            continue
+        stopping.wait(0.2)
+
+    print("🛑 正在停止，等待处理中的请求完成...")
+    for pid in list(children):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            children.pop(pid, None)
+
+    deadline = time.monotonic() + graceful_timeout
+    while children and time.monotonic() < deadline:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            children.pop(pid, None)
+        else:
+            time.sleep(0.05)
+    for pid in children:
+        # 超时仍未退出的工作进程强制结束
+        try:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        except (ProcessLookupError, ChildProcessError):
+            pass
+    sock.close()
+    print("✅ 服务已停止")
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - 二进制列式快照
+snapshot 存储后端（见 storage.py）的文件格式，读取时用mmap映射整个文件，不做整体解析：
+- 文件头: 魔数、版本号、flag数量、检查记录数量、字符串数量、字符串区字节数（小端，32字节）
+- flag列: 每列是定长整数数组，第i个元素属于第i个flag（按插入顺序）；
+  文本字段保存字符串表中的序号，日期另外保存一份解析好的时间戳（到期/检查提醒直接按列比较）
+- 检查记录列: 全部flags的检查记录首尾相连，flag的 history_start / history_count 指出自己的区间
+- 字符串表: 去重后按字典序排列的UTF-8字符串，先是偏移量数组，再是字符串数据；
+  序号的大小顺序与字符串的顺序一致，按日期排序、按ID二分查找都只需要比较整数
+读取单个flag时只解码它用到的字符串；统计、筛选和提醒按列扫描，安装NumPy时向量化（未安装时退化为循环）。
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import Counter
+from typing import List, Dict, BinaryIO, Iterable, Iterator, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # 没有NumPy时按列逐个比较
+    np = None
+
+from indexes import ACTIVE_STATUSES
+from models import FLAG_FIELDS, HEADER_FIELDS, Flag
+
+MAGIC = b"NYFSNAP1"
+VERSION = 1
+HEADER = struct.Struct("<8sIIIII4x")
+# 空值: 字符串序号、整数列和时间戳列各自的哨兵
+NONE_INDEX = 0xFFFFFFFF
+NONE_INT = -2 ** 31
+NONE_TIME = -2 ** 63
+# 8字节的时间戳列排在最前面，之后的列都按4字节对齐
+FLAG_COLUMNS = (
+    ("target_ts", "q"), ("created_ts", "q"), ("last_check_ts", "q"),
+    ("id", "I"), ("title", "I"), ("description", "I"), ("category", "I"),
+    ("target_date", "I"), ("created_date", "I"), ("progress", "i"), ("status", "I"),
+    ("feasibility_score", "i"), ("feasibility_reason", "I"), ("last_check", "I"),
+    ("history_count", "I"), ("history_start", "I"),
+    # 未知字段序列化成JSON放在字符串表中，没有时为空
+    ("extra", "I"),
+    # 按ID排序的行号，用于按ID二分查找
+    ("id_order", "I"),
+)
+RECORD_COLUMNS = (("record_date", "I"), ("record_progress", "i"), ("record_notes", "I"))
+TEXT_FIELDS = ("id", "title", "description", "category", "target_date", "created_date", "status",
+               "feasibility_reason")
+KNOWN_FIELDS = set(FLAG_FIELDS) | set(HEADER_FIELDS)
+NUMPY_TYPES = {"q": "<i8", "i": "<i4", "I": "<u4"}
+
+
+def write_snapshot(f: BinaryIO, items: Iterable[Tuple[Dict, List[Dict]]]) -> int:
+    """把 (flag头部, 检查记录列表) 写成快照，返回写入的flag数量
+
+    头部的格式与 storage.split_history 的结果相同；列和字符串表都在内存中组装好再一次写出
+    """
+    columns = {name: [] for name, _ in FLAG_COLUMNS + RECORD_COLUMNS}
+    for header, records in items:
+        flag = Flag.from_dict(header)
+        columns["target_ts"].append(flag.target_timestamp)
+        columns["created_ts"].append(flag.created_timestamp)
+        columns["last_check_ts"].append(flag.last_check_timestamp if flag.checks else None)
+        for name in TEXT_FIELDS:
+            columns[name].append(header[name])
+        columns["progress"].append(header["progress"])
+        columns["feasibility_score"].append(header.get("feasibility_score"))
+        columns["last_check"].append(header.get("last_check"))
+        extra = {key: value for key, value in header.items() if key not in KNOWN_FIELDS}
+        columns["extra"].append(json.dumps(extra, ensure_ascii=False) if extra else None)
+        columns["history_start"].append(len(columns["record_date"]))
+        columns["history_count"].append(len(records))
+        for record in records:
+            columns["record_date"].append(record["date"])
+            columns["record_progress"].append(record["progress"])
+            columns["record_notes"].append(record.get("notes", ""))
+
+    text_columns = TEXT_FIELDS + ("last_check", "extra", "record_date", "record_notes")
+    strings = sorted({value for name in text_columns for value in columns[name] if value is not None})
+    index = {value: i for i, value in enumerate(strings)}
+    index[None] = NONE_INDEX
+    for name in text_columns:
+        columns[name] = [index[value] for value in columns[name]]
+    ids = columns["id"]
+    columns["id_order"] = sorted(range(len(ids)), key=ids.__getitem__)
+    for name in ("target_ts", "created_ts", "last_check_ts"):
+        columns[name] = [NONE_TIME if value is None else value for value in columns[name]]
+    columns["feasibility_score"] = [NONE_INT if value is None else value for value in columns["feasibility_score"]]
+
+    encoded = [value.encode("utf-8") for value in strings]
+    offsets = [0]
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+
+    f.write(HEADER.pack(MAGIC, VERSION, len(ids), len(columns["record_date"]), len(strings), offsets[-1]))
+    for name, typecode in FLAG_COLUMNS + RECORD_COLUMNS:
+        _write_array(f, array(typecode, columns[name]))
+    _write_array(f, array("I", offsets))
+    for data in encoded:
+        f.write(data)
+    return len(ids)
+
+
+def _write_array(f: BinaryIO, values: array) -> None:
+    if sys.byteorder == "big":
+        values.byteswap()
+    f.write(values.tobytes())
+
+
+class SnapshotFile:
+    """只读映射的快照文件
+
+    identity 为打开时文件的 (inode, 修改时间, 大小)，文件被整体替换后可以据此发现并重新打开
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            if st.st_size < HEADER.size:
+                raise ValueError(f"快照文件不完整: {path}")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.identity = (st.st_ino, st.st_mtime_ns, st.st_size)
+        magic, version, self.count, self.record_count, self.string_count, blob_size = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"不是可识别的快照文件: {path}")
+
+        self._view = memoryview(self._mmap)
+        self._layout: Dict[str, Tuple[int, str, int]] = {}
+        offset = HEADER.size
+        sections = ([(name, typecode, self.count) for name, typecode in FLAG_COLUMNS]
+                    + [(name, typecode, self.record_count) for name, typecode in RECORD_COLUMNS]
+                    + [("string_offsets", "I", self.string_count + 1)])
+        for name, typecode, length in sections:
+            self._layout[name] = (offset, typecode, length)
+            offset += array(typecode).itemsize * length
+        if offset + blob_size != st.st_size:
+            self.close()
+            raise ValueError(f"快照文件不完整: {path}")
+        self.columns = {name: self._cast(*layout) for name, layout in self._layout.items()}
+        self._offsets = self.columns["string_offsets"]
+        self._blob = self._view[offset:]
+        # 整个字符串表解码后的列表，读取大部分flags时才建立
+        self._strings: Optional[List[str]] = None
+
+    def _cast(self, offset: int, typecode: str, length: int):
+        size = array(typecode).itemsize * length
+        if sys.byteorder == "little":
+            return self._view[offset:offset + size].cast(typecode)
+        values = array(typecode, self._view[offset:offset + size].tobytes())
+        values.byteswap()
+        return values
+
+    def array(self, name: str):
+        """以NumPy数组的形式直接引用映射的列（不复制），需要安装NumPy"""
+        offset, typecode, length = self._layout[name]
+        return np.frombuffer(self._mmap, dtype=NUMPY_TYPES[typecode], count=length, offset=offset)
+
+    def close(self) -> None:
+        """释放映射，之后不能再读取"""
+        for column in getattr(self, "columns", {}).values():
+            if isinstance(column, memoryview):
+                column.release()
+        if hasattr(self, "_blob"):
+            self._blob.release()
+        self._view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # 还有NumPy数组引用着映射，等它们被回收时一起释放
+            pass
+
+    def __len__(self) -> int:
+        return self.count
+
+    def text(self, index: int) -> Optional[str]:
+        """字符串表中的第index个字符串"""
+        if index == NONE_INDEX:
+            return None
+        if self._strings is not None:
+            return self._strings[index]
+        return str(self._blob[self._offsets[index]:self._offsets[index + 1]], "utf-8")
+
+    def load_strings(self) -> None:
+        """一次解码整个字符串表，之后读取字符串只是列表下标访问（逐个解码比批量慢数倍）"""
+        if self._strings is None:
+            data = self._blob.tobytes()
+            offsets = self._offsets.tolist()
+            self._strings = [data[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])]
+
+    def _bisect(self, value: str) -> int:
+        """第一个不小于value的字符串的序号"""
+        lo, hi = 0, self.string_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.text(mid) < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find_text(self, value: str) -> Optional[int]:
+        """字符串在字符串表中的序号，不存在时返回None"""
+        i = self._bisect(value)
+        return i if i < self.string_count and self.text(i) == value else None
+
+    def _id_position(self, index: int) -> int:
+        """id_order 中第一个ID序号不小于index的位置"""
+        ids, order = self.columns["id"], self.columns["id_order"]
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ids[order[mid]] < index:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find(self, flag_id: str) -> Optional[int]:
+        """按完整ID查找行号"""
+        index = self.find_text(flag_id)
+        if index is None:
+            return None
+        position = self._id_position(index)
+        order = self.columns["id_order"]
+        if position < self.count and self.columns["id"][order[position]] == index:
+            return order[position]
+        return None
+
+    def ids_with_prefix(self, prefix: str) -> Iterator[str]:
+        """按ID顺序产出以prefix开头的ID"""
+        ids, order = self.columns["id"], self.columns["id_order"]
+        for position in range(self._id_position(self._bisect(prefix)), self.count):
+            flag_id = self.text(ids[order[position]])
+            if not flag_id.startswith(prefix):
+                return
+            yield flag_id
+
+    def header(self, row: int) -> Dict:
+        """第row个flag的头部字典（字段顺序与 Flag.header_dict 相同）"""
+        columns = self.columns
+        text = self.text
+        score = columns["feasibility_score"][row]
+        header = {
+            "id": text(columns["id"][row]),
+            "title": text(columns["title"][row]),
+            "description": text(columns["description"][row]),
+            "category": text(columns["category"][row]),
+            "target_date": text(columns["target_date"][row]),
+            "created_date": text(columns["created_date"][row]),
+            "progress": columns["progress"][row],
+            "status": text(columns["status"][row]),
+            "feasibility_score": None if score == NONE_INT else score,
+            "feasibility_reason": text(columns["feasibility_reason"][row]),
+            "last_check": text(columns["last_check"][row]),
+            "history_count": columns["history_count"][row],
+        }
+        extra = columns["extra"][row]
+        if extra != NONE_INDEX:
+            header.update(json.loads(text(extra)))
+        return header
+
+    def headers(self, rows: List[int]) -> List[Dict]:
+        """多个行的头部字典，行数较多时先批量解码字符串表"""
+        if len(rows) * 8 > self.count:
+            self.load_strings()
+        return [self.header(row) for row in rows]
+
+    def history(self, row: int) -> List[Dict]:
+        """第row个flag的检查记录"""
+        columns = self.columns
+        start = columns["history_start"][row]
+        end = start + columns["history_count"][row]
+        # 检查记录的日期和备注不会为空，字符串表已解码时直接按下标取
+        text = self._strings.__getitem__ if self._strings is not None else self.text
+        return [{"date": text(date), "progress": progress, "notes": text(notes)}
+                for date, progress, notes in zip(columns["record_date"][start:end].tolist(),
+                                                 columns["record_progress"][start:end].tolist(),
+                                                 columns["record_notes"][start:end].tolist())]
+
+    def texts(self, name: str, rows: Iterable[int]) -> List[str]:
+        """多个行的同一个文本列，重复的字符串只解码一次（如日期、分类）"""
+        column = self.columns[name]
+        cache: Dict[int, str] = {}
+        result = []
+        for row in rows:
+            index = column[row]
+            value = cache.get(index)
+            if value is None:
+                value = cache[index] = self.text(index)
+            result.append(value)
+        return result
+
+    def counts(self) -> Dict:
+        """按列统计：总数、各状态和分类的数量、评分之和与个数（格式同 FlagStats.snapshot，键按第一次出现的顺序）"""
+        if np is not None:
+            by_status = self._value_counts("status")
+            by_category = self._value_counts("category")
+            scores = self.array("feasibility_score")
+            scores = scores[scores != NONE_INT]
+            score_sum, score_count = int(scores.sum(dtype=np.int64)), len(scores)
+        else:
+            by_status = Counter(self.columns["status"])
+            by_category = Counter(self.columns["category"])
+            scores = [score for score in self.columns["feasibility_score"] if score != NONE_INT]
+            score_sum, score_count = sum(scores), len(scores)
+        return {
+            "total": self.count,
+            "by_status": {self.text(index): count for index, count in by_status.items()},
+            "by_category": {self.text(index): count for index, count in by_category.items()},
+            "score_sum": score_sum,
+            "score_count": score_count,
+        }
+
+    def _value_counts(self, name: str) -> Dict[int, int]:
+        """一列中各个值的出现次数，按第一次出现的顺序排列（与逐个计数的结果顺序相同）"""
+        values, first, counts = np.unique(self.array(name), return_index=True, return_counts=True)
+        order = np.argsort(first)
+        return dict(zip(values[order].tolist(), counts[order].tolist()))
+
+    def select(self, category: Optional[str] = None, status: Optional[str] = None) -> List[int]:
+        """分类和状态都符合的行号（升序）"""
+        conditions = []
+        for name, value in (("category", category), ("status", status)):
+            if value:
+                index = self.find_text(value)
+                if index is None:
+                    return []
+                conditions.append((name, index))
+        if not conditions:
+            return list(range(self.count))
+        if np is not None:
+            mask = np.ones(self.count, dtype=bool)
+            for name, index in conditions:
+                mask &= self.array(name) == index
+            return np.flatnonzero(mask).tolist()
+        rows = range(self.count)
+        for name, index in conditions:
+            column = self.columns[name]
+            rows = [row for row in rows if column[row] == index]
+        return list(rows)
+
+    def deadline_rows(self, name: str, lo: Optional[int], hi: Optional[int]) -> List[Tuple[int, int]]:
+        """到期/检查时间落在 [lo, hi) 内的 (时间戳, 行号)，条件与 indexes.deadline_entries 相同
+
+        name 为 deadlines（未完成flags的目标日期）、activity（未完成flags的最近检查时间，未检查过时为创建日期）
+        或 completed（已完成flags的最后一次检查时间）
+        """
+        if name == "completed":
+            statuses = [self.find_text("已完成")]
+        else:
+            statuses = [self.find_text(status) for status in ACTIVE_STATUSES]
+        statuses = [index for index in statuses if index is not None]
+        if not statuses:
+            return []
+
+        if np is not None:
+            checked = self.array("history_count") > 0
+            mask = np.isin(self.array("status"), statuses)
+            if name == "deadlines":
+                stamps = self.array("target_ts")
+            elif name == "activity":
+                stamps = np.where(checked, self.array("last_check_ts"), self.array("created_ts"))
+            else:
+                stamps = self.array("last_check_ts")
+                mask &= checked
+            mask &= stamps != NONE_TIME
+            if lo is not None:
+                mask &= stamps >= lo
+            if hi is not None:
+                mask &= stamps < hi
+            rows = np.flatnonzero(mask)
+            return list(zip(stamps[rows].tolist(), rows.tolist()))
+
+        columns = self.columns
+        status_column, counts = columns["status"], columns["history_count"]
+        matches = []
+        for row in range(self.count):
+            if status_column[row] not in statuses:
+                continue
+            if name == "deadlines":
+                stamp = columns["target_ts"][row]
+            elif counts[row]:
+                stamp = columns["last_check_ts"][row]
+            elif name == "activity":
+                stamp = columns["created_ts"][row]
+            else:
+                continue
+            if stamp != NONE_TIME and (lo is None or stamp >= lo) and (hi is None or stamp < hi):
+                matches.append((stamp, row))
+        return matches
@@ -0,0 +1,1318 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - 存储后端
+FlagManager通过存储后端读写数据，所有变更都以操作记录的形式交给后端，
+批量操作期间（begin/commit/rollback）的变更一次性提交。
+多个进程同时访问同一份数据时，写操作通过 FileLock 串行化，锁文件中保存单调递增的数据版本号：
+- json: 整文件JSON，每次变更重写整个文件（原有行为）
+- journal: 快照 + 追加式操作日志，定期压缩为快照
+- jsonl: 每行一个flag头部，检查记录单独存放，支持流式读取，统计和筛选时内存占用与数据量无关
+- sqlite: SQLite数据库，筛选、排序和统计直接在SQL中完成
+- snapshot: 二进制列式快照（mmap读取，见 snapshot.py）+ 追加式操作日志，只读命令按列扫描
+"""
+
+import itertools
+import json
+import os
+import sqlite3
+import threading
+from typing import List, Dict, Iterable, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，退化为只在进程内加锁
+    fcntl = None
+
+from indexes import deadline_entries, in_range
+from models import HEADER_FIELDS, Flag, to_json
+
+
+def fsync_dir(path: str) -> None:
+    """同步目录项，保证rename之后的文件名在崩溃后依然可见"""
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_json(path: str, data, indent: Optional[int] = 2) -> None:
+    """原子写入JSON文件：先写临时文件并fsync，再rename覆盖目标文件"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent, default=to_json)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_dir(path)
+
+
+def atomic_write_lines(path: str, lines: Iterable[str]) -> None:
+    """原子写入文本行，lines 可以是生成器，写入过程中不需要把全部内容放进内存"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for line in lines:
+            f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_dir(path)
+
+
+class ConcurrentModificationError(RuntimeError):
+    """整体保存时发现数据已被其他进程修改"""
+
+    def __init__(self, expected: int, actual: int):
+        self.expected = expected
+        self.actual = actual
+        super().__init__(f"数据已被其他进程修改（版本 {expected} -> {actual}），请重新加载后再保存")
+
+
+class FileLock:
+    """基于 fcntl.flock 的进程间建议锁
+
+    锁文件（<data_file>.lock）同时保存数据版本号，每次提交变更后在持有锁时加一，
+    其他进程比较版本号即可知道内存中的数据是否过期。版本号不需要fsync：
+    系统崩溃后不会有持有旧数据的进程存活。
+    可重入；同一进程内的多个线程之间另用 threading.RLock 互斥。
+    锁文件无法创建（如只读目录）时锁和版本号都不起作用，行为与原来相同。
+    """
+
+    VERSION_WIDTH = 20
+
+    def __init__(self, path: str):
+        self.path = path
+        self.depth = 0
+        # 持有锁的线程
+        self.owner = None
+        self._thread_lock = threading.RLock()
+        try:
+            self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError:
+            self.fd = None
+
+    def acquire(self) -> None:
+        self._thread_lock.acquire()
+        if self.depth == 0 and self.fd is not None and fcntl is not None:
+            try:
+                fcntl.flock(self.fd, fcntl.LOCK_EX)
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self.depth += 1
+        self.owner = threading.get_ident()
+
+    def release(self) -> None:
+        self.depth -= 1
+        if self.depth == 0:
+            self.owner = None
+            if self.fd is not None and fcntl is not None:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+    @property
+    def held(self) -> bool:
+        """当前线程是否持有锁"""
+        return self.owner == threading.get_ident()
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+    def version(self) -> int:
+        """当前数据版本号，不需要持有锁"""
+        if self.fd is None:
+            return 0
+        data = os.pread(self.fd, self.VERSION_WIDTH, 0)
+        try:
+            return int(data)
+        except ValueError:
+            return 0
+
+    def bump(self) -> int:
+        """版本号加一并返回新版本，必须在持有锁时调用"""
+        version = self.version() + 1
+        if self.fd is not None:
+            os.pwrite(self.fd, f"{version:0{self.VERSION_WIDTH}d}".encode(), 0)
+        return version
+
+    def close(self) -> None:
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def apply_operation(flags: List[Dict], by_id: Dict[str, Dict], op: Dict) -> None:
+    """把一条操作记录应用到flags上
+
+    重放日志时使用。操作都是幂等的，同一条记录应用两次不会重复生效，
+    因此压缩过程中崩溃（快照已写入、日志尚未清空）也不会导致数据重复。
+    """
+    kind = op.get("op")
+
+    if kind == "batch":
+        for sub_op in op["ops"]:
+            apply_operation(flags, by_id, sub_op)
+
+    elif kind == "add":
+        flag = op["flag"]
+        if flag["id"] not in by_id:
+            flags.append(flag)
+            by_id[flag["id"]] = flag
+
+    elif kind == "check":
+        flag = by_id.get(op["id"])
+        if flag is None:
+            return
+        # seq是该记录在check_history中的位置，已存在说明快照里包含了这条记录
+        if len(flag["check_history"]) > op["seq"]:
+            return
+        flag["check_history"].append(op["record"])
+        flag["progress"] = op["progress"]
+        flag["status"] = op["status"]
+
+    elif kind == "score":
+        flag = by_id.get(op["id"])
+        if flag is not None:
+            flag["feasibility_score"] = op["feasibility_score"]
+            flag["feasibility_reason"] = op["feasibility_reason"]
+
+    elif kind == "delete":
+        flag = by_id.pop(op["id"], None)
+        if flag is not None:
+            flags.remove(flag)
+
+
+class JSONStorage:
+    """整文件JSON存储，每次变更都重写整个文件"""
+
+    name = "json"
+
+    def __init__(self, data_file: str = "flags.json"):
+        self.data_file = data_file
+        self.pending: Optional[List[Dict]] = None
+        self.lock = FileLock(f"{data_file}.lock")
+
+    def load(self) -> List[Dict]:
+        """从文件加载flags数据"""
+        if os.path.exists(self.data_file):
+            try:
+                with open(self.data_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, FileNotFoundError):
+                return []
+        return []
+
+    def save(self, flags: List[Dict]) -> None:
+        """保存完整的flags数据"""
+        atomic_write_json(self.data_file, flags)
+
+    def close(self) -> None:
+        """关闭锁文件"""
+        self.lock.close()
+
+    def append(self, op: Dict, flags: List[Dict]) -> None:
+        """记录一次变更，整文件存储直接重写"""
+        if self.pending is not None:
+            self.pending.append(op)
+            return
+        self.save(flags)
+
+    def compact(self, flags: List[Dict]) -> None:
+        """压缩存储，整文件存储等同于保存"""
+        self.save(flags)
+
+    def begin(self) -> None:
+        """开始批量操作，之后的变更先缓存在内存中"""
+        self.pending = []
+
+    def commit(self, flags: List[Dict]) -> None:
+        """提交批量操作，整个批次只写一次文件"""
+        ops, self.pending = self.pending, None
+        if ops:
+            self._commit_ops(ops, flags)
+
+    def _commit_ops(self, ops: List[Dict], flags: List[Dict]) -> None:
+        self.save(flags)
+
+    def rollback(self) -> None:
+        """放弃批量操作中缓存的变更"""
+        self.pending = None
+
+
+class JournalStorage(JSONStorage):
+    """追加式日志存储
+
+    data_file 作为快照（格式与原有flags.json相同，旧文件无需转换即可使用），
+    每次变更只向 <data_file>.journal 追加一行操作记录并fsync。
+    日志条数达到阈值时把当前数据写成新快照（原子rename）并清空日志。
+    """
+
+    name = "journal"
+
+    def __init__(self, data_file: str = "flags.json", journal_file: Optional[str] = None,
+                 compact_threshold: int = 1000):
+        super().__init__(data_file)
+        self.journal_file = journal_file or f"{data_file}.journal"
+        self.compact_threshold = compact_threshold
+        self.journal_ops = 0
+
+    def _read_journal(self) -> Iterator[Dict]:
+        """逐行读取日志，跳过崩溃留下的不完整行
+
+        持有锁时截掉不完整的尾行；未持有锁时没有换行结尾的尾行可能是其他进程正在写入的，只跳过、不修改文件
+        """
+        if not os.path.exists(self.journal_file):
+            return
+        offset = good_offset = 0
+        with open(self.journal_file, 'rb') as f:
+            for line in f:
+                offset += len(line)
+                try:
+                    op = json.loads(line) if line.endswith(b"\n") else None
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    op = None
+                if not isinstance(op, dict):
+                    continue
+                good_offset = offset
+                yield op
+        if good_offset < offset and self.lock.held:
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(good_offset)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def load(self) -> List[Dict]:
+        """加载快照并重放日志"""
+        flags = super().load()
+        by_id = {flag["id"]: flag for flag in flags}
+        self.journal_ops = 0
+        for op in self._read_journal():
+            apply_operation(flags, by_id, op)
+            self.journal_ops += len(op["ops"]) if op.get("op") == "batch" else 1
+        return flags
+
+    def save(self, flags: List[Dict]) -> None:
+        """保存完整数据，即写入新快照"""
+        self.compact(flags)
+
+    def append(self, op: Dict, flags: List[Dict]) -> None:
+        """追加一条操作记录，必要时触发压缩"""
+        if self.pending is not None:
+            self.pending.append(op)
+            return
+        self._append_line(op, flags)
+
+    def _commit_ops(self, ops: List[Dict], flags: List[Dict]) -> None:
+        # 整个批次写成一行，崩溃时留下的不完整行会被整体丢弃，不会只生效一部分
+        self._append_line({"op": "batch", "ops": ops}, flags, len(ops))
+
+    def _append_line(self, op: Dict, flags: List[Dict], count: int = 1) -> None:
+        """向日志追加一行并fsync，count 为这一行包含的操作数"""
+        # 日志末尾有未截掉的不完整行时先补换行，新的一行不会接在它后面
+        _append_lines(self.journal_file, [json.dumps(op, ensure_ascii=False, separators=(",", ":")) + "\n"])
+        self.journal_ops += count
+
+        if self.journal_ops >= self.compact_threshold:
+            self.compact(flags)
+
+    def compact(self, flags: List[Dict]) -> None:
+        """把当前数据写成快照并清空日志"""
+        atomic_write_json(self.data_file, flags)
+        # 快照落盘后才清空日志；两步之间崩溃时日志会被幂等地重放
+        with open(self.journal_file, 'w', encoding='utf-8') as f:
+            f.flush()
+            os.fsync(f.fileno())
+        self.journal_ops = 0
+
+
+def _load_json_file(json_file: str) -> List[Dict]:
+    """读取要迁移到其他格式的JSON数据文件（连同未压缩的操作日志），读完即关闭其锁文件"""
+    reader = JournalStorage(json_file)
+    try:
+        return reader.load()
+    finally:
+        reader.close()
+
+
+def split_history(flag) -> tuple:
+    """把flag拆成 (头部字典, 检查记录列表)，头部附带最近检查时间和记录条数"""
+    if hasattr(flag, "header_dict"):
+        return flag.header_dict(), [record.to_dict() for record in flag.check_history]
+    records = flag["check_history"]
+    header = {key: value for key, value in flag.items() if key != "check_history"}
+    header["last_check"] = records[-1]["date"] if records else None
+    header["history_count"] = len(records)
+    return header, records
+
+
+def join_history(header: Dict, records: List[Dict]) -> Dict:
+    """split_history 的逆操作，按原有字段顺序组装完整的flag字典"""
+    flag = {}
+    for key, value in header.items():
+        if key == "feasibility_score":
+            flag["check_history"] = records
+        if key not in HEADER_FIELDS:
+            flag[key] = value
+    flag.setdefault("check_history", records)
+    return flag
+
+
+def _dump_line(data) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=to_json) + "\n"
+
+
+def _read_lines(path: str) -> Iterator[Dict]:
+    """逐行读取JSON，跳过空行和崩溃留下的不完整行"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def _append_lines(path: str, lines: Iterable[str]) -> None:
+    """在文件末尾追加若干行并fsync"""
+    with open(path, 'a+b') as f:
+        # 上次写入若在行中间中断，先补一个换行，让残缺行单独成行被读取时跳过
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+        for line in lines:
+            f.write(line.encode('utf-8'))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class JSONLStorage(JSONStorage):
+    """逐行JSON存储
+
+    data_file 每行一个flag头部（不含检查记录，附带 last_check 和 history_count），
+    检查记录单独追加到 <name>.history.jsonl，每行一条 {"id", "seq", "date", "progress", "notes"}。
+    读取时逐行解析头部（iter_headers），配合 FlagManager 的惰性模式，统计、筛选和报告都是流式的；
+    检查记录只在需要时通过 load_history 按flag读取。
+    新增flag和检查记录都直接追加；修改和删除流式重写头部文件（逐行读入、应用变更、写入临时文件后rename）。
+    检查记录先于头部落盘，头部的 history_count 才是提交点，崩溃遗留的多余记录读取时会被忽略。
+    data_file 以 .json 结尾时数据放在同名 .jsonl 文件中，首次打开时自动转换已有的JSON数据。
+    """
+
+    name = "jsonl"
+    lazy = True
+
+    def __init__(self, data_file: str = "flags.jsonl"):
+        json_file = None
+        if data_file.endswith(".json"):
+            json_file = data_file
+            data_file = os.path.splitext(data_file)[0] + ".jsonl"
+        super().__init__(data_file)
+        self.history_file = os.path.splitext(data_file)[0] + ".history.jsonl"
+        # 检查记录文件中每个flag各行的偏移量，按需建立，文件追加后增量补齐
+        self._history_offsets: Dict[str, List[int]] = {}
+        self._indexed = (None, 0)
+
+        with self.lock:
+            if json_file and not os.path.exists(data_file) and os.path.exists(json_file):
+                self.save(_load_json_file(json_file))
+            elif any("check_history" in flag for flag in self._first_line()):
+                # 检查记录还内联在每一行中的旧文件，拆分一次
+                self.save(list(_read_lines(self.data_file)))
+
+    def _first_line(self) -> List[Dict]:
+        for flag in _read_lines(self.data_file):
+            return [flag]
+        return []
+
+    def iter_headers(self) -> Iterator[Dict]:
+        """逐行读取flag头部，不读取检查记录"""
+        return _read_lines(self.data_file)
+
+    def _index_history(self) -> None:
+        """建立或增量更新检查记录的偏移量索引"""
+        try:
+            st = os.stat(self.history_file)
+        except FileNotFoundError:
+            self._history_offsets, self._indexed = {}, (None, 0)
+            return
+        inode, offset = self._indexed
+        if inode != st.st_ino or st.st_size < offset:
+            # 文件被整体重写过，从头建立
+            self._history_offsets, offset = {}, 0
+        if st.st_size == offset:
+            return
+        with open(self.history_file, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    flag_id = json.loads(line)["id"]
+                except (ValueError, KeyError, TypeError):
+                    flag_id = None
+                if flag_id is not None:
+                    self._history_offsets.setdefault(flag_id, []).append(offset)
+                offset += len(line)
+        self._indexed = (st.st_ino, offset)
+
+    def load_history(self, flag_id: str) -> List[Dict]:
+        """读取一个flag的检查记录（按序号排列，同一序号以后写入的为准）"""
+        self._index_history()
+        offsets = self._history_offsets.get(flag_id)
+        if not offsets:
+            return []
+        by_seq = {}
+        with open(self.history_file, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                record = json.loads(f.readline())
+                by_seq[record.pop("seq")] = record
+                del record["id"]
+        return [by_seq[seq] for seq in sorted(by_seq)]
+
+    def iter_flags(self) -> Iterator[Dict]:
+        """逐个读取完整的flags（头部 + 检查记录）"""
+        for header in self.iter_headers():
+            records = self.load_history(header["id"]) if header.get("history_count") else []
+            yield join_history(header, records[:header.get("history_count", 0)])
+
+    def load(self) -> List[Dict]:
+        """加载全部flags，检查记录文件只顺序读取一遍"""
+        history: Dict[str, Dict[int, Dict]] = {}
+        for record in _read_lines(self.history_file):
+            history.setdefault(record.pop("id"), {})[record.pop("seq")] = record
+        flags = []
+        for header in self.iter_headers():
+            by_seq = history.get(header["id"], {})
+            records = [by_seq[seq] for seq in sorted(by_seq)][:header.get("history_count", 0)]
+            flags.append(join_history(header, records))
+        return flags
+
+    @staticmethod
+    def _history_lines(flag_id: str, records: Iterable[Dict], start: int = 0) -> Iterator[str]:
+        for seq, record in enumerate(records, start):
+            yield _dump_line({"id": flag_id, "seq": seq, "date": record["date"],
+                              "progress": record["progress"], "notes": record.get("notes", "")})
+
+    def save(self, flags: Iterable[Dict]) -> None:
+        """保存完整的flags数据（检查记录文件和头部文件各重写一次）"""
+        headers_tmp = f"{self.data_file}.tmp"
+        with open(self.history_file + ".tmp", 'w', encoding='utf-8') as history, \
+                open(headers_tmp, 'w', encoding='utf-8') as headers:
+            for flag in flags:
+                header, records = split_history(flag)
+                history.writelines(self._history_lines(header["id"], records))
+                headers.write(_dump_line(header))
+            for f in (history, headers):
+                f.flush()
+                os.fsync(f.fileno())
+        # 先替换检查记录，再替换头部（提交点）
+        os.replace(self.history_file + ".tmp", self.history_file)
+        os.replace(headers_tmp, self.data_file)
+        fsync_dir(self.data_file)
+
+    def append(self, op: Dict, flags: Optional[List[Dict]] = None) -> None:
+        """记录一次变更"""
+        if self.pending is not None:
+            self.pending.append(op)
+            return
+        self._commit_ops([op], flags)
+
+    def _commit_ops(self, ops: List[Dict], flags: Optional[List[Dict]] = None) -> None:
+        ops = [sub_op for op in ops for sub_op in (op["ops"] if op.get("op") == "batch" else [op])]
+        lines = []
+        for op in ops:
+            if op.get("op") == "add":
+                lines.extend(self._history_lines(op["flag"]["id"], op["flag"]["check_history"]))
+            elif op.get("op") == "check":
+                lines.extend(self._history_lines(op["id"], [op["record"]], op["seq"]))
+        if lines:
+            _append_lines(self.history_file, lines)
+
+        if all(op.get("op") == "add" for op in ops):
+            _append_lines(self.data_file, (_dump_line(split_history(op["flag"])[0]) for op in ops))
+        else:
+            self._rewrite(ops)
+
+    @staticmethod
+    def _apply_header(header: Dict, op: Dict) -> Optional[Dict]:
+        """把一条操作应用到头部上，删除时返回None；与 apply_operation 一样是幂等的"""
+        kind = op.get("op")
+        if kind == "delete":
+            return None
+        if kind == "check" and header.get("history_count", 0) <= op["seq"]:
+            header["progress"] = op["progress"]
+            header["status"] = op["status"]
+            header["last_check"] = op["record"]["date"]
+            header["history_count"] = op["seq"] + 1
+        elif kind == "score":
+            header["feasibility_score"] = op["feasibility_score"]
+            header["feasibility_reason"] = op["feasibility_reason"]
+        return header
+
+    def _rewrite(self, ops: List[Dict]) -> None:
+        """流式重写头部文件，把ops应用到对应的行上"""
+        added = []
+        ops_by_id: Dict[str, List[Dict]] = {}
+        for op in ops:
+            if op.get("op") == "add":
+                added.append(split_history(op["flag"])[0])
+            else:
+                ops_by_id.setdefault(op["id"], []).append(op)
+
+        def apply(header: Dict) -> Optional[Dict]:
+            for op in ops_by_id.get(header["id"], ()):
+                header = self._apply_header(header, op)
+                if header is None:
+                    break
+            return header
+
+        def lines():
+            seen = set()
+            for header in self.iter_headers():
+                seen.add(header["id"])
+                header = apply(header) if header["id"] in ops_by_id else header
+                if header is not None:
+                    yield _dump_line(header)
+            for header in added:
+                if header["id"] not in seen:
+                    header = apply(header)
+                    if header is not None:
+                        yield _dump_line(header)
+
+        atomic_write_lines(self.data_file, lines())
+
+    def compact(self, flags: Optional[List[Dict]] = None) -> None:
+        """重写两个文件，清理残缺行以及已删除flag和未提交的检查记录"""
+        def history_lines():
+            for header in self.iter_headers():
+                count = header.get("history_count", 0)
+                if count:
+                    yield from self._history_lines(header["id"], self.load_history(header["id"])[:count])
+
+        # 生成新文件时读取的是旧文件，写完后才rename替换
+        atomic_write_lines(self.history_file, history_lines())
+        self._rewrite([])
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS flags (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    category TEXT NOT NULL,
+    target_date TEXT NOT NULL,
+    created_date TEXT NOT NULL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    feasibility_score INTEGER,
+    feasibility_reason TEXT NOT NULL DEFAULT '',
+    last_check TEXT,
+    history_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS check_history (
+    flag_id TEXT NOT NULL REFERENCES flags(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    progress INTEGER NOT NULL,
+    notes TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (flag_id, seq)
+);
+-- flags表缓存最近检查时间和记录条数，读取头部时不需要访问check_history
+CREATE TRIGGER IF NOT EXISTS check_history_header AFTER INSERT ON check_history
+BEGIN
+    UPDATE flags SET
+        last_check = CASE WHEN NEW.seq >= history_count THEN NEW.date ELSE last_check END,
+        history_count = history_count + 1
+    WHERE id = NEW.flag_id;
+END;
+CREATE INDEX IF NOT EXISTS idx_flags_status ON flags(status, created_date);
+CREATE INDEX IF NOT EXISTS idx_flags_category ON flags(category, created_date);
+CREATE INDEX IF NOT EXISTS idx_flags_target_date ON flags(target_date);
+CREATE INDEX IF NOT EXISTS idx_flags_created_date ON flags(created_date);
+
+-- 增量维护的统计计数，由触发器随flags表的增删改同步更新
+CREATE TABLE IF NOT EXISTS flag_counters (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (kind, key)
+);
+CREATE TRIGGER IF NOT EXISTS flags_counters_insert AFTER INSERT ON flags
+BEGIN
+    INSERT INTO flag_counters VALUES ('status', NEW.status, 1)
+        ON CONFLICT(kind, key) DO UPDATE SET count = count + 1;
+    INSERT INTO flag_counters VALUES ('category', NEW.category, 1)
+        ON CONFLICT(kind, key) DO UPDATE SET count = count + 1;
+    INSERT INTO flag_counters SELECT 'score', 'sum', NEW.feasibility_score WHERE NEW.feasibility_score IS NOT NULL
+        ON CONFLICT(kind, key) DO UPDATE SET count = count + excluded.count;
+    INSERT INTO flag_counters SELECT 'score', 'count', 1 WHERE NEW.feasibility_score IS NOT NULL
+        ON CONFLICT(kind, key) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS flags_counters_delete AFTER DELETE ON flags
+BEGIN
+    UPDATE flag_counters SET count = count - 1 WHERE kind = 'status' AND key = OLD.status;
+    UPDATE flag_counters SET count = count - 1 WHERE kind = 'category' AND key = OLD.category;
+    UPDATE flag_counters SET count = count - OLD.feasibility_score
+        WHERE kind = 'score' AND key = 'sum' AND OLD.feasibility_score IS NOT NULL;
+    UPDATE flag_counters SET count = count - 1
+        WHERE kind = 'score' AND key = 'count' AND OLD.feasibility_score IS NOT NULL;
+END;
+CREATE TRIGGER IF NOT EXISTS flags_counters_update AFTER UPDATE OF status, category, feasibility_score ON flags
+BEGIN
+    UPDATE flag_counters SET count = count - 1 WHERE kind = 'status' AND key = OLD.status;
+    INSERT INTO flag_counters VALUES ('status', NEW.status, 1)
+        ON CONFLICT(kind, key) DO UPDATE SET count = count + 1;
+    UPDATE flag_counters SET count = count - 1 WHERE kind = 'category' AND key = OLD.category;
+    INSERT INTO flag_counters VALUES ('category', NEW.category, 1)
+        ON CONFLICT(kind, key) DO UPDATE SET count = count + 1;
+    UPDATE flag_counters SET count = count - OLD.feasibility_score
+        WHERE kind = 'score' AND key = 'sum' AND OLD.feasibility_score IS NOT NULL;
+    UPDATE flag_counters SET count = count - 1
+        WHERE kind = 'score' AND key = 'count' AND OLD.feasibility_score IS NOT NULL;
+    INSERT INTO flag_counters SELECT 'score', 'sum', NEW.feasibility_score WHERE NEW.feasibility_score IS NOT NULL
+        ON CONFLICT(kind, key) DO UPDATE SET count = count + excluded.count;
+    INSERT INTO flag_counters SELECT 'score', 'count', 1 WHERE NEW.feasibility_score IS NOT NULL
+        ON CONFLICT(kind, key) DO UPDATE SET count = count + 1;
+END;
+"""
+
+FLAG_COLUMNS = ("id", "title", "description", "category", "target_date", "created_date",
+                "progress", "status", "feasibility_score", "feasibility_reason")
+HEADER_COLUMNS = FLAG_COLUMNS + HEADER_FIELDS
+
+
+class SQLiteStorage:
+    """SQLite存储
+
+    flags 和 check_history 分表保存，变更直接转换为SQL语句，
+    FlagManager 在未加载全部数据时会把筛选、排序和统计交给 query_flags / statistics。
+    查询返回的是flag头部（last_check、history_count 由触发器维护），检查记录通过 load_history 按需读取。
+    data_file 以 .json 结尾时数据库放在同名 .db 文件中，首次打开时自动导入已有的JSON数据。
+    """
+
+    name = "sqlite"
+    lazy = True
+
+    def __init__(self, data_file: str = "flags.db"):
+        self.in_transaction = False
+        json_file = None
+        if data_file.endswith(".json"):
+            json_file = data_file
+            data_file = os.path.splitext(data_file)[0] + ".db"
+        self.data_file = data_file
+        self.lock = FileLock(f"{data_file}.lock")
+
+        is_new = not os.path.exists(data_file)
+        # 连接可以在创建它的线程之外使用（Web应用的请求线程、延迟写入的后台线程），由调用方保证同一时间只有一个线程访问
+        self.conn = sqlite3.connect(data_file, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        has_counters = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'flag_counters'"
+        ).fetchone()
+        self._add_header_columns()
+        self.conn.executescript(SQLITE_SCHEMA)
+        if not has_counters:
+            # 旧版本创建的数据库没有计数表，按现有数据补齐
+            self.rebuild_counters()
+
+        if is_new and json_file and os.path.exists(json_file):
+            with self.lock:
+                # 另一个进程可能已经抢先导入
+                if not self.conn.execute("SELECT 1 FROM flags LIMIT 1").fetchone():
+                    self.import_json(json_file)
+
+    def close(self) -> None:
+        """关闭数据库连接和锁文件"""
+        self.conn.close()
+        self.lock.close()
+
+    def _add_header_columns(self) -> None:
+        """旧版本创建的flags表没有 last_check / history_count，补上并按现有检查记录填充"""
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(flags)")}
+        if not columns or "history_count" in columns:
+            return
+        with self.conn:
+            self.conn.execute("ALTER TABLE flags ADD COLUMN last_check TEXT")
+            self.conn.execute("ALTER TABLE flags ADD COLUMN history_count INTEGER NOT NULL DEFAULT 0")
+            self.conn.execute(
+                "UPDATE flags SET "
+                "history_count = (SELECT COUNT(*) FROM check_history WHERE flag_id = flags.id), "
+                "last_check = (SELECT date FROM check_history WHERE flag_id = flags.id ORDER BY seq DESC LIMIT 1)"
+            )
+
+    def import_json(self, json_file: str) -> int:
+        """一次性导入JSON数据文件（连同未压缩的操作日志），返回导入的flag数量"""
+        flags = _load_json_file(json_file)
+        self.save(flags)
+        return len(flags)
+
+    def _insert_flags(self, flags: List[Dict]) -> None:
+        """批量插入flags及其检查记录，已存在的flag保持不变"""
+        self.conn.executemany(
+            f"INSERT OR IGNORE INTO flags ({', '.join(FLAG_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(FLAG_COLUMNS))})",
+            ([flag[column] for column in FLAG_COLUMNS] for flag in flags)
+        )
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO check_history (flag_id, seq, date, progress, notes) "
+            "VALUES (?, ?, ?, ?, ?)",
+            ((flag["id"], seq, record["date"], record["progress"], record.get("notes", ""))
+             for flag in flags for seq, record in enumerate(flag["check_history"]))
+        )
+
+    def load(self) -> List[Dict]:
+        """加载全部flags（按插入顺序），附上各自的检查记录"""
+        flags = []
+        by_id = {}
+        for row in self.conn.execute(f"SELECT {', '.join(FLAG_COLUMNS)} FROM flags ORDER BY rowid"):
+            flag = {column: row[column] for column in FLAG_COLUMNS}
+            flag["check_history"] = []
+            flags.append(flag)
+            by_id[flag["id"]] = flag
+
+        history = self.conn.execute(
+            "SELECT flag_id, date, progress, notes FROM check_history ORDER BY flag_id, seq"
+        )
+        for row in history:
+            flag = by_id.get(row["flag_id"])
+            if flag is not None:
+                flag["check_history"].append(
+                    {"date": row["date"], "progress": row["progress"], "notes": row["notes"]}
+                )
+        return flags
+
+    def iter_headers(self) -> Iterator[Dict]:
+        """流式读取全部flag头部（按插入顺序），不读取检查记录"""
+        rows = self.conn.execute(f"SELECT {', '.join(HEADER_COLUMNS)} FROM flags ORDER BY rowid")
+        for row in rows:
+            yield dict(row)
+
+    def load_history(self, flag_id: str) -> List[Dict]:
+        """读取一个flag的检查记录"""
+        rows = self.conn.execute(
+            "SELECT date, progress, notes FROM check_history WHERE flag_id = ? ORDER BY seq", (flag_id,)
+        )
+        return [dict(row) for row in rows]
+
+    def iter_flags(self) -> Iterator[Dict]:
+        """流式读取全部flags
+
+        flags表和check_history表各用一个按ID排序的游标做归并，内存中只保留当前的flag
+        """
+        flag_rows = self.conn.execute(f"SELECT {', '.join(FLAG_COLUMNS)} FROM flags ORDER BY id")
+        history_rows = self.conn.cursor().execute(
+            "SELECT flag_id, date, progress, notes FROM check_history ORDER BY flag_id, seq"
+        )
+        record = history_rows.fetchone()
+        for row in flag_rows:
+            flag = {column: row[column] for column in FLAG_COLUMNS}
+            flag["check_history"] = []
+            while record is not None and record["flag_id"] <= flag["id"]:
+                if record["flag_id"] == flag["id"]:
+                    flag["check_history"].append(
+                        {"date": record["date"], "progress": record["progress"], "notes": record["notes"]}
+                    )
+                record = history_rows.fetchone()
+            yield flag
+
+    def save(self, flags: Iterable[Dict]) -> None:
+        """用给定数据整体替换数据库内容
+
+        flags 为生成器时分块插入，不需要把全部数据放进内存（生成器中不能有从本库按需读取检查记录的Flag）
+        """
+        if isinstance(flags, list):
+            # 按需加载检查记录的Flag会从本库读取记录，必须在清空表之前取出
+            flags = [flag.to_dict() if hasattr(flag, "to_dict") else flag for flag in flags]
+        flags = iter(flags)
+        with self.conn:
+            self.conn.execute("DELETE FROM check_history")
+            self.conn.execute("DELETE FROM flags")
+            while True:
+                chunk = [flag.to_dict() if hasattr(flag, "to_dict") else flag
+                         for flag in itertools.islice(flags, 10000)]
+                if not chunk:
+                    break
+                self._insert_flags(chunk)
+
+    def _execute_op(self, op: Dict) -> None:
+        """把一条操作记录转换为SQL执行"""
+        kind = op.get("op")
+        if kind == "batch":
+            for sub_op in op["ops"]:
+                self._execute_op(sub_op)
+        elif kind == "add":
+            self._insert_flags([op["flag"]])
+        elif kind == "check":
+            record = op["record"]
+            self.conn.execute(
+                "INSERT OR IGNORE INTO check_history (flag_id, seq, date, progress, notes) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (op["id"], op["seq"], record["date"], record["progress"], record.get("notes", ""))
+            )
+            self.conn.execute(
+                "UPDATE flags SET progress = ?, status = ? WHERE id = ?",
+                (op["progress"], op["status"], op["id"])
+            )
+        elif kind == "score":
+            self.conn.execute(
+                "UPDATE flags SET feasibility_score = ?, feasibility_reason = ? WHERE id = ?",
+                (op["feasibility_score"], op["feasibility_reason"], op["id"])
+            )
+        elif kind == "delete":
+            self.conn.execute("DELETE FROM flags WHERE id = ?", (op["id"],))
+
+    def append(self, op: Dict, flags: Optional[List[Dict]] = None) -> None:
+        """执行一条操作记录，批量操作期间暂不提交事务"""
+        self._execute_op(op)
+        if not self.in_transaction:
+            self.conn.commit()
+
+    def begin(self) -> None:
+        """开始事务，批量操作期间的查询能看到尚未提交的变更"""
+        self.conn.commit()
+        self.in_transaction = True
+
+    def commit(self, flags: Optional[List[Dict]] = None) -> None:
+        """提交事务"""
+        self.in_transaction = False
+        self.conn.commit()
+
+    def rollback(self) -> None:
+        """回滚事务"""
+        self.in_transaction = False
+        self.conn.rollback()
+
+    def compact(self, flags: Optional[List[Dict]] = None) -> None:
+        """整理数据库文件"""
+        self.conn.execute("VACUUM")
+
+    def get_flag(self, flag_id: str) -> Optional[Dict]:
+        """按ID读取单个flag的头部"""
+        row = self.conn.execute(f"SELECT {', '.join(HEADER_COLUMNS)} FROM flags WHERE id = ?",
+                                (flag_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def match_ids(self, prefix: str, limit: int = 2) -> List[str]:
+        """返回以prefix开头的ID（最多limit个），完整ID命中时只返回它本身
+
+        用主键上的范围查询代替LIKE，保证能走索引
+        """
+        if self.conn.execute("SELECT 1 FROM flags WHERE id = ?", (prefix,)).fetchone():
+            return [prefix]
+        if prefix:
+            rows = self.conn.execute(
+                "SELECT id FROM flags WHERE id >= ? AND id < ? ORDER BY id LIMIT ?",
+                (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1), limit)
+            )
+        else:
+            rows = self.conn.execute("SELECT id FROM flags ORDER BY id LIMIT ?", (limit,))
+        return [row["id"] for row in rows]
+
+    def query_flags(self, category: Optional[str] = None, status: Optional[str] = None,
+                    after: Optional[tuple] = None, limit: Optional[int] = None) -> List[Dict]:
+        """按分类和状态筛选，按创建日期倒序返回flag头部（同一天内保持插入顺序）
+
+        指定 limit 时按 (创建日期倒序, ID) 分页，after 为上一页最后一个flag的 (创建日期, ID)
+        """
+        conditions = []
+        params = []
+        if category:
+            conditions.append("category = ?")
+            params.append(category)
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        if after:
+            conditions.append("(created_date < ? OR (created_date = ? AND id > ?))")
+            params.extend([after[0], after[0], after[1]])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = "ORDER BY created_date DESC, rowid"
+        if limit is not None:
+            order = "ORDER BY created_date DESC, id LIMIT ?"
+            params.append(limit)
+
+        rows = self.conn.execute(f"SELECT {', '.join(HEADER_COLUMNS)} FROM flags {where} {order}", params)
+        return [dict(row) for row in rows]
+
+    def statistics(self) -> Dict:
+        """读取触发器维护的统计计数，不扫描flags表"""
+        counts = {"by_status": {}, "by_category": {}, "score_sum": 0, "score_count": 0}
+        for row in self.conn.execute("SELECT kind, key, count FROM flag_counters WHERE count != 0"):
+            if row["kind"] == "status":
+                counts["by_status"][row["key"]] = row["count"]
+            elif row["kind"] == "category":
+                counts["by_category"][row["key"]] = row["count"]
+            else:
+                counts[f"score_{row['key']}"] = row["count"]
+        counts["total"] = sum(counts["by_status"].values())
+        return counts
+
+    def recount_statistics(self) -> Dict:
+        """直接对flags表聚合，从头计算统计数据（用于校验计数）"""
+        row = self.conn.execute(
+            "SELECT COUNT(*) AS total, COALESCE(SUM(feasibility_score), 0) AS score_sum, "
+            "COUNT(feasibility_score) AS score_count FROM flags"
+        ).fetchone()
+        counts = dict(row)
+        counts["by_status"] = {
+            r["status"]: r["n"]
+            for r in self.conn.execute("SELECT status, COUNT(*) AS n FROM flags GROUP BY status")
+        }
+        counts["by_category"] = {
+            r["category"]: r["n"]
+            for r in self.conn.execute("SELECT category, COUNT(*) AS n FROM flags GROUP BY category")
+        }
+        return counts
+
+    def rebuild_counters(self) -> None:
+        """按flags表重建统计计数"""
+        with self.conn:
+            self.conn.execute("DELETE FROM flag_counters")
+            self.conn.execute(
+                "INSERT INTO flag_counters SELECT 'status', status, COUNT(*) FROM flags GROUP BY status"
+            )
+            self.conn.execute(
+                "INSERT INTO flag_counters SELECT 'category', category, COUNT(*) FROM flags GROUP BY category"
+            )
+            self.conn.execute(
+                "INSERT INTO flag_counters SELECT 'score', 'sum', COALESCE(SUM(feasibility_score), 0) FROM flags"
+            )
+            self.conn.execute(
+                "INSERT INTO flag_counters SELECT 'score', 'count', COUNT(feasibility_score) FROM flags"
+            )
+
+
+class _Overlay:
+    """快照存储的日志中尚未压缩进快照的变更
+
+    headers 为变更过的flags的当前头部（已删除的为None），rows 为其中原本在快照里的 {行号: ID}，
+    added 为新增flags的ID（按添加顺序），records 为日志中的检查记录 {ID: {序号: 记录}}
+    """
+
+    def __init__(self):
+        self.headers: Dict[str, Optional[Dict]] = {}
+        self.rows: Dict[int, str] = {}
+        self.added: List[str] = []
+        self.records: Dict[str, Dict[int, Dict]] = {}
+        self.ops = 0
+
+
+class SnapshotStorage(JournalStorage):
+    """二进制列式快照存储
+
+    data_file 是 snapshot.py 格式的快照，读取时整个文件用mmap映射，不做整体解析；
+    变更与journal存储一样追加到 <data_file>.journal，条数达到阈值时写成新快照（原子rename）并清空日志。
+    统计按列计数，列表按分类/状态列筛选，提醒按时间戳列做区间查找，只有结果中的flags才组装成字典；
+    日志中的变更在读取时叠加到对应的行上（见 _Overlay），其他进程替换快照或追加日志后自动重新读取。
+    data_file 以 .json 结尾时数据放在同名 .snap 文件中，首次打开时自动转换已有的JSON数据。
+    snapshot.py（可能加载NumPy）在第一次读写快照时才导入，其他存储格式不受影响。
+    """
+
+    name = "snapshot"
+    lazy = True
+
+    def __init__(self, data_file: str = "flags.snap", compact_threshold: int = 1000):
+        json_file = None
+        if data_file.endswith(".json"):
+            json_file = data_file
+            data_file = os.path.splitext(data_file)[0] + ".snap"
+        super().__init__(data_file, compact_threshold=compact_threshold)
+        self._file: Optional["SnapshotFile"] = None
+        self._overlay: Optional[_Overlay] = None
+        self._overlay_key = None
+
+        if json_file and not os.path.exists(data_file) and os.path.exists(json_file):
+            with self.lock:
+                # 另一个进程可能已经抢先转换
+                if not os.path.exists(data_file):
+                    self.save(_load_json_file(json_file))
+
+    def close(self) -> None:
+        """释放快照的映射和锁文件"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        super().close()
+
+    def _state(self) -> tuple:
+        """当前的 (快照文件, 日志中的变更)
+
+        快照被替换过时重新映射；旧的映射不主动关闭，正在遍历旧快照的生成器用完后随之释放。
+        日志中的变更按快照和日志文件的状态缓存
+        """
+        try:
+            st = os.stat(self.data_file)
+        except FileNotFoundError:
+            st = None
+        identity = (st.st_ino, st.st_mtime_ns, st.st_size) if st else None
+        if self._file is None or self._file.identity != identity:
+            from snapshot import SnapshotFile
+            self._file = SnapshotFile(self.data_file) if identity is not None else None
+        snap = self._file
+        try:
+            st = os.stat(self.journal_file)
+            journal = (st.st_ino, st.st_size)
+        except FileNotFoundError:
+            journal = None
+        key = (snap.identity if snap else None, journal)
+        if self._overlay is None or self._overlay_key != key:
+            self._overlay = self._build_overlay(snap)
+            self._overlay_key = key
+            self.journal_ops = self._overlay.ops
+        return snap, self._overlay
+
+    def _build_overlay(self, snap: Optional["SnapshotFile"]) -> _Overlay:
+        """重放日志，得到变更过的flags的头部；与 apply_operation 一样，重复的操作不会重复生效"""
+        overlay = _Overlay()
+
+        def current(flag_id: str) -> Optional[Dict]:
+            if flag_id in overlay.headers:
+                return overlay.headers[flag_id]
+            row = snap.find(flag_id) if snap else None
+            if row is None:
+                return None
+            overlay.rows[row] = flag_id
+            header = overlay.headers[flag_id] = snap.header(row)
+            return header
+
+        for line in self._read_journal():
+            for op in (line["ops"] if line.get("op") == "batch" else [line]):
+                overlay.ops += 1
+                kind = op.get("op")
+                if kind == "add":
+                    flag = op["flag"]
+                    if current(flag["id"]) is None and flag["id"] not in overlay.headers:
+                        overlay.headers[flag["id"]] = split_history(flag)[0]
+                        overlay.added.append(flag["id"])
+                        overlay.records[flag["id"]] = dict(enumerate(flag["check_history"]))
+                    continue
+                header = current(op["id"])
+                if header is None:
+                    continue
+                if kind == "check":
+                    overlay.records.setdefault(op["id"], {})[op["seq"]] = op["record"]
+                overlay.headers[op["id"]] = JSONLStorage._apply_header(header, op)
+        return overlay
+
+    def _iter_rows(self) -> Iterator[tuple]:
+        """按插入顺序产出 (快照, 日志中的变更, 快照中的行号或None, 头部)，已叠加日志中的变更"""
+        snap, overlay = self._state()
+        if snap is not None:
+            snap.load_strings()
+            for row in range(len(snap)):
+                flag_id = overlay.rows.get(row)
+                if flag_id is None:
+                    yield snap, overlay, row, snap.header(row)
+                elif overlay.headers[flag_id] is not None:
+                    yield snap, overlay, row, dict(overlay.headers[flag_id])
+        for flag_id in overlay.added:
+            if overlay.headers[flag_id] is not None:
+                yield snap, overlay, None, dict(overlay.headers[flag_id])
+
+    @staticmethod
+    def _history(snap: Optional["SnapshotFile"], overlay: _Overlay, row: Optional[int], flag_id: str) -> List[Dict]:
+        """快照中的检查记录接上日志中追加的记录"""
+        records = snap.history(row) if row is not None else []
+        for seq, record in sorted(overlay.records.get(flag_id, {}).items()):
+            if seq == len(records):
+                records.append(dict(record))
+        return records
+
+    def iter_headers(self) -> Iterator[Dict]:
+        """按插入顺序读取全部flag头部，不读取检查记录"""
+        for _, _, _, header in self._iter_rows():
+            yield header
+
+    def load_history(self, flag_id: str) -> List[Dict]:
+        """读取一个flag的检查记录"""
+        snap, overlay = self._state()
+        row = snap.find(flag_id) if snap is not None and flag_id not in overlay.added else None
+        return self._history(snap, overlay, row, flag_id)
+
+    def iter_flags(self) -> Iterator[Dict]:
+        """逐个读取完整的flags（头部 + 检查记录）"""
+        for snap, overlay, row, header in self._iter_rows():
+            count = header.get("history_count", 0)
+            records = self._history(snap, overlay, row, header["id"])[:count] if count else []
+            yield join_history(header, records)
+
+    def load(self) -> List[Dict]:
+        """加载全部flags"""
+        return list(self.iter_flags())
+
+    def save(self, flags: Iterable[Dict]) -> None:
+        """用给定数据写成新快照并清空日志"""
+        self.compact(flags)
+
+    def compact(self, flags: Optional[Iterable[Dict]] = None) -> None:
+        """把当前数据写成新快照并清空日志，未给出flags时由现有快照和日志生成"""
+        from snapshot import write_snapshot
+        source = flags if flags is not None else self.iter_flags()
+        tmp = f"{self.data_file}.tmp"
+        # 生成新文件时读取的是旧快照，写完后才rename替换
+        with open(tmp, 'wb') as f:
+            write_snapshot(f, (split_history(flag) for flag in source))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.data_file)
+        fsync_dir(self.data_file)
+        # 快照落盘后才清空日志；两步之间崩溃时日志会被幂等地重放
+        with open(self.journal_file, 'w', encoding='utf-8') as f:
+            f.flush()
+            os.fsync(f.fileno())
+        self.journal_ops = 0
+
+    def get_flag(self, flag_id: str) -> Optional[Dict]:
+        """按ID读取单个flag的头部"""
+        snap, overlay = self._state()
+        if flag_id in overlay.headers:
+            header = overlay.headers[flag_id]
+            return dict(header) if header is not None else None
+        row = snap.find(flag_id) if snap is not None else None
+        return snap.header(row) if row is not None else None
+
+    def match_ids(self, prefix: str, limit: int = 2) -> List[str]:
+        """返回以prefix开头的ID（最多limit个），完整ID命中时只返回它本身"""
+        if self.get_flag(prefix) is not None:
+            return [prefix]
+        snap, overlay = self._state()
+        matches = []
+        for flag_id in (snap.ids_with_prefix(prefix) if snap is not None else ()):
+            if flag_id in overlay.headers and overlay.headers[flag_id] is None:
+                continue
+            matches.append(flag_id)
+            if len(matches) >= limit:
+                break
+        matches.extend(flag_id for flag_id in overlay.added
+                       if flag_id.startswith(prefix) and overlay.headers[flag_id] is not None)
+        return sorted(matches)[:limit]
+
+    @staticmethod
+    def _overlay_headers(snap: Optional["SnapshotFile"], overlay: _Overlay) -> Iterator[tuple]:
+        """日志中变更过且未删除的flags，产出 (插入顺序, 头部)"""
+        base = len(snap) if snap is not None else 0
+        for row, flag_id in overlay.rows.items():
+            if overlay.headers[flag_id] is not None:
+                yield row, overlay.headers[flag_id]
+        for i, flag_id in enumerate(overlay.added):
+            if overlay.headers[flag_id] is not None:
+                yield base + i, overlay.headers[flag_id]
+
+    def query_flags(self, category: Optional[str] = None, status: Optional[str] = None,
+                    after: Optional[tuple] = None, limit: Optional[int] = None) -> List[Dict]:
+        """按分类和状态筛选，按创建日期倒序返回flag头部（同一天内保持插入顺序）
+
+        指定 limit 时按 (创建日期倒序, ID) 分页，after 为上一页最后一个flag的 (创建日期, ID)；
+        筛选只读取分类和状态列，排序只解码创建日期（分页时还有ID），结果中的flags才组装头部
+        """
+        snap, overlay = self._state()
+        rows = [row for row in (snap.select(category, status) if snap is not None else [])
+                if row not in overlay.rows]
+        # (创建日期, ID, 插入顺序, 行号或头部)
+        candidates = []
+        if rows:
+            created = snap.texts("created_date", rows)
+            ids = snap.texts("id", rows) if limit is not None or after else [None] * len(rows)
+            candidates = list(zip(created, ids, rows, rows))
+        for order, header in self._overlay_headers(snap, overlay):
+            if (not category or header["category"] == category) and (not status or header["status"] == status):
+                candidates.append((header["created_date"], header["id"], order, header))
+
+        if after:
+            candidates = [item for item in candidates
+                          if item[0] < after[0] or (item[0] == after[0] and item[1] > after[1])]
+        if limit is None:
+            candidates.sort(key=lambda item: item[2])
+        else:
+            candidates.sort(key=lambda item: item[1])
+        candidates.sort(key=lambda item: item[0], reverse=True)
+        if limit is not None:
+            candidates = candidates[:limit]
+        headers = iter(snap.headers([item[3] for item in candidates if not isinstance(item[3], dict)]) if snap else ())
+        return [dict(item[3]) if isinstance(item[3], dict) else next(headers) for item in candidates]
+
+    def deadline_query(self, name: str, bounds: tuple) -> List[tuple]:
+        """到期/检查时间落在区间内的flags，按 (时间戳, ID) 升序返回 (时间戳, 头部)，含义同 DeadlineIndex.query"""
+        snap, overlay = self._state()
+        matches = []
+        if snap is not None:
+            hits = [(stamp, row) for stamp, row in snap.deadline_rows(name, *bounds) if row not in overlay.rows]
+            matches = list(zip((stamp for stamp, _ in hits), snap.headers([row for _, row in hits])))
+        for _, header in self._overlay_headers(snap, overlay):
+            for entry_name, stamp in deadline_entries(Flag.from_dict(header)):
+                if entry_name == name and in_range(stamp, bounds):
+                    matches.append((stamp, dict(header)))
+        matches.sort(key=lambda item: (item[0], item[1]["id"]))
+        return matches
+
+    def statistics(self) -> Dict:
+        """按列统计，再减去日志中变更过的行在快照里的计数、加上它们当前的计数"""
+        snap, overlay = self._state()
+        counts = snap.counts() if snap is not None else {
+            "total": 0, "by_status": {}, "by_category": {}, "score_sum": 0, "score_count": 0}
+
+        def count(header: Dict, delta: int) -> None:
+            counts["total"] += delta
+            for key, field in (("by_status", "status"), ("by_category", "category")):
+                value = counts[key].get(header[field], 0) + delta
+                if value:
+                    counts[key][header[field]] = value
+                else:
+                    counts[key].pop(header[field], None)
+            if header.get("feasibility_score") is not None:
+                counts["score_sum"] += header["feasibility_score"] * delta
+                counts["score_count"] += delta
+
+        for row in overlay.rows:
+            count(snap.header(row), -1)
+        for _, header in self._overlay_headers(snap, overlay):
+            count(header, 1)
+        return counts
+
+
+BACKENDS = {
+    JSONStorage.name: JSONStorage,
+    JournalStorage.name: JournalStorage,
+    JSONLStorage.name: JSONLStorage,
+    SQLiteStorage.name: SQLiteStorage,
+    SnapshotStorage.name: SnapshotStorage,
+}
+
+DEFAULT_BACKEND = "journal"
+
+EXTENSION_BACKENDS = {
+    ".jsonl": JSONLStorage.name,
+    ".db": SQLiteStorage.name,
+    ".sqlite": SQLiteStorage.name,
+    ".sqlite3": SQLiteStorage.name,
+    ".snap": SnapshotStorage.name,
+}
+
+
+def open_storage(data_file: str = "flags.json", backend: Optional[str] = None):
+    """创建存储后端
+
+    优先使用参数指定的后端，其次按文件扩展名推断，再读取环境变量 FLAG_STORAGE，最后使用默认后端
+    """
+    backend = (backend or EXTENSION_BACKENDS.get(os.path.splitext(data_file)[1])
+               or os.environ.get("FLAG_STORAGE")
+               or DEFAULT_BACKEND)
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的存储后端: {backend}（可选: {', '.join(BACKENDS)}）")
+    return BACKENDS[backend](data_file)
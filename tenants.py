@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+年度Flag管理工具 - 多用户数据
+每个用户的数据放在 <根目录>/<用户名>/ 下的独立数据文件中（存储格式与单用户相同，由扩展名或 FLAG_STORAGE 决定），
+锁文件、日志、搜索索引等附属文件也随之分开，用户之间互不影响。
+打开的FlagManager保存在按最近使用排序的缓存中，数量或估算的内存占用超过上限时关闭最久未用的；
+通过 lease() 借出、还没有归还的FlagManager不会被关闭。
+跨用户统计用进程池并行计算各用户的计数再合并；提醒等只读查询用线程池在各用户之间并发执行。
+"""
+
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from indexes import merge_counts, summarize_counts
+from main import FlagManager
+
+# 用户名同时是目录名：字母、数字、下划线、点和连字符，不能以点开头
+USER_RE = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]{0,63}$")
+# 估算内存占用：每个打开的FlagManager的固定开销，加上内存中每个flag的开销（含索引）
+BASE_FOOTPRINT = 256 * 1024
+FLAG_FOOTPRINT = 1024
+
+
+def check_user(user: str) -> str:
+    """检查用户名，不合法时抛出 ValueError"""
+    if not USER_RE.match(user or ""):
+        raise ValueError(f"用户名不合法: {user!r}（只能包含字母、数字、下划线、点和连字符，最长64个字符）")
+    return user
+
+
+def estimate_footprint(manager: FlagManager) -> int:
+    """估算一个FlagManager占用的内存（字节）"""
+    return BASE_FOOTPRINT + manager.loaded_count * FLAG_FOOTPRINT
+
+
+def _tenant_counts(data_file: str) -> Dict:
+    """在工作进程中读取一个用户的统计计数"""
+    manager = FlagManager(data_file)
+    try:
+        return manager.get_counts()
+    finally:
+        manager.close()
+
+
+class TenantStore:
+    """按用户分开存放的数据
+
+    root 为根目录（默认为环境变量 FLAG_USERS_DIR 或 users），filename 为每个用户目录下的数据文件名；
+    max_open 和 max_memory 限制缓存中打开的FlagManager数量和估算的内存占用（字节）。
+    """
+
+    def __init__(self, root: Optional[str] = None, filename: str = "flags.json",
+                 max_open: int = 64, max_memory: int = 256 * 1024 * 1024):
+        self.root = root or os.environ.get("FLAG_USERS_DIR", "users")
+        self.filename = filename
+        self.max_open = max(1, max_open)
+        self.max_memory = max_memory
+        self._managers: "OrderedDict[str, FlagManager]" = OrderedDict()
+        # 每个用户借出未归还的次数
+        self._leases: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """缓存中打开的FlagManager数量"""
+        return len(self._managers)
+
+    def data_file(self, user: str) -> str:
+        """用户的数据文件路径"""
+        return os.path.join(self.root, check_user(user), self.filename)
+
+    def users(self) -> List[str]:
+        """已有的用户（根目录下名字合法的子目录），按名字排序"""
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        return sorted(name for name in names
+                      if USER_RE.match(name) and os.path.isdir(os.path.join(self.root, name)))
+
+    def open(self, user: str) -> FlagManager:
+        """为用户新建一个不进入缓存的FlagManager（用完由调用方 close），用户目录不存在时创建"""
+        data_file = self.data_file(user)
+        os.makedirs(os.path.dirname(data_file), exist_ok=True)
+        return FlagManager(data_file)
+
+    @contextmanager
+    def lease(self, user: str) -> Iterator[FlagManager]:
+        """借用用户的FlagManager（缓存），with 块结束之前不会被淘汰关闭
+
+        with store.lease("alice") as manager: ...
+        """
+        with self._lock:
+            manager = self._managers.get(user)
+            if manager is None:
+                manager = self.open(user)
+                self._managers[user] = manager
+            else:
+                self._managers.move_to_end(user)
+            self._leases[user] += 1
+            self._evict()
+        try:
+            yield manager
+        finally:
+            with self._lock:
+                self._leases[user] -= 1
+                if not self._leases[user]:
+                    del self._leases[user]
+                # 使用期间可能加载了数据，按新的内存占用再检查一次
+                self._evict()
+
+    def memory_usage(self) -> int:
+        """缓存中FlagManager的估算内存占用（字节）"""
+        return sum(estimate_footprint(manager) for manager in self._managers.values())
+
+    def _evict(self) -> None:
+        """超过数量或内存上限时关闭最久未用的FlagManager，最近使用的一个和借出未归还的总是保留"""
+        idle = [user for user in list(self._managers)[:-1] if user not in self._leases]
+        for user in idle:
+            if len(self._managers) <= self.max_open and self.memory_usage() <= self.max_memory:
+                break
+            self._managers.pop(user).close()
+
+    def close(self) -> None:
+        """关闭缓存中全部FlagManager（包括借出未归还的，退出前调用）"""
+        with self._lock:
+            while self._managers:
+                _, manager = self._managers.popitem()
+                manager.close()
+
+    def map(self, func: Callable[[FlagManager], Any], users: Optional[Iterable[str]] = None,
+            workers: Optional[int] = None) -> List[Tuple[str, Any]]:
+        """在线程池中对每个用户并发执行 func(manager)，按用户顺序返回 (用户, 结果)
+
+        每个任务使用自己新建的FlagManager，不经过缓存，执行完即关闭
+        """
+        users = self.users() if users is None else [check_user(user) for user in users]
+
+        def run(user: str) -> Any:
+            manager = self.open(user)
+            try:
+                return func(manager)
+            finally:
+                manager.close()
+
+        if not users:
+            return []
+        with ThreadPoolExecutor(max_workers=workers or min(32, len(users))) as pool:
+            return list(zip(users, pool.map(run, users)))
+
+    def statistics(self, users: Optional[Iterable[str]] = None,
+                   workers: Optional[int] = None) -> Tuple[Dict, Dict[str, Dict]]:
+        """跨用户统计，返回 (合计, {用户: 统计})，格式同 FlagManager.get_statistics
+
+        各用户的计数在进程池中并行读取（workers=1 或只有一个用户时在当前进程中读取）
+        """
+        users = self.users() if users is None else [check_user(user) for user in users]
+        files = [self.data_file(user) for user in users]
+        if workers == 1 or len(files) < 2:
+            counts = [_tenant_counts(data_file) for data_file in files]
+        else:
+            workers = min(workers or os.cpu_count() or 1, len(files))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                counts = list(pool.map(_tenant_counts, files, chunksize=max(1, len(files) // (workers * 4))))
+        per_user = {user: summarize_counts(user_counts) for user, user_counts in zip(users, counts)}
+        return summarize_counts(merge_counts(counts)), per_user
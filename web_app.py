@@ -2,34 +2,432 @@
 """
 年度Flag管理工具 - Web界面
 基于Flask的Web应用
-支持离线模式，使用客户端JavaScript
+支持离线模式，使用客户端JavaScript；/api 下提供基于FlagManager的JSON接口
+静态资源使用带内容哈希的地址并长期缓存，只有首页每次向服务器确认（ETag）
 """
 
-from flask import Flask, send_from_directory, make_response
+from flask import Flask, make_response, request, jsonify, url_for, abort
+import argparse
+import base64
+import json
 import os
+import threading
+import time
 
-app = Flask(__name__, static_folder='www/static')
+from main import FlagManager
+from assets import AssetStore
+from models import FLAG_FIELDS, HEADER_FIELDS
+from indexes import AmbiguousIdError
+from analytics import ProgressAnalytics, RISK_LEVELS
+import profiling
+
+# 静态资源由 serve_static 提供，不使用Flask内置的静态路由
+app = Flask(__name__, static_folder=None)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
+app.json.ensure_ascii = False
+app.json.sort_keys = False
+
+# 写操作合并写入的默认延迟（秒）
+DEFAULT_WRITE_DELAY = 0.5
+# 列表接口每页数量
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+API_FIELDS = FLAG_FIELDS + HEADER_FIELDS
+
+WWW_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'www')
+# 带哈希的资源地址内容不会变化，可以永久缓存
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+# 启动时计算哈希并预压缩全部静态资源
+assets = AssetStore(os.path.join(WWW_DIR, 'static'))
+_index_page = None
+# 生产模式下最多每隔这么多秒检查一次页面和资源文件是否变化（调试模式每次请求都检查）
+ASSET_CHECK_INTERVAL = 60
+_assets_checked = 0.0
+
+_manager = None
+_analytics = None
+# FlagManager 不是线程安全的，同一进程内的请求串行访问
+_manager_lock = threading.RLock()
+# 收到退出信号后置位：就绪检查返回503，响应带 Connection: close
+_draining = threading.Event()
+# 设置了环境变量 FLAG_PROFILE 时开启性能剖析，/metrics 提供 Prometheus 格式的指标
+profiling.start()
+
+
+def get_manager():
+    """按需创建全局的FlagManager，数据文件可以用环境变量 FLAG_DATA_FILE 指定
+
+    写操作延迟合并写入（见 FlagManager 的 write_delay），延迟秒数用环境变量 FLAG_WRITE_DELAY 指定，
+    默认0.5秒，设为0时每个请求返回前写入。延迟写入的变更在写入之前其他进程看不到，
+    因此多进程服务默认不延迟（见 main），显式设置时一个进程的修改要在延迟之后才能被其他工作进程读到
+    """
+    global _manager
+    if _manager is None:
+        write_delay = float(os.environ.get("FLAG_WRITE_DELAY", DEFAULT_WRITE_DELAY))
+        # 后台写入线程与请求共用 _manager_lock，写入时不会有请求在读内存数据
+        _manager = FlagManager(os.environ.get("FLAG_DATA_FILE", "flags.json"), write_delay=write_delay or None,
+                               mutex=_manager_lock)
+    return _manager
+
+
+def close_manager():
+    """写入延迟写入的变更并关闭全局的FlagManager（工作进程退出时调用）"""
+    global _manager
+    with _manager_lock:
+        if _manager is not None:
+            _manager.close()
+            _manager = None
+
+
+class ApiError(Exception):
+    """返回给客户端的错误"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+@app.errorhandler(ApiError)
+def handle_api_error(error):
+    return jsonify({"error": error.message}), error.status
+
 
 @app.after_request
 def add_header(response):
-    response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '-1'
+    # 没有单独指定缓存策略的响应（首页、接口）可以缓存，但每次使用前都要用ETag向服务器确认
+    if 'Cache-Control' not in response.headers:
+        response.headers['Cache-Control'] = 'no-cache'
+    if _draining.is_set():
+        # 正在退出，让客户端不要复用这个连接
+        response.headers['Connection'] = 'close'
     return response
 
+
+def send_asset(asset, cache_control):
+    """按 Accept-Encoding 发送预压缩的内容，支持 If-None-Match 条件请求"""
+    encoding = asset.choose_encoding(request.accept_encodings.quality)
+    response = make_response(asset.bodies[encoding])
+    response.mimetype = asset.mimetype
+    response.set_etag(asset.etag(encoding))
+    response.vary.add('Accept-Encoding')
+    if encoding != 'identity':
+        response.content_encoding = encoding
+    response.headers['Cache-Control'] = cache_control
+    return response.make_conditional(request)
+
+
+def index_page():
+    """改写了资源地址的首页，页面或资源文件变化后重新生成
+
+    资源清单在启动时生成；扫描静态目录要遍历全部文件，生产模式下最多每 ASSET_CHECK_INTERVAL 秒扫描一次
+    """
+    global _index_page, _assets_checked
+    now = time.monotonic()
+    if _index_page is not None and not app.debug and now - _assets_checked < ASSET_CHECK_INTERVAL:
+        return _index_page
+    _assets_checked = now
+    path = os.path.join(WWW_DIR, 'index.html')
+    changed = assets.refresh()
+    if changed or _index_page is None or _index_page.mtime != os.path.getmtime(path):
+        _index_page = assets.page(path)
+    return _index_page
+
 @app.route('/')
 def index():
     """主页 - 返回静态HTML文件"""
-    return send_from_directory('www', 'index.html')
+    return send_asset(index_page(), 'no-cache')
 
 @app.route('/static/<path:filename>')
 def serve_static(filename):
-    """提供静态文件服务"""
-    return send_from_directory('www/static', filename)
+    """提供静态文件服务，带哈希的地址永久缓存，旧地址每次确认"""
+    asset, hashed = assets.lookup(filename)
+    if asset is None:
+        abort(404)
+    return send_asset(asset, IMMUTABLE_CACHE if hashed else 'no-cache')
 
-if __name__ == '__main__':
+
+def json_response(data, status=200):
+    """生成带强ETag的JSON响应，If-None-Match 匹配时返回304"""
+    response = make_response(jsonify(data), status)
+    if status == 200:
+        response.add_etag()
+        response.make_conditional(request)
+    return response
+
+
+def parse_fields():
+    """解析 ?fields=id,title,progress 形式的字段投影，未指定时返回None"""
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in API_FIELDS]
+    if unknown:
+        raise ApiError(400, f"未知字段: {', '.join(unknown)}")
+    return fields
+
+
+def flag_to_json(flag, fields=None, detail=False):
+    """把flag转换为接口返回的字典
+
+    列表默认只返回头部（不读取检查记录），详情默认包含检查记录；
+    指定 fields 时只输出这些字段，请求了 check_history 才会读取检查记录
+    """
+    if fields is None:
+        if detail:
+            data = flag.to_dict()
+            data["last_check"] = flag.last_check_date
+            data["history_count"] = flag.checks
+            return data
+        return flag.header_dict()
+    header = flag.header_dict()
+    data = {}
+    for field in fields:
+        if field == "check_history":
+            data[field] = [record.to_dict() for record in flag.check_history]
+        else:
+            data[field] = header[field]
+    return data
+
+
+def encode_cursor(flag):
+    raw = json.dumps([flag.created_date, flag.id], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created, flag_id = json.loads(raw)
+        return str(created), str(flag_id)
+    except (ValueError, TypeError):
+        raise ApiError(400, "无效的分页游标")
+
+
+def parse_int(name, default, low, high):
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        return max(low, min(high, int(value)))
+    except ValueError:
+        raise ApiError(400, f"参数 {name} 必须是整数")
+
+
+def find_flag(manager, flag_id):
+    """按完整ID或唯一前缀查找flag，找不到或前缀不唯一时返回错误"""
+    try:
+        flag = manager.get_flag(flag_id)
+    except AmbiguousIdError as e:
+        raise ApiError(409, str(e))
+    if flag is None:
+        raise ApiError(404, "未找到对应的flag")
+    return flag
+
+
+def request_json():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise ApiError(400, "请求体必须是JSON对象")
+    return data
+
+
+@app.route('/api/flags', methods=['GET'])
+def api_list_flags():
+    """分页列出flags
+
+    参数: category、status 筛选，limit 每页数量，cursor 为上一页返回的 next_cursor，fields 字段投影
+    """
+    fields = parse_fields()
+    limit = parse_int('limit', DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+    cursor = request.args.get('cursor')
+    after = decode_cursor(cursor) if cursor else None
+
+    with _manager_lock:
+        # 多取一个，用来判断是否还有下一页
+        flags = get_manager().page_flags(category=request.args.get('category'),
+                                         status=request.args.get('status'),
+                                         after=after, limit=limit + 1)
+        items = [flag_to_json(flag, fields) for flag in flags[:limit]]
+    next_cursor = encode_cursor(flags[limit - 1]) if len(flags) > limit else None
+    return json_response({"items": items, "next_cursor": next_cursor})
+
+
+@app.route('/api/flags', methods=['POST'])
+def api_create_flag():
+    """添加flag，请求体: title、description、target_date，可选 category"""
+    data = request_json()
+    missing = [key for key in ("title", "description", "target_date") if not data.get(key)]
+    if missing:
+        raise ApiError(400, f"缺少必填字段: {', '.join(missing)}")
+
+    with _manager_lock:
+        flag = get_manager().add_flag(
+            title=data["title"],
+            description=data["description"],
+            target_date=data["target_date"],
+            category=data.get("category") or "其他"
+        )
+        body = flag_to_json(flag, detail=True)
+    response = json_response(body, 201)
+    response.headers['Location'] = url_for('api_get_flag', flag_id=flag.id)
+    return response
+
+
+@app.route('/api/flags/<flag_id>', methods=['GET'])
+def api_get_flag(flag_id):
+    """flag详情（含检查记录），flag_id 可以是唯一的ID前缀"""
+    fields = parse_fields()
+    with _manager_lock:
+        flag = find_flag(get_manager(), flag_id)
+        body = flag_to_json(flag, fields, detail=True)
+    return json_response(body)
+
+
+@app.route('/api/flags/<flag_id>/progress', methods=['POST'])
+def api_update_progress(flag_id):
+    """更新进度，请求体: progress (0-100)，可选 notes"""
+    data = request_json()
+    progress = data.get("progress")
+    if not isinstance(progress, int) or isinstance(progress, bool):
+        raise ApiError(400, "progress 必须是0-100的整数")
+
+    with _manager_lock:
+        manager = get_manager()
+        flag = find_flag(manager, flag_id)
+        manager.update_progress(flag.id, progress, str(data.get("notes") or ""))
+        body = flag_to_json(manager.get_flag(flag.id), detail=True)
+    return json_response(body)
+
+
+@app.route('/api/flags/<flag_id>', methods=['DELETE'])
+def api_delete_flag(flag_id):
+    """删除flag"""
+    with _manager_lock:
+        manager = get_manager()
+        flag = find_flag(manager, flag_id)
+        manager.delete_flag(flag.id)
+    return '', 204
+
+
+@app.route('/api/stats', methods=['GET'])
+def api_stats():
+    """统计信息"""
+    with _manager_lock:
+        stats = get_manager().get_statistics()
+    return json_response(stats)
+
+
+@app.route('/api/search', methods=['GET'])
+def api_search():
+    """全文搜索：q 为搜索内容，按相关度排序"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        raise ApiError(400, "缺少搜索内容 q")
+    fields = parse_fields()
+    limit = parse_int('limit', 20, 1, 200)
+
+    with _manager_lock:
+        results = get_manager().search(query, limit=limit)
+        body = [dict(flag_to_json(flag, fields), score=round(score, 4)) for flag, score in results]
+    return json_response({"flags": body})
+
+
+@app.route('/api/analytics', methods=['GET'])
+def api_analytics():
+    """进度分析：速度、推算完成日期和风险分类，可用 risk 参数筛选"""
+    global _analytics
+    risks = request.args.getlist('risk')
+    unknown = [risk for risk in risks if risk not in RISK_LEVELS]
+    if unknown:
+        raise ApiError(400, f"未知的风险分类: {', '.join(unknown)}")
+
+    with _manager_lock:
+        manager = get_manager()
+        if _analytics is None or _analytics.manager is not manager:
+            _analytics = ProgressAnalytics(manager)
+        results = _analytics.analyze()
+    if risks:
+        results = [item for item in results if item["risk"] in risks]
+    return json_response({"flags": results})
+
+
+@app.route('/api/reminders', methods=['GET'])
+def api_reminders():
+    """提醒：超过 days 天未检查、deadline_days 天内到期、最近 completed_days 天完成的flags"""
+    fields = parse_fields()
+    days = parse_int('days', 30, 0, 3650)
+    deadline_days = parse_int('deadline_days', 30, 0, 3650)
+    completed_days = parse_int('completed_days', 7, 0, 3650)
+
+    with _manager_lock:
+        manager = get_manager()
+        body = {
+            "monthly": [flag_to_json(flag, fields) for flag in manager.get_monthly_reminders(days)],
+            "upcoming": [dict(flag_to_json(flag, fields), days_left=days_left)
+                         for flag, days_left in manager.get_upcoming_deadlines(deadline_days)],
+            "recently_completed": [flag_to_json(flag, fields)
+                                   for flag in manager.get_recently_completed(completed_days)]
+        }
+    return json_response(body)
+
+
+@app.route('/healthz')
+def healthz():
+    """存活检查：进程能处理请求即返回200"""
+    return jsonify({"status": "ok", "pid": os.getpid()})
+
+
+@app.route('/readyz')
+def readyz():
+    """就绪检查：数据可以读取且没有在退出时返回200，否则返回503"""
+    if _draining.is_set():
+        return jsonify({"status": "draining", "pid": os.getpid()}), 503
+    try:
+        with _manager_lock:
+            get_manager().refresh()
+    except Exception as e:
+        return jsonify({"status": "unavailable", "error": str(e), "pid": os.getpid()}), 503
+    return jsonify({"status": "ready", "pid": os.getpid()})
+
+
+@app.route('/metrics')
+def metrics():
+    """性能剖析指标（Prometheus 文本格式），未开启剖析时返回404
+
+    多进程服务时每个工作进程各自统计，返回的是处理这次请求的进程的数据
+    """
+    current = profiling.current()
+    if current is None:
+        abort(404)
+    response = make_response(profiling.prometheus_text(current))
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def main(argv=None, use_reloader=True):
+    """命令行入口；在其他程序的进程内调用时传入 use_reloader=False（自动重载会重新执行启动命令）"""
+    parser = argparse.ArgumentParser(prog="web_app.py", description="年度Flag管理工具 - Web界面")
+    parser.add_argument('--serve', action='store_true', help='生产模式：多进程服务，关闭调试器和自动重载')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='工作进程数量 (默认: CPU核数)')
+    parser.add_argument('--host', default='0.0.0.0', help='监听地址 (默认: 0.0.0.0)')
+    parser.add_argument('--port', type=int, default=5000, help='监听端口 (默认: 5000)')
+    args = parser.parse_args(argv)
+    
     print("年度Flag管理工具 - Web界面")
     print("支持离线模式，数据存储在浏览器本地")
-    print("访问地址: http://localhost:5000")
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    print(f"JSON接口: http://localhost:{args.port}/api/flags")
+    print(f"访问地址: http://localhost:{args.port}")
+    if args.serve:
+        from server import serve
+        if args.workers > 1:
+            # 请求会落到不同的工作进程上，刚添加的flag在其他进程中要等写入后才能看到，默认同步写入
+            os.environ.setdefault("FLAG_WRITE_DELAY", "0")
+        serve(app, args.host, args.port, args.workers, on_shutdown=_draining.set, on_exit=close_manager)
+    else:
+        app.run(debug=True, host=args.host, port=args.port, use_reloader=use_reloader)
+
+if __name__ == '__main__':
+    main()